@@ -0,0 +1,224 @@
+# """ Batch work on many ROMs in parallel (one worker process per core): extraction, and import of one asset set """
+# Each ROM is extracted into <outdir>/<rom stem>/<ABV>/ (or the asset pack <outdir>/<rom stem>.iupk,
+# or the asset store <outdir> with one manifest per ROM); compressed, into <outdir>/<rom stem>.zip
+# (or <outdir>/<rom stem>.iupk.gz)
+# On import, the assets are read and decoded once, handed to each worker process once, and every target ROM
+# (with its own number of teams and layout) is saved as <outdir>/<rom name> (or as a patch), compressed as
+# <outdir>/<rom name>.gz if asked
+# ROMs can be read from .zip / .gz archives (see IURom)
+# A failing ROM or team does not stop the batch, the summary lists what succeeded and what failed
+# A number of teams or layout of None is detected from each ROM (see IUDetect); on import, given ones that
+# contradict the ROM fail that ROM unless forced
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from glob import glob
+from pathlib import Path
+import os
+
+import IUDetect
+import IUEngine
+import IUPack
+import IUPatch
+import IUStore
+from IURom import RomFile, checkOutputs, isArchive, isRomName, romStem
+
+
+def isRom(filename):
+    return Path(filename).is_file() and isRomName(filename)
+
+
+def findRoms(source):
+    # List the ROM files (and archived ROMs) of a directory, or the files matching a glob pattern
+
+    if Path(source).is_dir():
+        roms = [p for p in Path(source).iterdir() if p.is_file() and isRomName(p)]
+    else:
+        roms = [Path(p) for p in glob(source) if Path(p).is_file()]
+
+    return sorted(str(p) for p in roms)
+
+
+def extractRom(romfile, outdir, teamcnt, romtype, pack=False, store=False, compress=False):
+    # Worker: extract one ROM into outdir/<rom stem>/, team by team (or into an asset pack, or compressed
+    # into outdir/<rom stem>.zip)
+    # Returns a result dictionary (rom, teams extracted, failed teams, error)
+
+    result = dict(rom=romfile, teams=[], failed=[], error=None)
+    romfolder = Path(outdir) / romStem(romfile)
+
+    try:
+        with RomFile(romfile) as rom:
+            teamcnt, romtype = IUDetect.romSettings(rom, teamcnt, romtype)
+            if store:
+                result['teams'] = IUStore.extractStore(rom, outdir, romfolder.name, teamcnt, romtype)
+                return result
+
+            if pack:
+                packfile = romfolder.with_name(romfolder.name + IUPack.PACKEXT + (".gz" if compress else ""))
+                result['teams'] = IUEngine.extractPack(rom, packfile, teamcnt, romtype)
+                return result
+
+            if compress:
+                zipname = romfolder.with_name(romfolder.name + ".zip")
+                result['teams'] = IUEngine.extractImages(rom, zipname, teamcnt, romtype)
+                return result
+
+            imgoffsets = IUEngine.getImgOffsets(romtype, teamcnt)
+            tmptrs = IUEngine.tm_ptrs(rom, teamcnt)
+            romfolder.mkdir(parents=True, exist_ok=True)
+
+            for count, ptr in enumerate(tmptrs):
+                try:
+                    tminfo = IUEngine.getTeamInfo(rom, ptr)
+                    result['teams'].append(IUEngine.extractTeam(rom, romfolder, ptr, tminfo, imgoffsets[count]))
+                except (EnvironmentError, ValueError) as e:
+                    result['failed'].append("team " + str(count + 1) + ": " + str(e))
+
+    except (EnvironmentError, ValueError) as e:
+        result['error'] = str(e)
+
+    return result
+
+
+def extractBatch(roms, outdir, teamcnt, romtype, workers=None, callback=None, pack=False, store=False,
+                 compress=False):
+    # Extract every ROM in roms using a process pool (sized to the number of cores by default)
+    # callback(result) is called as each ROM finishes; returns the results in the order of roms
+    # Raises ValueError (before anything is extracted) if two ROMs would be extracted to the same place
+
+    if not roms:
+        return []
+    checkOutputs(roms, lambda rom: Path(outdir) / romStem(rom))
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(roms))
+    results = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = {pool.submit(extractRom, rom, outdir, teamcnt, romtype, pack, store, compress): rom for rom in roms}
+        for job in as_completed(jobs):
+            try:
+                result = job.result()
+            except Exception as e:
+                # Worker process died (or could not pickle the result), keep going with the others
+                result = dict(rom=jobs[job], teams=[], failed=[], error=str(e))
+            results[jobs[job]] = result
+            if callback is not None:
+                callback(result)
+
+    return [results[rom] for rom in roms]
+
+
+# Decoded assets of the import, set once in each worker process (see importBatch)
+decoded = None
+
+
+def setDecoded(assets):
+    global decoded
+    decoded = assets
+
+
+def importOutput(romfile, outdir, patch=None, compress=False):
+    # File importRom saves romfile to: outdir/<rom name> (or outdir/<rom stem><patch> if patch is '.ips' or
+    # '.bps'); with compress, outdir/<rom name>.gz unless the ROM is already archived
+    if patch:
+        return Path(outdir) / (romStem(romfile) + patch)
+    out = Path(outdir) / Path(romfile).name
+    if compress and not isArchive(out):
+        out = out.with_name(out.name + ".gz")
+    return out
+
+
+def importRom(romfile, outdir, teamcnt, romtype, patch=None, compress=False, force=False):
+    # Worker: import the decoded assets into one ROM, saved as outdir/<rom name> (or outdir/<rom stem><patch>
+    # if patch is '.ips' or '.bps'); the header checksum is updated
+    # With compress, the ROM is saved gzip compressed (outdir/<rom name>.gz), an archived ROM stays archived
+    # Settings that contradict the ROM are an error, unless force (see IUDetect.romSettings)
+    # Returns a result dictionary (rom, out, messages, error)
+
+    result = dict(rom=romfile, out=None, messages=[], error=None)
+    try:
+        with RomFile(romfile) as rom:
+            teamcnt, romtype = IUDetect.romSettings(rom, teamcnt, romtype, strict=not force)
+            result['messages'] = IUEngine.importImages(rom, decoded, teamcnt, romtype)
+            result['messages'].append(IUEngine.updateChecksum(rom))
+            Path(outdir).mkdir(parents=True, exist_ok=True)
+            out = importOutput(romfile, outdir, patch, compress)
+            if patch:
+                IUPatch.writePatch(rom, out)
+            else:
+                rom.save(out)
+            result['out'] = str(out)
+    except (EnvironmentError, ValueError) as e:
+        result['error'] = str(e)
+
+    return result
+
+
+def importBatch(importdir, targets, outdir, workers=None, callback=None, patch=None, compress=False, force=False):
+    # Import one asset set into many ROMs using a process pool (sized to the number of cores by default)
+    # targets - list of (rom file, number of teams, layout)
+    # The assets are decoded (and checked) once here; raises ValueError if any of them is bad, or if two ROMs
+    # would be saved to the same file (see importOutput)
+    # callback(result) is called as each ROM finishes; returns the results in the order of targets
+
+    if not targets:
+        return []
+    checkOutputs([rom for rom, teamcnt, romtype in targets],
+                 lambda rom: importOutput(rom, outdir, patch, compress))
+
+    assets = IUEngine.decodeAssets(importdir)
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(targets))
+    results = {}
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=setDecoded, initargs=(assets,)) as pool:
+        jobs = {pool.submit(importRom, rom, outdir, teamcnt, romtype, patch, compress, force): rom
+                for rom, teamcnt, romtype in targets}
+        for job in as_completed(jobs):
+            try:
+                result = job.result()
+            except Exception as e:
+                # Worker process died, keep going with the others
+                result = dict(rom=jobs[job], out=None, messages=[], error=str(e))
+            results[jobs[job]] = result
+            if callback is not None:
+                callback(result)
+
+    return [results[rom] for rom, teamcnt, romtype in targets]
+
+
+def importSummary(results):
+    # Text summary of an import into many ROMs
+    lines = []
+    for result in results:
+        name = Path(result['rom']).name
+        if result['error']:
+            lines.append(name + ": FAILED - " + result['error'])
+            continue
+        lines.append(name + ": saved to " + result['out'])
+        for message in result['messages']:
+            lines.append("    " + message)
+    ok = sum(1 for result in results if not result['error'])
+    lines.append(str(ok) + " of " + str(len(results)) + " ROMs imported.")
+    return "\n".join(lines)
+
+
+def summary(results):
+    # Text summary of a batch run
+    lines = []
+    ok = 0
+
+    for result in results:
+        name = Path(result['rom']).name
+        if result['error']:
+            lines.append(name + ": FAILED - " + result['error'])
+            continue
+        if not result['failed']:
+            ok += 1
+        lines.append(name + ": " + str(len(result['teams'])) + " teams extracted (" + " ".join(result['teams']) + ")")
+        for failed in result['failed']:
+            lines.append("    FAILED " + failed)
+
+    lines.append(str(ok) + " of " + str(len(results)) + " ROMs extracted without errors.")
+    return "\n".join(lines)
@@ -0,0 +1,196 @@
+# """ Throughput benchmark of extract and import, on synthetic ROMs (see IUSynth) """
+# Measures ROMs/sec, teams/sec and bytes written for extract (hex folders and asset pack), import and batch
+# extraction, cold (new ROM, empty index cache) and warm (same ROM, cached index), and peak memory.
+# Each run is appended as one JSON line to the results file, so runs of different commits can be compared.
+#
+# Usage: python IUBench.py [--roms N] [--teams N] [--layout 30|32] [--repeat N] [--results FILE] [--compare]
+
+import argparse
+import contextlib
+import io
+import json
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import IUBatch
+import IUEngine
+import IUIndex
+import IUPack
+import IUSynth
+from IURom import RomFile
+
+RESULTS = "bench_results.jsonl"
+
+
+def commitId():
+    # Current git commit of the source, if there is one
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=str(Path(__file__).parent),
+                             capture_output=True, text=True, timeout=10)
+        return out.stdout.strip() or None
+    except (EnvironmentError, subprocess.SubprocessError):
+        return None
+
+
+def timed(func, repeat):
+    # Best wall time of repeat runs of func (with its output thrown away), and the last result
+    best = None
+    result = None
+    for i in range(repeat):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = func()
+            elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def rates(seconds, roms, teams, written=0):
+    return dict(seconds=round(seconds, 6), roms_per_sec=round(roms / seconds, 2),
+                teams_per_sec=round(teams / seconds, 1), bytes_written=written)
+
+
+def folderSize(folder):
+    return sum(p.stat().st_size for p in Path(folder).rglob("*") if p.is_file())
+
+
+def run(work, roms, teamcnt, romtype, repeat):
+    # Run every benchmark in the work folder, returns the results dictionary
+    romfiles = []
+    for i in range(roms):
+        romfile = work / ("synth" + str(i) + ".bin")
+        romfile.write_bytes(IUSynth.makeRom(teamcnt, romtype, seed=i))
+        romfiles.append(str(romfile))
+    teams = roms * teamcnt
+    results = {}
+
+    def extractCold():
+        IUIndex.cache.clear()
+        for i, romfile in enumerate(romfiles):
+            with RomFile(romfile) as rom:
+                IUEngine.extractImages(rom, work / "hex" / str(i), teamcnt, romtype)
+
+    seconds, result = timed(extractCold, repeat)
+    results['extract_cold'] = rates(seconds, roms, teams, folderSize(work / "hex"))
+
+    opened = [RomFile(romfile) for romfile in romfiles]
+    try:
+        def extractWarm():
+            for i, rom in enumerate(opened):
+                IUEngine.extractImages(rom, work / "hex" / str(i), teamcnt, romtype)
+
+        IUIndex.cache.clear()
+        timed(extractWarm, 1)
+        seconds, result = timed(extractWarm, repeat)
+        results['extract_warm'] = rates(seconds, roms, teams, folderSize(work / "hex"))
+
+        def extractPack():
+            for i, rom in enumerate(opened):
+                IUEngine.extractPack(rom, work / "pack" / (str(i) + IUPack.PACKEXT), teamcnt, romtype)
+
+        seconds, result = timed(extractPack, repeat)
+        results['extract_pack'] = rates(seconds, roms, teams, folderSize(work / "pack"))
+    finally:
+        for rom in opened:
+            rom.close()
+
+    # Import the assets of the next ROM, so every asset really changes (cold), then again (nothing changes)
+    def importRoms(source):
+        written = 0
+        for i, romfile in enumerate(romfiles):
+            with RomFile(romfile) as rom:
+                for report in IUEngine.importReports(rom, source(i), teamcnt, romtype):
+                    written += sum(count for name, status, count in report['assets'])
+        return written
+
+    def nextHex(i):
+        return work / "hex" / str((i + 1) % roms)
+
+    def nextPack(i):
+        return work / "pack" / (str((i + 1) % roms) + IUPack.PACKEXT)
+
+    def sameHex(i):
+        return work / "hex" / str(i)
+
+    IUIndex.cache.clear()
+    seconds, written = timed(lambda: importRoms(nextHex), repeat)
+    results['import_hex'] = rates(seconds, roms, teams, written)
+    seconds, written = timed(lambda: importRoms(nextPack), repeat)
+    results['import_pack'] = rates(seconds, roms, teams, written)
+    seconds, written = timed(lambda: importRoms(sameHex), repeat)
+    results['import_unchanged'] = rates(seconds, roms, teams, written)
+
+    def batch():
+        return IUBatch.extractBatch(romfiles, work / "batch", teamcnt, romtype)
+
+    seconds, result = timed(batch, 1)
+    results['batch_extract'] = rates(seconds, roms, teams, folderSize(work / "batch"))
+
+    # Peak memory of one cold extract + import (Python allocations)
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        IUIndex.cache.clear()
+        with RomFile(romfiles[0]) as rom:
+            IUEngine.extractImages(rom, work / "mem", teamcnt, romtype)
+            IUEngine.importReports(rom, nextHex(0), teamcnt, romtype)
+    results['peak_memory_bytes'] = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return results
+
+
+def compare(previous, current):
+    # Text table of the changes between two runs
+    lines = ["Compared with " + str(previous.get('commit')) + " (" + previous.get('time', '?') + "):"]
+    for name, result in current['results'].items():
+        old = previous['results'].get(name)
+        if isinstance(result, dict) and isinstance(old, dict) and old.get('teams_per_sec'):
+            change = (result['teams_per_sec'] / old['teams_per_sec'] - 1) * 100
+            lines.append("  {:<18} {:>10.1f} teams/sec ({:+.1f}%)".format(name, result['teams_per_sec'], change))
+        elif not isinstance(result, dict) and old:
+            change = (result / old - 1) * 100
+            lines.append("  {:<18} {:>10} ({:+.1f}%)".format(name, result, change))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="IUBench", description="Benchmark extract/import on synthetic ROMs.")
+    parser.add_argument("--roms", type=int, default=4, help="number of synthetic ROMs (default 4)")
+    parser.add_argument("--teams", type=int, default=30)
+    parser.add_argument("--layout", type=int, choices=sorted(IUEngine.LAYOUTS), default=30)
+    parser.add_argument("--repeat", type=int, default=3, help="runs of each benchmark, the best is kept (default 3)")
+    parser.add_argument("--results", default=RESULTS, help="JSON lines file the results are appended to")
+    parser.add_argument("--compare", action="store_true", help="compare with the last run in the results file")
+    args = parser.parse_args(argv)
+
+    previous = None
+    if args.compare and Path(args.results).exists():
+        lines = Path(args.results).read_text().splitlines()
+        if lines:
+            previous = json.loads(lines[-1])
+
+    with tempfile.TemporaryDirectory(prefix="iubench") as work:
+        results = run(Path(work), args.roms, args.teams, args.layout, args.repeat)
+
+    current = dict(commit=commitId(), time=time.strftime("%Y-%m-%d %H:%M:%S"), python=sys.version.split()[0],
+                   roms=args.roms, teams=args.teams, layout=args.layout, results=results)
+    with open(args.results, 'a', encoding="utf-8") as f:
+        f.write(json.dumps(current) + "\n")
+
+    for name, result in results.items():
+        if isinstance(result, dict):
+            print("{:<18} {:>9.4f} s {:>9.2f} ROMs/sec {:>10.1f} teams/sec {:>10} bytes written".format(
+                name, result['seconds'], result['roms_per_sec'], result['teams_per_sec'], result['bytes_written']))
+        else:
+            print("{:<18} {:>10}".format(name, result))
+    if previous is not None:
+        print(compare(previous, current))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,502 @@
+# """ Command line interface for the NHL '94 Genesis ROM Image Updater (no GUI required) """
+# Usage:
+#   python IUCli.py [-v] extract ROM OUTDIR [--teams N] [--layout 30|32] [--pack | --store] [--compress] [--profile]
+#                   [--trace FILE]
+#   python IUCli.py [-v] import ROM IMPORTDIR|PACK|MANIFEST [-o OUT] [--patch PATCH.ips|.bps] [--teams N]
+#                   [--layout 30|32] [--force] [--checksum fix|verify] [--profile] [--trace FILE]
+#   python IUCli.py fanout IMPORTDIR|PACK|MANIFEST OUTDIR [ROM|ROMDIR|GLOB ...] [--teams N] [--layout 30|32]
+#                   [--force] [--target ROM TEAMS LAYOUT ...] [--workers N] [--patch ips|bps | --compress]
+#   python IUCli.py compare ROMA ROMB [--teams N] [--layout 30|32] [--teams-b N] [--layout-b 30|32] [--all]
+#                   [--png OUTDIR]
+#   python IUCli.py watch ROM IMPORTDIR -o OUT [--teams N] [--layout 30|32] [--force]
+#   python IUCli.py apply PATCH ROM|ROMDIR|GLOB OUTDIR [--workers N]
+#   python IUCli.py roster ROM OUTFILE | ROMDIR|GLOB OUTDIR [--teams N] [--format csv|jsonl]
+#   python IUCli.py batch ROMDIR|GLOB OUTDIR [--teams N] [--layout 30|32] [--workers N] [--pack | --store] [--compress]
+#   python IUCli.py store verify|gc STOREDIR
+#   python IUCli.py png ROM|IMPORTDIR|PACK|MANIFEST OUTDIR [--teams N] [--layout 30|32]
+#   python IUCli.py index DB ROM|IMPORTDIR|DIR|GLOB ... [--teams N] [--layout 30|32]
+#   python IUCli.py find-similar DB PNG|ASSET.txt|ROM [--team ABV] [--image NAME] [--distance N] [--limit N]
+#   python IUCli.py space ROM [--teams N] [--layout 30|32] [--min N] [--region START END ...]
+#   python IUCli.py relocate ROM ABV ... -o OUT [--teams N] [--layout 30|32] [--force] [--room N] [--min N]
+#                   [--region START END ...]
+#   python IUCli.py detect ROM|ROMDIR|GLOB ...
+# -v logs progress (INFO), -vv also logs offsets and names (DEBUG)
+# Without --teams / --layout, the number of active teams and the layout are detected from each ROM. Given ones
+# that do not match the ROM are used with a warning by the commands that only read it, and refused by the ones
+# that write it (import, fanout, watch, relocate) unless --force is given
+# ROMs can be given as .zip / .gz archives, and a ROM (or asset pack) saved under a .gz / .zip name is compressed
+
+import argparse
+import logging
+from pathlib import Path
+import sys
+
+import IUBatch
+import IUDetect
+import IUDiff
+import IUEngine
+import IUPack
+import IUPatch
+import IURoster
+import IUStore
+import IUTrace
+from IURom import RomFile, romStem
+
+LOGLEVELS = [logging.WARNING, logging.INFO, logging.DEBUG]
+
+
+def settings(rom, args):
+    # Number of teams and layout of rom: --teams / --layout, or detected (see IUDetect)
+    # Commands that write to the ROM (they have --force) refuse settings that contradict the detected ones
+    strict = hasattr(args, "force") and not args.force
+    return IUDetect.romSettings(rom, args.teams, args.layout, strict)
+
+
+def extract(args):
+    # Extract the image assets of ROM into OUTDIR/<ABV>/, into the asset pack OUTDIR/<rom stem>.iupk,
+    # or into the asset store OUTDIR (manifest OUTDIR/manifests/<rom stem>.json)
+    # Compressed: into the zip archive OUTDIR.zip (also when OUTDIR ends with .zip), or OUTDIR/<rom stem>.iupk.gz
+    if args.compress and args.store:
+        raise ValueError("An asset store can not be compressed.")
+
+    with RomFile(args.rom) as rom:
+        teamcnt, romtype = settings(rom, args)
+        if args.store:
+            out = str(IUStore.AssetStore(args.outdir).manifestPath(romStem(args.rom)))
+            teams = IUStore.extractStore(rom, args.outdir, romStem(args.rom), teamcnt, romtype)
+        elif args.pack:
+            out = str(Path(args.outdir) / (romStem(args.rom) + IUPack.PACKEXT + (".gz" if args.compress else "")))
+            teams = IUEngine.extractPack(rom, out, teamcnt, romtype)
+        else:
+            out = args.outdir
+            if args.compress and not IUEngine.isZip(out):
+                out += ".zip"
+            teams = IUEngine.extractImages(rom, out, teamcnt, romtype)
+    print("Extracted " + str(len(teams)) + " teams to " + out + ".")
+    return 0
+
+
+def imports(args):
+    # Import the image assets found in IMPORTDIR/<ABV>/ (or an asset pack / store manifest) into ROM,
+    # and save the result as OUT and/or as an IPS/BPS patch of the changes
+    if not args.out and not args.patch:
+        raise ValueError("Nothing to save: give -o OUT and/or --patch PATCH.")
+    if args.patch and not IUPatch.isPatch(args.patch):
+        raise ValueError(args.patch + " is not a patch file name (must end with .ips or .bps).")
+
+    with RomFile(args.rom) as rom:
+        teamcnt, romtype = settings(rom, args)
+        messages = IUEngine.importImages(rom, args.importdir, teamcnt, romtype)
+        for message in messages:
+            print(message)
+        print(IUEngine.updateChecksum(rom, args.checksum == "fix"))
+        if args.out:
+            rom.save(args.out)
+            print("ROM successfully saved to " + args.out + ".")
+        if args.patch:
+            size = IUPatch.writePatch(rom, args.patch)
+            print("Patch (" + str(size) + " bytes) successfully saved to " + args.patch + ".")
+    return 0
+
+
+def fanout(args):
+    # Import one asset set into every target ROM in parallel, saving OUTDIR/<rom name> (or a patch per ROM)
+    targets = [(rom, args.teams, args.layout) for source in args.roms for rom in IUBatch.findRoms(source)]
+    for rom, teams, layout in args.target or []:
+        # 'auto' - detected from the ROM
+        teams = None if teams == "auto" else int(teams)
+        layout = None if layout == "auto" else int(layout)
+        if layout is not None and layout not in IUEngine.LAYOUTS:
+            raise ValueError("Unknown ROM type: " + str(layout) + " (must be 30 or 32)")
+        targets.append((rom, teams, layout))
+    if not targets:
+        print("No ROMs given.", file=sys.stderr)
+        return 1
+
+    def progress(result):
+        print(result['rom'] + ": " + ("FAILED" if result['error'] else "done"), flush=True)
+
+    patch = "." + args.patch if args.patch else None
+    results = IUBatch.importBatch(args.importdir, targets, args.outdir, args.workers, progress, patch, args.compress,
+                                  args.force)
+    print(IUBatch.importSummary(results))
+    return 0 if all(not r['error'] for r in results) else 1
+
+
+def compare(args):
+    # Compare the assets of two ROMs team by team, optionally with side-by-side PNGs of the changed teams
+    with RomFile(args.roma) as roma, RomFile(args.romb) as romb:
+        teamsa, layouta = settings(roma, args)
+        teamsb, layoutb = IUDetect.romSettings(romb, args.teams_b, args.layout_b)
+        rows = IUDiff.compareRoms(roma, teamsa, layouta, romb, teamsb, layoutb)
+        print(IUDiff.table(rows, args.all))
+        if args.png:
+            count = IUDiff.writePngs(roma, teamsa, layouta, romb, teamsb, layoutb, rows, args.png)
+            print("Wrote " + str(count) + " images to " + args.png + ".")
+    return 0
+
+
+def watch(args):
+    # Import IMPORTDIR into ROM, save it as OUT, then update OUT whenever files of IMPORTDIR change (until Ctrl+C)
+    import IUWatch
+
+    with RomFile(args.rom) as rom, IUWatch.Watcher(rom, args.importdir, args.out, *settings(rom, args)) as watcher:
+        for message in watcher.messages:
+            print(message)
+        print("Watching " + args.importdir + " (Ctrl+C to stop), " + args.out + " is updated on every change.",
+              flush=True)
+        try:
+            watcher.run(lambda message: print(message, flush=True))
+        except KeyboardInterrupt:
+            pass
+    return 0
+
+
+def apply(args):
+    # Apply an IPS/BPS patch to every ROM of SOURCE in parallel, saving OUTDIR/<rom name>
+    roms = IUBatch.findRoms(args.source)
+    if not roms:
+        print("No ROMs found in " + args.source + ".", file=sys.stderr)
+        return 1
+
+    def progress(result):
+        print(result['rom'] + ": " + ("FAILED" if result['error'] else "done"), flush=True)
+
+    results = IUPatch.applyBatch(args.patch, roms, args.outdir, args.workers, progress)
+    print(IUPatch.summary(results))
+    return 0 if all(not r['error'] for r in results) else 1
+
+
+def batch(args):
+    # Extract every ROM of a directory (or glob) into OUTDIR/<rom stem>/<ABV>/ in parallel
+    roms = IUBatch.findRoms(args.source)
+    if not roms:
+        print("No ROMs found in " + args.source + ".", file=sys.stderr)
+        return 1
+
+    def progress(result):
+        status = "FAILED" if result['error'] or result['failed'] else "done"
+        print(result['rom'] + ": " + status, flush=True)
+
+    if args.compress and args.store:
+        raise ValueError("An asset store can not be compressed.")
+
+    results = IUBatch.extractBatch(roms, args.outdir, args.teams, args.layout, args.workers, progress, args.pack,
+                                   args.store, args.compress)
+    print(IUBatch.summary(results))
+    return 0 if all(not r['error'] and not r['failed'] for r in results) else 1
+
+
+def store(args):
+    # Check the integrity of an asset store, or remove the blobs no manifest refers to
+    assetstore = IUStore.AssetStore(args.storedir)
+    if args.action == "verify":
+        problems = assetstore.verify()
+        for problem in problems:
+            print(problem)
+        print(str(len(problems)) + " problems found in " + args.storedir + ".")
+        return 1 if problems else 0
+
+    removed = assetstore.gc()
+    print("Removed " + str(removed) + " unreferenced blobs from " + args.storedir + ".")
+    return 0
+
+
+def png(args):
+    # Render the logos, rink logos and banners of a ROM (or of extracted assets) as OUTDIR/<ABV>/*.png
+    import IUTiles
+
+    if IUBatch.isRom(args.source):
+        with RomFile(args.source) as rom:
+            count = IUTiles.writePngs(IUTiles.romTeams(rom, *settings(rom, args)), args.outdir)
+    else:
+        with IUEngine.openAssets(args.source) as assets:
+            count = IUTiles.writePngs(IUTiles.sourceTeams(assets), args.outdir)
+    print("Wrote " + str(count) + " images to " + args.outdir + ".")
+    return 0
+
+
+def index(args):
+    # Add the images of ROMs and extracted assets to the similarity index DB (unchanged ROMs are skipped)
+    import IUSimilar
+
+    sources = [found for source in args.sources for found in IUSimilar.findSources(source)]
+    if not sources:
+        print("No ROMs or extracted assets found.", file=sys.stderr)
+        return 1
+
+    failed = []
+
+    def progress(path, count, error):
+        if error:
+            failed.append(path)
+            print(path + ": FAILED - " + error, flush=True)
+        elif count is None:
+            print(path + ": unchanged", flush=True)
+        else:
+            print(path + ": " + str(count) + " images", flush=True)
+
+    total = IUSimilar.indexSources(args.db, sources, args.teams, args.layout, progress)
+    print(str(total) + " images in " + args.db + ".")
+    return 1 if failed else 0
+
+
+def findSimilar(args):
+    # List the indexed images that look like ASSET, nearest first
+    import IUSimilar
+
+    matches = IUSimilar.findSimilar(args.db, args.asset, args.team, args.image, args.distance, args.limit,
+                                    args.teams, args.layout)
+    print(IUSimilar.table(matches))
+    return 0
+
+
+def space(args):
+    # List the free space (padding outside of the known data) of ROM
+    import IUSpace
+
+    with RomFile(args.rom) as rom:
+        teamcnt, romtype = settings(rom, args)
+        free = IUSpace.freeSpans(rom, teamcnt, romtype, args.min, args.region)
+    print("{:>10} {:>10} {:>8}  {}".format("Start", "End", "Bytes", "Fill"))
+    for start, end, value in free:
+        print("{:>10} {:>10} {:>8}  {:#04x}".format(hex(start), hex(end), end - start, value))
+    print(str(sum(end - start for start, end, value in free)) + " bytes free in " + str(len(free)) + " runs.")
+    return 0
+
+
+def relocate(args):
+    # Move the team data of the teams ABV into the free space of ROM, and save the result as OUT
+    import IUSpace
+
+    with RomFile(args.rom) as rom:
+        teamcnt, romtype = settings(rom, args)
+        for message in IUSpace.relocateTeams(rom, args.abvs, teamcnt, romtype, args.room, args.min, args.region):
+            print(message)
+        print(IUEngine.updateChecksum(rom))
+        rom.save(args.out)
+        print("ROM successfully saved to " + args.out + ".")
+    return 0
+
+
+def detect(args):
+    # Print the detected layout and number of active teams of every ROM given
+    roms = [rom for source in args.sources for rom in ([source] if IUBatch.isRom(source) else IUBatch.findRoms(source))]
+    if not roms:
+        print("No ROMs found.", file=sys.stderr)
+        return 1
+
+    failed = 0
+    for romfile in roms:
+        try:
+            with RomFile(romfile) as rom:
+                print(romfile + ": " + IUDetect.describe(rom))
+        except (EnvironmentError, ValueError) as e:
+            failed += 1
+            print(romfile + ": FAILED - " + str(e))
+    return 1 if failed else 0
+
+
+def roster(args):
+    # Export the players of ROM to OUTFILE, or of every ROM of a directory (or glob) to OUTDIR/<rom stem>.csv
+    if IUBatch.isRom(args.source):
+        count = IURoster.exportRoster(args.source, args.out, args.teams, args.format)
+        print("Exported " + str(count) + " players to " + args.out + ".")
+        return 0
+
+    roms = IUBatch.findRoms(args.source)
+    if not roms:
+        print("No ROMs found in " + args.source + ".", file=sys.stderr)
+        return 1
+
+    failed = 0
+    for romfile, count, error in IURoster.exportRosters(roms, args.out, args.teams, args.format):
+        if error:
+            failed += 1
+            print(romfile + ": FAILED - " + error)
+        else:
+            print(romfile + ": " + str(count) + " players")
+    print(str(len(roms) - failed) + " of " + str(len(roms)) + " rosters exported to " + args.out + ".")
+    return 1 if failed else 0
+
+
+def buildParser():
+    parser = argparse.ArgumentParser(prog="IUCli",
+                                     description="Extract or import image assets of a Genesis NHL '94 ROM.")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="log more (-vv for offsets and names)")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def romOptions(p, write=False):
+        p.add_argument("--teams", type=int, help="number of active teams in the ROM (default: detected)")
+        p.add_argument("--layout", type=int, choices=sorted(IUEngine.LAYOUTS),
+                       help="30 or 32 team ROM (default: detected)")
+        if write:
+            p.add_argument("--force", action="store_true",
+                           help="write with --teams / --layout even if they do not match the detected ones")
+
+    def spaceOptions(p):
+        p.add_argument("--min", type=int, default=256, help="shortest padding run counted as free (default 256 bytes)")
+        p.add_argument("--region", nargs=2, action="append", default=[], type=lambda x: int(x, 0),
+                       metavar=("START", "END"),
+                       help="unused area of the ROM: its runs of 0x00 are free too (by default only runs of 0xFF "
+                            "and the padding at the end of the ROM are)")
+
+    def profileOptions(p):
+        p.add_argument("--profile", action="store_true", help="print the time spent in each stage")
+        p.add_argument("--trace", metavar="FILE", help="save the stage timings as a Chrome trace (JSON)")
+
+    p = sub.add_parser("extract", help="extract image assets from a ROM")
+    p.add_argument("rom")
+    p.add_argument("outdir")
+    romOptions(p)
+    output = p.add_mutually_exclusive_group()
+    output.add_argument("--pack", action="store_true", help="write a single asset pack file instead of hex files")
+    output.add_argument("--store", action="store_true", help="OUTDIR is a content-addressed asset store")
+    p.add_argument("--compress", action="store_true", help="write a zip archive (OUTDIR.zip), or a .iupk.gz pack")
+    profileOptions(p)
+    p.set_defaults(func=extract)
+
+    p = sub.add_parser("import", help="import image assets into a copy of a ROM")
+    p.add_argument("rom")
+    p.add_argument("importdir", help="import folder (<ABV>/*.txt) or zip of it, asset pack file or asset store manifest")
+    p.add_argument("-o", "--out", help="file name of the updated ROM")
+    p.add_argument("--patch", help="also (or only) save the changes as an IPS or BPS patch (.ips / .bps)")
+    p.add_argument("--checksum", choices=["fix", "verify"], default="fix",
+                   help="update the Genesis header checksum (default), or only check it")
+    romOptions(p, write=True)
+    profileOptions(p)
+    p.set_defaults(func=imports)
+
+    p = sub.add_parser("fanout", help="import one asset set into many ROMs in parallel")
+    p.add_argument("importdir", help="import folder (<ABV>/*.txt) or zip of it, asset pack file or asset store manifest")
+    p.add_argument("outdir")
+    p.add_argument("roms", nargs="*", help="ROM files, directories of ROMs or glob patterns (--teams / --layout)")
+    romOptions(p, write=True)
+    p.add_argument("--target", nargs=3, action="append", metavar=("ROM", "TEAMS", "LAYOUT"),
+                   help="a ROM with its own number of teams and layout, or 'auto' (can be repeated)")
+    p.add_argument("--workers", type=int, default=None, help="number of worker processes (default: one per core)")
+    output = p.add_mutually_exclusive_group()
+    output.add_argument("--patch", choices=["ips", "bps"], help="save a patch per ROM instead of the ROM")
+    output.add_argument("--compress", action="store_true", help="save each ROM gzip compressed (<rom name>.gz)")
+    p.set_defaults(func=fanout)
+
+    p = sub.add_parser("compare", help="list the assets that differ between two ROMs, team by team")
+    p.add_argument("roma")
+    p.add_argument("romb")
+    romOptions(p)
+    p.add_argument("--teams-b", type=int, help="number of active teams in ROM B (default: detected)")
+    p.add_argument("--layout-b", type=int, choices=sorted(IUEngine.LAYOUTS), help="layout of ROM B (default: detected)")
+    p.add_argument("--all", action="store_true", help="list the identical teams too")
+    p.add_argument("--png", metavar="OUTDIR", help="write side-by-side PNGs of the changed images (needs NumPy)")
+    p.set_defaults(func=compare)
+
+    p = sub.add_parser("watch", help="import again into an output ROM whenever the import folder changes")
+    p.add_argument("rom")
+    p.add_argument("importdir", help="import folder (<ABV>/*.txt or *.png)")
+    p.add_argument("-o", "--out", required=True, help="file name of the updated ROM (kept up to date)")
+    romOptions(p, write=True)
+    p.set_defaults(func=watch)
+
+    p = sub.add_parser("apply", help="apply an IPS/BPS patch to one or many ROMs")
+    p.add_argument("patch")
+    p.add_argument("source", help="ROM file, directory of ROMs, or a glob pattern such as 'roms/*.bin'")
+    p.add_argument("outdir")
+    p.add_argument("--workers", type=int, default=None, help="number of worker processes (default: one per core)")
+    p.set_defaults(func=apply)
+
+    p = sub.add_parser("batch", help="extract image assets from every ROM of a directory or glob")
+    p.add_argument("source", help="directory of ROMs, or a glob pattern such as 'roms/*.bin'")
+    p.add_argument("outdir")
+    romOptions(p)
+    p.add_argument("--workers", type=int, default=None, help="number of worker processes (default: one per core)")
+    output = p.add_mutually_exclusive_group()
+    output.add_argument("--pack", action="store_true", help="write one asset pack file per ROM instead of hex files")
+    output.add_argument("--store", action="store_true", help="OUTDIR is a content-addressed asset store")
+    p.add_argument("--compress", action="store_true", help="write <rom stem>.zip (or <rom stem>.iupk.gz) per ROM")
+    p.set_defaults(func=batch)
+
+    p = sub.add_parser("png", help="render team logos, rink logos and banners as PNG images (needs NumPy)")
+    p.add_argument("source", help="ROM file, or extracted assets (import folder, asset pack or store manifest)")
+    p.add_argument("outdir")
+    romOptions(p)
+    p.set_defaults(func=png)
+
+    p = sub.add_parser("roster", help="export the players of a ROM (or of many ROMs) as CSV or JSON Lines")
+    p.add_argument("source", help="ROM file, directory of ROMs, or a glob pattern such as 'roms/*.bin'")
+    p.add_argument("out", help="output file for one ROM, output directory for many")
+    p.add_argument("--teams", type=int, help="number of active teams in the ROM (default: detected)")
+    p.add_argument("--format", choices=sorted(IURoster.FORMATS), default="csv")
+    p.set_defaults(func=roster)
+
+    p = sub.add_parser("index", help="add the images of ROMs or extracted assets to a similarity index (needs NumPy)")
+    p.add_argument("db", help="index database file (SQLite, created if needed)")
+    p.add_argument("sources", nargs="+",
+                   help="ROMs, extracted assets (folder, zip, asset pack, manifest), directories or glob patterns")
+    romOptions(p)
+    p.set_defaults(func=index)
+
+    p = sub.add_parser("find-similar", help="list the indexed images that look like an image (needs NumPy)")
+    p.add_argument("db", help="index database file")
+    p.add_argument("asset", help="PNG file, image asset file (<ABV>/Team_Logo.txt) or ROM (with --team)")
+    p.add_argument("--team", help="team abbreviation, when ASSET is a ROM")
+    p.add_argument("--image", choices=["Team_Logo", "Rink_Logo", "Banner"],
+                   help="kind of image (default: from the file name, PNG size, or Team_Logo)")
+    p.add_argument("--distance", type=int, default=10, help="largest Hamming distance of a match (default 10)")
+    p.add_argument("--limit", type=int, default=20, help="number of matches listed (default 20)")
+    romOptions(p)
+    p.set_defaults(func=findSimilar)
+
+    p = sub.add_parser("space", help="list the free space (padding runs outside of the known data) of a ROM")
+    p.add_argument("rom")
+    romOptions(p)
+    spaceOptions(p)
+    p.set_defaults(func=space)
+
+    p = sub.add_parser("relocate", help="move the team data of teams into free space, with room to grow")
+    p.add_argument("rom")
+    p.add_argument("abvs", nargs="+", metavar="ABV", help="team abbreviation")
+    p.add_argument("-o", "--out", required=True, help="file name of the updated ROM")
+    romOptions(p, write=True)
+    p.add_argument("--room", type=int, default=0, help="free bytes kept after each moved team (default 0)")
+    spaceOptions(p)
+    p.set_defaults(func=relocate)
+
+    p = sub.add_parser("detect", help="show the detected layout and number of active teams of ROMs")
+    p.add_argument("sources", nargs="+", help="ROM files, directories of ROMs or glob patterns")
+    p.set_defaults(func=detect)
+
+    p = sub.add_parser("store", help="maintain a content-addressed asset store")
+    p.add_argument("action", choices=["verify", "gc"])
+    p.add_argument("storedir")
+    p.set_defaults(func=store)
+
+    return parser
+
+
+def main(argv=None):
+    args = buildParser().parse_args(argv)
+    logging.basicConfig(level=LOGLEVELS[min(args.verbose, len(LOGLEVELS) - 1)],
+                        format="%(levelname)s %(name)s: %(message)s")
+
+    # Stage timing (extract and import only)
+    tracer = None
+    if getattr(args, 'profile', False) or getattr(args, 'trace', None):
+        tracer = IUTrace.enable(Path(args.rom).name)
+
+    try:
+        with IUTrace.stage(args.command):
+            return args.func(args)
+    except (EnvironmentError, ValueError) as e:
+        print("Error: " + str(e), file=sys.stderr)
+        return 1
+    finally:
+        if tracer is not None:
+            IUTrace.disable()
+            if args.profile:
+                print(tracer.summary())
+            if args.trace:
+                tracer.writeTrace(args.trace)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
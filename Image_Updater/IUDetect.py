@@ -0,0 +1,192 @@
+# """ Detection of the layout (30 or 32 team ROM) and of the number of active teams of a ROM """
+# The team pointer table at 782 is read once (room for the largest layout), and each pointer is checked to
+# lead to team data: an even offset inside the ROM, a team header whose player and name offsets make sense,
+# valid Genesis palettes at ptr + 12 / ptr + 44, and the four length-prefixed names inside the ROM. Only the
+# structure is checked: names may hold junk bytes (see IUIndex.parseTeam, which strips them). The active teams
+# are the pointers up to the first one that fails.
+# The layout is the one whose image asset slots hold a team logo palette and a home/visitor palette for each
+# of those teams: Genesis colour words (0000 BBB0 GGG0 RRR0), and not blank. At the slots of the other layout
+# there is tile data or padding instead.
+# Results are cached by ROM content hash, like the team index (see IUIndex).
+# A number of teams or layout given by the user that contradicts the detected one is used with a warning when
+# it is only read from (detection can not know every hand-edited ROM), and refused when it is used to write,
+# unless the user forces it (see romSettings).
+
+from collections import OrderedDict
+import logging
+import struct
+import threading
+
+import IUEngine
+from IUIndex import PTRSTART, TEAMHEADER
+from IURom import CHECKSTART, HEADER
+
+# Settings that do not match the detected ones are logged at WARNING level
+log = logging.getLogger(__name__)
+
+# Pointers read: one per team slot of the largest layout
+MAXTEAMS = max(IUEngine.LAYOUTS)
+
+# Team data: header up to the goalies (ptr + 80, 2 bytes), the players, and the names
+TEAMDATA = 82
+MAXTEAM = 0x2000
+MAXNAME = 64
+
+# Bits of a palette word that are always 0 on the Genesis
+COLOURMASK = 0xF111
+
+# Number of detections kept in the cache
+CACHESIZE = 16
+
+cache = OrderedDict()
+# The cache is used by the GUI thread and the worker thread (see IUWorker)
+cachelock = threading.Lock()
+
+
+def isPalette(data):
+    # True if data is a palette of Genesis colour words that is not blank
+    words = struct.unpack('>' + str(len(data) // 2) + 'H', data)
+    return any(words) and not any(word & COLOURMASK for word in words)
+
+
+def isTeam(rom, ptr):
+    # True if ptr points to team data (see the module header)
+    if ptr & 1 or ptr < CHECKSTART or ptr + TEAMDATA > len(rom):
+        return False
+    ploff, unused, tmpos = TEAMHEADER.unpack(rom.read(ptr, TEAMHEADER.size))
+    if not TEAMDATA <= ploff < tmpos <= MAXTEAM:
+        return False
+    if not (isPalette(rom.read(ptr + 12, 32)) and isPalette(rom.read(ptr + 44, 32))):
+        return False
+
+    # City, abv, nickname and arena: lengths only, their bytes are not checked
+    offset = ptr + tmpos
+    for name in range(4):
+        if offset + 2 > len(rom):
+            return False
+        length = rom.word(offset)
+        if not 2 <= length <= MAXNAME or offset + length > len(rom):
+            return False
+        offset += length
+    return True
+
+
+def countTeams(rom):
+    # Number of active teams: pointers of the table leading to team data, up to the first one that does not
+    slots = min(MAXTEAMS, (len(rom) - PTRSTART) // 4)
+    ptrs = struct.unpack('>' + str(slots) + 'I', rom.read(PTRSTART, 4 * slots))
+    for count, ptr in enumerate(ptrs):
+        if not isTeam(rom, ptr):
+            return count
+    return slots
+
+
+def isLayout(rom, romtype, teamcnt):
+    # True if the image asset slots of layout romtype hold the palettes of teamcnt teams
+    base = IUEngine.LAYOUTS[romtype]
+    strides = IUEngine.STRIDES
+    if teamcnt > romtype:
+        return False
+    if max(base[key] + strides[key] * romtype for key in base) > len(rom):
+        return False
+    for loc in ('lpoffset', 'hvpaloffset'):
+        data = rom.read(base[loc], strides[loc] * teamcnt)
+        if not all(isPalette(data[i:i + 0x20]) for i in range(0, len(data), 0x20)):
+            return False
+    return True
+
+
+def detectRom(rom):
+    # Detected (number of active teams, layout) of rom; layout is None if the image slots of neither layout
+    # (or of both) hold the team palettes
+    key = rom.hash()
+    with cachelock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+    if len(rom) < CHECKSTART or b'SEGA' not in bytes(rom.read(HEADER, 0x10)):
+        raise ValueError("Not a Genesis ROM (no SEGA header at " + hex(HEADER) + ").")
+    teamcnt = countTeams(rom)
+    layouts = [romtype for romtype in sorted(IUEngine.LAYOUTS) if teamcnt and isLayout(rom, romtype, teamcnt)]
+    detected = (teamcnt, layouts[0] if len(layouts) == 1 else None)
+
+    with cachelock:
+        cache[key] = detected
+        if len(cache) > CACHESIZE:
+            cache.popitem(last=False)
+    return detected
+
+
+def mismatches(rom, teamcnt=None, romtype=None):
+    # Messages for the given settings that contradict the detected ones ([] if none do, or if the ROM is not
+    # recognised): more teams than are active, or the other layout
+    try:
+        detected, layout = detectRom(rom)
+    except ValueError:
+        return []
+    problems = []
+    if teamcnt is not None and teamcnt > detected:
+        problems.append("The ROM seems to have " + str(detected) + " active teams (team pointer " + str(detected + 1)
+                        + " does not lead to team data), " + str(teamcnt) + " were given.")
+    if romtype is not None and layout is not None and romtype != layout:
+        problems.append("This looks like a " + str(layout) + " team ROM, the " + str(romtype)
+                        + " team layout was given.")
+    return problems
+
+
+def teamCount(rom, teamcnt=None):
+    # Number of teams to work on: the detected number, or teamcnt (a warning is logged if it looks wrong)
+    if teamcnt is not None:
+        for problem in mismatches(rom, teamcnt):
+            log.warning("%s Using %d teams as given.", problem, teamcnt)
+        return teamcnt
+    detected = detectRom(rom)[0]
+    if not detected:
+        raise ValueError("No team found at the team pointer table (" + hex(PTRSTART)
+                         + "), is this an NHL '94 ROM? Give the number of teams.")
+    return detected
+
+
+def romSettings(rom, teamcnt=None, romtype=None, strict=False):
+    # Number of teams and layout to work on: (teamcnt, romtype)
+    # Values not given are detected. Given ones that contradict the detected ones (see mismatches) are used with a
+    # warning, or refused (ValueError) with strict: the settings are used to write to the ROM, and the wrong
+    # layout writes every image at the offsets of the other one
+    if romtype is not None and romtype not in IUEngine.LAYOUTS:
+        raise ValueError("Unknown ROM type: " + str(romtype) + " (must be 30 or 32)")
+    try:
+        detected, layout = detectRom(rom)
+    except ValueError as e:
+        # Not recognised: only given settings can be used
+        if teamcnt is None or romtype is None:
+            raise
+        log.warning("%s Using %d teams and the %d team layout as given.", e, teamcnt, romtype)
+        detected, layout = teamcnt, romtype
+
+    problems = mismatches(rom, teamcnt, romtype)
+    if problems and strict:
+        raise ValueError(" ".join(problems) + " Nothing was written: check the number of teams and the ROM type, "
+                         "or force them.")
+    for problem in problems:
+        log.warning("%s Using the given settings.", problem)
+
+    if teamcnt is None:
+        if not detected:
+            raise ValueError("No team found at the team pointer table (" + hex(PTRSTART)
+                             + "), is this an NHL '94 ROM? Give the number of teams.")
+        teamcnt = detected
+    if romtype is None:
+        if layout is None:
+            raise ValueError("Could not tell if this is a 30 or a 32 team ROM, give the ROM type.")
+        romtype = layout
+    if teamcnt > romtype:
+        raise ValueError("A " + str(romtype) + " team ROM can not have " + str(teamcnt) + " teams.")
+    return teamcnt, romtype
+
+
+def describe(rom):
+    # One line about the detected settings of rom
+    teamcnt, romtype = detectRom(rom)
+    layout = str(romtype) + " team ROM" if romtype else "unknown ROM type"
+    return layout + ", " + str(teamcnt) + " active teams"
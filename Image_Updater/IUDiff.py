@@ -0,0 +1,101 @@
+# """ Asset-level comparison of two ROMs, straight from the mapped ROMs (nothing is extracted to disk) """
+# Teams are matched by abbreviation, not by position, so a team that moved to another slot (or a 30 team ROM
+# against a 32 team ROM) is still compared with itself. Every asset region of a team is compared as a whole
+# first (one memory comparison), and only the assets that differ are compared block by block to count the
+# changed bytes.
+
+from pathlib import Path
+
+import IUEngine
+
+
+def romAssets(rom, teamcnt, romtype):
+    # Team abv -> (position, [asset data in ASSETS order]) for every team of a ROM
+    imgoffsets = IUEngine.getImgOffsets(romtype, teamcnt)
+    teams = {}
+    for count, ptr, tminfo in IUEngine.romIndex(rom, teamcnt).teams(rom):
+        assets = IUEngine.readAssets(rom, ptr, tminfo, imgoffsets[count])
+        teams[tminfo['abv']] = (count, [data for file, data in assets])
+    return teams
+
+
+def changedBytes(old, new):
+    # Number of bytes that differ between old and new, of the same size: one vectorized comparison with NumPy
+    # if it is installed, else block by block (see diffSpans)
+    try:
+        import numpy
+    except ImportError:
+        count = 0
+        for start, end in IUEngine.diffSpans(old, new):
+            count += sum(1 for a, b in zip(old[start:end], new[start:end]) if a != b)
+        return count
+    return int(numpy.count_nonzero(numpy.frombuffer(old, numpy.uint8) != numpy.frombuffer(new, numpy.uint8)))
+
+
+def compareRoms(roma, teamcnta, romtypea, romb, teamcntb, romtypeb):
+    # Compare the assets of every team of two ROMs
+    # Returns one row per team (in the order of ROM A, then the teams only in ROM B):
+    # dict(abv, slota, slotb (team numbers, None if the team is not in that ROM), assets=[(name, bytes changed)])
+
+    teamsa = romAssets(roma, teamcnta, romtypea)
+    teamsb = romAssets(romb, teamcntb, romtypeb)
+    rows = []
+
+    for abv in list(teamsa) + [abv for abv in teamsb if abv not in teamsa]:
+        slota, assetsa = teamsa.get(abv, (None, None))
+        slotb, assetsb = teamsb.get(abv, (None, None))
+        row = dict(abv=abv, slota=slota, slotb=slotb, assets=[])
+        if assetsa is not None and assetsb is not None:
+            for (file, loc, size), a, b in zip(IUEngine.ASSETS, assetsa, assetsb):
+                if a != b:
+                    row['assets'].append((Path(file).stem, changedBytes(a, b)))
+        rows.append(row)
+
+    return rows
+
+
+def isChanged(row):
+    return row['slota'] is None or row['slotb'] is None or bool(row['assets'])
+
+
+def table(rows, everything=False):
+    # Text table of the comparison: the changed teams (every team with everything set), and a summary line
+
+    def slot(number):
+        return "-" if number is None else str(number + 1)
+
+    lines = ["{:<5} {:>6} {:>6}  {}".format("Team", "Slot A", "Slot B", "Changes")]
+    for row in rows:
+        if row['slota'] is None:
+            changes = "only in ROM B"
+        elif row['slotb'] is None:
+            changes = "only in ROM A"
+        elif row['assets']:
+            changes = ", ".join(name + " (" + str(count) + " bytes)" for name, count in row['assets'])
+        elif everything:
+            changes = "identical"
+        else:
+            continue
+        lines.append("{:<5} {:>6} {:>6}  {}".format(row['abv'], slot(row['slota']), slot(row['slotb']), changes))
+
+    changed = sum(1 for row in rows if isChanged(row))
+    lines.append(str(changed) + " of " + str(len(rows)) + " teams differ.")
+    return "\n".join(lines)
+
+
+def writePngs(roma, teamcnta, romtypea, romb, teamcntb, romtypeb, rows, outdir):
+    # Side-by-side PNGs (ROM A | ROM B) of the images of the teams that changed, returns the number of files
+    import IUTiles
+
+    # Images whose tiles or palette changed
+    wanted = set()
+    for row in rows:
+        names = set(name for name, count in row['assets'])
+        for image, palette, cols, tiles in IUTiles.IMAGES:
+            if image in names or palette in names:
+                wanted.add((row['abv'], image))
+
+    abvs = set(abv for abv, image in wanted)
+    teamsa = [team for team in IUTiles.romTeams(roma, teamcnta, romtypea) if team[0] in abvs]
+    teamsb = [team for team in IUTiles.romTeams(romb, teamcntb, romtypeb) if team[0] in abvs]
+    return IUTiles.writeComparison(teamsa, teamsb, outdir, wanted)
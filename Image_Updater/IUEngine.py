@@ -0,0 +1,713 @@
+# """ Extract / Import engine for image assets of a custom Genesis NHL '94 ROM """
+# """ No GUI code lives here (no PyQt5 imports), so it can be used from scripts and the command line """
+
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from pathlib import Path
+import re
+import zipfile
+
+from IUIndex import readName, readPtrs, parseTeam, romIndex
+import IUPack
+from IURom import atomicFile
+import IUStore
+from IUTrace import stage
+
+# Offsets and names are logged at DEBUG level (see IUCli -v)
+log = logging.getLogger(__name__)
+
+# Starting offsets of the image assets for each ROM layout (30 or 32 team ROM)
+# rloffset - Rink Logo (start of first image)
+# tloffset - Team Logo
+# lpoffset - Team Logo Palette
+# banoffset - Banner
+# hvpaloffset - Home/Visitor Palette
+LAYOUTS = {
+    30: dict(rloffset=0x1D6F02, tloffset=0x1C85B8, lpoffset=0x1C81EE, banoffset=0x1D16CC, hvpaloffset=0x1C6982),
+    32: dict(rloffset=0x1E317E, tloffset=0x1D38B0, lpoffset=0x1D34A6, banoffset=0x1DD370, hvpaloffset=0x1D1B0A),
+}
+
+# Distance between two teams' assets
+# Rink Logo is 0x300 + 0xA for header of next image, Team Logo is 0x4CC + 0xA for header of next image
+STRIDES = dict(rloffset=0x30A, tloffset=0x4D6, lpoffset=0x20, banoffset=0x2C0, hvpaloffset=0x40)
+
+# Threads reading the import source while planning an import (mostly waiting on the disk or network share)
+PLANWORKERS = 8
+
+class Cancelled(Exception):
+    # Raised by a progress callback to stop an extract/import
+    pass
+
+
+# Player attributes: one nibble each, in the order of the 7 attribute bytes after the jersey number
+# (the last four are stick/glove right/left for goalies)
+ATTRIBUTES = ["weight", "agility", "speed", "offaware", "defaware", "shotpower", "checking", "hand",
+              "stickhandling", "shotaccuracy", "endurance_str", "roughness_stl", "passing_glr", "aggression_gll"]
+
+# Asset files written on extract / read on import: (file name, location, size in bytes)
+# Location is either a key of the image offset dictionary, or a team data offset (ptr + 12 / ptr + 44)
+ASSETS = [
+    ("Rink_Logo_Jer_Palette_H.txt", 12, 0x20),
+    ("Jer_Palette_A.txt", 44, 0x20),
+    ("Rink_Logo.txt", 'rloffset', 0x300),
+    ("Team_Logo.txt", 'tloffset', 0x4CC),
+    ("Team_Logo_Palette.txt", 'lpoffset', 0x20),
+    ("Banner.txt", 'banoffset', 0x2C0),
+    ("Home_Visitor_Palette.txt", 'hvpaloffset', 0x40),
+]
+
+
+# Palettes that are not only used by an image: the home jersey (Rink Logo) and the home/visitor colours (Banner)
+# PNG artwork is mapped to them, they are never made from a PNG (see IUTiles.encodeFolder)
+SHAREDPALETTES = ("Rink_Logo_Jer_Palette_H", "Home_Visitor_Palette")
+
+
+def assetOffset(ptr, offsets, loc):
+    # Absolute ROM offset of an asset, from the team pointer or the image offset dictionary
+    if isinstance(loc, int):
+        return ptr + loc
+    return offsets[loc]
+
+
+def tm_ptrs(rom, numteams):
+    # Retrieve Team Offset Pointers (4 bytes each)
+
+    return list(readPtrs(rom, numteams))
+
+
+def getImgOffsets(romtype, teamcnt):
+    # Create Image Offset dictionary for each team position (30 or 32 team ROM)
+    # Only storing for the number of active teams
+
+    if romtype not in LAYOUTS:
+        raise ValueError("Unknown ROM type: " + str(romtype) + " (must be 30 or 32)")
+
+    base = LAYOUTS[romtype]
+    imgoffsets = []
+    debug = log.isEnabledFor(logging.DEBUG)
+
+    with stage("offsets"):
+        for count in range(0, teamcnt):
+            offsets = {key: base[key] + (STRIDES[key] * count) for key in base}
+            if debug:
+                log.debug("Team %d: Rink Logo Offset: %d, Team Logo Offset: %d, Team Logo Palette Offset: %d, "
+                          "Banner Offset: %d, Home/Visitor Palette Offset: %d", count, offsets['rloffset'],
+                          offsets['tloffset'], offsets['lpoffset'], offsets['banoffset'], offsets['hvpaloffset'])
+            imgoffsets.append(offsets)
+
+    return imgoffsets
+
+
+def getTeamInfo(rom, ptr):
+    # Retrieve Team Info
+
+    # Team Name Data starts at the end of Player Data (offset given in bytes 5 and 6 in Team Data)
+    # First offset: Length of Team City (including this byte)
+    # AA AA TEAM CITY BB BB TEAM ABV CC CC TEAM NICKNAME DD DD TEAM ARENA
+    # AA - Length of Team City (including these 2 bytes)
+    # BB - Length of Team Abv (including these 2 bytes)
+    # CC - Length of Team Nickname (including these 2 bytes)
+    # DD - Length of Team Arena (including these 2 bytes)
+    # All Name Data is in ASCII format.
+
+    # Home Logo and Jersey Palette - 12 bytes from start (Dec)
+    # Away Logo and Jersey Palette - 44 bytes from start (Dec)
+
+    # Player Data Position Offset, Team Name Data Position Offset (Team Offset + 4 bytes) and names
+    ploff, tmpos, tmcity, tmabv, tmnm = parseTeam(rom, ptr)
+
+    # Home Logo and Jersey Palette
+    hmpal = rom.read(ptr + 12, 32)
+
+    # Away Logo and Jersey Palette
+    awpal = rom.read(ptr + 44, 32)
+
+    # Player Data Size = Team Data Offset - Player Data Offset - 2 (last 2 bytes of Player Data - not used)
+    plsize = tmpos - ploff - 2
+
+    log.debug("%s %s %s", tmcity, tmabv, tmnm)
+
+    return dict(city=tmcity, abv=tmabv, name=tmnm, ploff=str(ploff), plsize=str(plsize), hmpal=hmpal, awpal=awpal)
+
+
+def getPlayerInfo(rom, ptr, ploff, plsize):
+    # Retreive Player Info: list of players (see players)
+
+    return list(players(rom, ptr, ploff, plsize))
+
+
+def players(rom, ptr, ploff, plsize):
+    # Retreive Player Info, one player at a time: dictionary of name, jno, pos (G, F or D) and ATTRIBUTES
+
+    # Player Data
+
+    # XX XX "PLAYER NAME" XX 123456789ABCDE
+
+    # XX XX = "Player name length" + 2 (the two bytes in front of the name) in hex
+
+    # "PLAYER NAME"
+
+    # XX =	Jersey # (decimal)
+
+    # 1 = Weight
+    # 2 = Agility
+
+    # 3 = Speed
+    # 4 = Off. Aware.
+
+    # 5 = Def. Aware.
+    # 6 = Shot Power/Puck Control
+
+    # 7 = Checking
+    # 8 = Stick Hand (Uneven = Right. Even = Left. 0/1 will do.)
+
+    # 9 = Stick Handling
+    # A = Shot Accuracy
+
+    # B = Endurance/StR
+    # C = ? (Roughness on Genesis)/StL
+
+    # D = Passing/GlR
+    # E = Aggression/GlL
+
+    # Calculate # of Players - Goalies First, then F and D
+    # GENS: Ptr + 81 (2 bytes) for G, Ptr + 80 (first nibble F, second D)
+
+    # For GENS
+    goff = 80
+    poff = 79
+
+    gdata = rom.read(ptr + goff, 2).hex()
+    numg = gdata.find("0")
+    if numg < 0:
+        numg = len(gdata)
+
+    pdata = rom.byte(ptr + poff)
+    numf = pdata >> 4
+    numd = pdata & 0xF
+
+    log.debug("G %d F %d D %d", numg, numf, numd)
+    debug = log.isEnabledFor(logging.DEBUG)
+
+    # Move to Player Data
+
+    pos = ptr + int(ploff)
+    j = 0
+    plend = ptr + int(ploff) + int(plsize)
+
+    # Retrieve Roster
+
+    while pos < plend:
+        # Name and JNo
+        # For GENS
+        nm, pos = readName(rom, pos)
+        jno = rom.read(pos, 1).hex()
+        j += 1
+
+        # G, F or D?
+
+        if j <= numg:
+            plpos = 'G'
+        elif j <= (numg + numf):
+            plpos = 'F'
+        else:
+            plpos = 'D'
+
+        # Remove unwanted characters (due to a bad job of ROM editing)
+
+        nm = re.sub('[^ A-Za-z]', '', nm)
+        if debug:
+            log.debug("%s %s %s", nm, jno, plpos)
+        player = dict(name=nm, jno=jno, pos=plpos)
+
+        # Attributes: 7 bytes, 2 nibbles each (high nibble first)
+        for i, value in enumerate(rom.read(pos + 1, 7)):
+            player[ATTRIBUTES[2 * i]] = value >> 4
+            player[ATTRIBUTES[2 * i + 1]] = value & 0xF
+
+        yield player
+        pos += 1 + 7  # Move to next Player
+
+
+def readAssets(rom, ptr, teaminfo, offsets):
+    # Pull the asset data of a team from the ROM: list of (file name, data) in ASSETS order
+
+    assets = []
+    with stage("asset read", team=teaminfo['abv']):
+        for file, loc, size in ASSETS:
+            if loc == 12:
+                data = teaminfo['hmpal']
+            elif loc == 44:
+                data = teaminfo['awpal']
+            else:
+                data = rom.read(assetOffset(ptr, offsets, loc), size)
+            assets.append((file, data))
+
+    return assets
+
+
+def writeFiles(rom, p, ptr, teaminfo, offsets):
+    # Pulls data from ROM, writes to hex files corresponding to team
+
+    assets = readAssets(rom, ptr, teaminfo, offsets)
+    with stage("file write", team=teaminfo['abv']):
+        for file, data in assets:
+            filepath = p / file
+            with filepath.open("w", encoding="utf-8") as f:
+                f.write(data.hex())
+
+
+class AssetFolder(object):
+    # Import source: a folder containing one <ABV> folder of hex .txt files per team
+    def __init__(self, importdir):
+        self.importdir = Path(importdir)
+        # ROM imported into, and team abv -> (team pointer, image offsets) (see useRom)
+        self.rom = None
+        self.places = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def useRom(self, rom, places):
+        # Map the PNG artwork of the images with a shared palette to the palettes of rom (read when the team is
+        # loaded), for the teams of places (team abv -> (team pointer, image offsets))
+        self.rom = rom
+        self.places = places
+
+    def romPalettes(self, abv):
+        # Shared palettes of a team in the ROM imported into: asset kind -> data (None without a ROM)
+        if abv not in self.places:
+            return None
+        ptr, offsets = self.places[abv]
+        return {kind: bytes(self.rom.read(assetOffset(ptr, offsets, loc), size))
+                for kind, (file, loc, size) in enumerate(ASSETS) if Path(file).stem in SHAREDPALETTES}
+
+    def teams(self):
+        # Team abvs that have a folder
+        if not self.importdir.is_dir():
+            return []
+        return sorted(p.name for p in self.importdir.iterdir() if p.is_dir())
+
+    def team(self, abv):
+        # Dictionary of asset kind -> data for the files present, or None if the team has no folder
+        folder = self.importdir / abv
+        if not folder.is_dir():
+            return None
+
+        # One listing of the folder instead of probing each file
+        present = set(p.name for p in folder.iterdir())
+
+        assets = {}
+        for kind, (file, loc, size) in enumerate(ASSETS):
+            if file in present:
+                try:
+                    assets[kind] = bytes.fromhex((folder / file).read_text())
+                except ValueError:
+                    raise ValueError(str(folder / file) + ": not valid hex data.")
+
+        # PNG artwork (Team_Logo.png, Rink_Logo.png, Banner.png) replaces the hex file of the image (needs NumPy)
+        if any(name.lower().endswith(".png") for name in present):
+            import IUTiles
+            IUTiles.encodeFolder(folder, assets, self.romPalettes(abv))
+
+        return assets
+
+    def close(self):
+        pass
+
+
+class ZipAssets(object):
+    # Import source: a zip archive of <ABV>/ folders of hex .txt files (as written by extracting to a .zip)
+    # PNG artwork is only read from import folders
+    def __init__(self, filename):
+        self.filename = str(filename)
+        try:
+            self.archive = zipfile.ZipFile(self.filename)
+        except zipfile.BadZipFile:
+            raise ValueError(self.filename + " is not a valid zip archive.")
+        self.names = set(self.archive.namelist())
+        self.abvs = sorted(set(name.split("/")[0] for name in self.names if "/" in name))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def teams(self):
+        return list(self.abvs)
+
+    def team(self, abv):
+        if abv not in self.abvs:
+            return None
+
+        assets = {}
+        for kind, (file, loc, size) in enumerate(ASSETS):
+            name = abv + "/" + file
+            if name in self.names:
+                try:
+                    assets[kind] = bytes.fromhex(self.archive.read(name).decode("utf-8"))
+                except ValueError:
+                    raise ValueError(self.filename + ": " + name + ": not valid hex data.")
+        return assets
+
+    def close(self):
+        self.archive.close()
+
+
+class PackAssets(IUPack.AssetPack):
+    # Import source: an asset pack file (payloads are read straight from the mapped pack)
+    def team(self, abv):
+        if abv not in self.index:
+            return None
+        return {kind: self.get(abv, kind) for kind in self.index[abv]}
+
+
+class DecodedAssets(object):
+    # Import source: data already read, decoded and checked (see decodeAssets), to import it into many ROMs
+    def __init__(self, data):
+        # data - team abv -> {asset kind: bytes}
+        self.data = data
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def teams(self):
+        return sorted(self.data)
+
+    def team(self, abv):
+        return self.data.get(abv)
+
+    def close(self):
+        pass
+
+
+def isZip(filename):
+    return Path(filename).suffix.lower() == ".zip"
+
+
+def openAssets(importdir):
+    # Open an import source: an asset pack file (.iupk or .iupk.gz), an asset store manifest (.json), a zip
+    # archive or a folder of hex files (DecodedAssets are used as they are)
+    if isinstance(importdir, DecodedAssets):
+        return importdir
+    if isZip(importdir) and Path(importdir).is_file():
+        return ZipAssets(importdir)
+    if IUPack.isPack(importdir):
+        return PackAssets(importdir)
+    if Path(importdir).suffix.lower() == ".json" and Path(importdir).is_file():
+        return IUStore.StoreAssets(importdir)
+    return AssetFolder(importdir)
+
+
+def diffSpans(old, new, block=16):
+    # Byte ranges (start, end) where new differs from old, compared block by block
+    # Adjacent changed blocks are merged into one range
+
+    spans = []
+    for start in range(0, len(new), block):
+        end = min(start + block, len(new))
+        if old[start:end] != new[start:end]:
+            if spans and spans[-1][1] == start:
+                spans[-1] = (spans[-1][0], end)
+            else:
+                spans.append((start, end))
+    return spans
+
+
+def writeData(rom, data):
+    # Write data in data list ([offset, bytes]) to ROM
+    # Only the byte ranges that differ from the ROM are written
+    # Returns the number of bytes changed for each row
+
+    changed = []
+    for row in data:
+        offset, code = row[0], row[1]
+        old = rom.read(offset, len(code))
+        count = 0
+        for start, end in diffSpans(old, code):
+            count += sum(1 for a, b in zip(old[start:end], code[start:end]) if a != b)
+            rom.write(offset + start, code[start:end])
+        changed.append(count)
+
+    return changed
+
+
+def writeToRom(rom, ptr, tminfo, offsets, teamassets):
+    # Checks is data exists for Team, then writes the data to the ROM
+    # teamassets is the data of the team from an import source (see openAssets), None if the team has none
+    # Returns a report: team abv, whether the team had data, and (asset, status, bytes changed) for each asset
+    # Status is 'changed', 'unchanged' or 'skipped' (no data for the asset)
+
+    data = []
+    report = dict(abv=tminfo['abv'], found=False, assets=[])
+
+    # Does the team have data?
+    if teamassets is not None:
+        report['found'] = True
+
+        # Store each asset that is present for writing
+        kinds = sorted(teamassets)
+        for kind in kinds:
+            file, loc, size = ASSETS[kind]
+            data.append([assetOffset(ptr, offsets, loc), teamassets[kind]])
+
+        changed = dict(zip(kinds, writeData(rom, data)))
+
+        for kind, (file, loc, size) in enumerate(ASSETS):
+            name = Path(file).stem
+            if kind not in changed:
+                report['assets'].append((name, 'skipped', 0))
+            elif changed[kind]:
+                report['assets'].append((name, 'changed', changed[kind]))
+            else:
+                report['assets'].append((name, 'unchanged', 0))
+
+    return report
+
+
+def teamMessage(report):
+    # One line message for the user about an imported team
+
+    if not report['found']:
+        # Team did not have any data, so the user will be notified
+        return report['abv'] + " data was not changed."
+
+    changed = [name + " (" + str(count) + " bytes)" for name, status, count in report['assets'] if status == 'changed']
+    unchanged = [name for name, status, count in report['assets'] if status == 'unchanged']
+    skipped = [name for name, status, count in report['assets'] if status == 'skipped']
+
+    if changed:
+        message = report['abv'] + " was updated: " + ", ".join(changed) + " changed"
+    else:
+        message = report['abv'] + " was already up to date"
+    if unchanged:
+        message += "; unchanged: " + ", ".join(unchanged)
+    if skipped:
+        message += "; skipped: " + ", ".join(skipped)
+
+    return message + "."
+
+
+def updateChecksum(rom, fix=True):
+    # Check the Genesis header checksum of rom, and correct it if fix is set
+    # Returns a message for the user
+
+    if not rom.isGenesis():
+        return "No Genesis header found, the checksum was not checked."
+
+    old, new = rom.headerChecksum(), rom.checksum()
+    if old == new:
+        return "Checksum " + format(old, '04X') + " is correct."
+    if not fix:
+        return "Checksum is out of date: " + format(old, '04X') + " in the header, the ROM sums to " + \
+            format(new, '04X') + "."
+
+    rom.fixChecksum()
+    return "Checksum updated from " + format(old, '04X') + " to " + format(new, '04X') + "."
+
+
+def extractTeam(rom, outdir, ptr, tminfo, offsets):
+    # Extract the image assets of one team into outdir/<ABV>/, returns the team abbreviation
+
+    # Create folder for Team
+    p = Path(outdir) / tminfo['abv']
+    p.mkdir(parents=True, exist_ok=True)
+
+    # Write the hex data to files
+    writeFiles(rom, p, ptr, tminfo, offsets)
+
+    return tminfo['abv']
+
+
+def extractImages(rom, outdir, teamcnt, romtype, progress=None):
+    # Generates folders to store ROM data, and pulls the data from the ROM and stores in files
+    # (an outdir ending in .zip is written as a zip archive of the same folders, see extractZip)
+    # progress(team number, number of teams, abv) is called after each team, it can raise Cancelled to stop
+    # Returns the list of team abbreviations that were extracted
+
+    if isZip(outdir):
+        return extractZip(rom, outdir, teamcnt, romtype, progress)
+
+    imgoffsets = getImgOffsets(romtype, teamcnt)
+    index = romIndex(rom, teamcnt)
+    extracted = []
+
+    # Create main folder
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+    for count, ptr, tminfo in index.teams(rom):
+        extracted.append(extractTeam(rom, outdir, ptr, tminfo, imgoffsets[count]))
+        log.info("Extracted %s (%d/%d)", tminfo['abv'], count + 1, teamcnt)
+        if progress is not None:
+            progress(count + 1, teamcnt, tminfo['abv'])
+
+    return extracted
+
+
+def extractZip(rom, zipname, teamcnt, romtype, progress=None):
+    # Pulls the data of every team from the ROM into a zip archive of <ABV>/ folders of hex files, compressed
+    # team by team as it is written (nothing is written uncompressed), the archive replaces zipname atomically
+    # progress is called after each team (see extractImages)
+    # Returns the list of team abbreviations that were extracted
+
+    imgoffsets = getImgOffsets(romtype, teamcnt)
+    index = romIndex(rom, teamcnt)
+    extracted = []
+
+    Path(zipname).parent.mkdir(parents=True, exist_ok=True)
+    with atomicFile(zipname) as f, zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for count, ptr, tminfo in index.teams(rom):
+            assets = readAssets(rom, ptr, tminfo, imgoffsets[count])
+            with stage("file write", team=tminfo['abv']):
+                for file, data in assets:
+                    archive.writestr(tminfo['abv'] + "/" + file, data.hex())
+            extracted.append(tminfo['abv'])
+            log.info("Extracted %s (%d/%d)", tminfo['abv'], count + 1, teamcnt)
+            if progress is not None:
+                progress(count + 1, teamcnt, tminfo['abv'])
+
+    return extracted
+
+
+def extractPack(rom, packfile, teamcnt, romtype, progress=None):
+    # Pulls the data of every team from the ROM into a single asset pack file
+    # progress is called after each team (see extractImages)
+    # Returns the list of team abbreviations that were extracted
+
+    imgoffsets = getImgOffsets(romtype, teamcnt)
+    index = romIndex(rom, teamcnt)
+    extracted = []
+    entries = []
+
+    for count, ptr, tminfo in index.teams(rom):
+        for kind, (file, data) in enumerate(readAssets(rom, ptr, tminfo, imgoffsets[count])):
+            entries.append((tminfo['abv'], kind, data))
+        extracted.append(tminfo['abv'])
+        if progress is not None:
+            progress(count + 1, teamcnt, tminfo['abv'])
+
+    Path(packfile).parent.mkdir(parents=True, exist_ok=True)
+    with stage("file write"):
+        IUPack.writePack(packfile, entries, romtype)
+
+    return extracted
+
+
+class PartialAsset(bytes):
+    # Data that only fills the start of its slot, the rest of the slot is left as it is: the tiles encoded from
+    # PNG artwork of the team logo (48x48, 36 tiles of the 0x4CC byte slot, see IUTiles.encodeFolder)
+    pass
+
+
+def checkAssets(abv, teamassets):
+    # Problems with the data of a team (empty list if it all fits)
+    # Data must be the size of its slot (hex files, asset packs and store assets are whole slots); only a
+    # PartialAsset may be shorter, in whole tiles of 32 bytes, and is written at the start of the slot
+
+    problems = []
+    for kind in sorted(teamassets):
+        file, loc, size = ASSETS[kind]
+        data = teamassets[kind]
+        length = len(data)
+        if isinstance(data, PartialAsset) and 0 < length < size and length % 32 == 0:
+            continue
+        if length != size:
+            problems.append(abv + "/" + file + " is " + hex(length) + " bytes, its slot in the ROM is " + hex(size)
+                            + " bytes.")
+    return problems
+
+
+def loadTeams(assets, abvs):
+    # Read, decode and check the data of the teams abvs from the import source (see openAssets),
+    # with a pool of threads
+    # Returns team abv -> data, for the teams the source has
+    # Raises ValueError listing every problem found, if any
+
+    def load(abv):
+        with stage("asset load", team=abv):
+            try:
+                teamassets = assets.team(abv)
+            except (EnvironmentError, ValueError) as e:
+                return None, [str(e)]
+        if teamassets is None:
+            return None, []
+        return teamassets, checkAssets(abv, teamassets)
+
+    with stage("plan"), ThreadPoolExecutor(max_workers=PLANWORKERS) as pool:
+        loaded = list(pool.map(load, abvs))
+
+    problems = [problem for teamassets, found in loaded for problem in found]
+    if problems:
+        raise ValueError("Nothing was imported, " + str(len(problems)) + " problems found:\n" + "\n".join(problems))
+
+    return {abv: teamassets for abv, (teamassets, found) in zip(abvs, loaded) if teamassets is not None}
+
+
+def decodeAssets(importdir):
+    # Read, decode and check every team of an import source once (see loadTeams), returns DecodedAssets
+    with openAssets(importdir) as assets:
+        loaded = loadTeams(assets, assets.teams())
+        # Views (of an asset pack) are copied, bytes (PartialAsset included) are kept as they are
+        return DecodedAssets({abv: {kind: data if isinstance(data, bytes) else bytes(data)
+                                    for kind, data in teamassets.items()}
+                              for abv, teamassets in loaded.items()})
+
+
+def planImport(rom, assets, teamcnt, romtype):
+    # Read, decode and check the data of every team of the ROM from the import source (see loadTeams),
+    # before anything is written
+    # Returns the write plan: (position, team pointer, team info, image offsets, team data or None) for each team
+    # Raises ValueError listing every problem found, if any
+
+    imgoffsets = getImgOffsets(romtype, teamcnt)
+    teams = list(romIndex(rom, teamcnt).teams(rom))
+    if isinstance(assets, AssetFolder):
+        assets.useRom(rom, {tminfo['abv']: (ptr, imgoffsets[count]) for count, ptr, tminfo in teams})
+    loaded = loadTeams(assets, [tminfo['abv'] for count, ptr, tminfo in teams])
+
+    # Teams of the import source that are not in the ROM are left out
+    unmatched = sorted(set(assets.teams()) - set(tminfo['abv'] for count, ptr, tminfo in teams))
+    if unmatched:
+        log.warning("No team in the ROM for: %s", ", ".join(unmatched))
+
+    return [(count, ptr, tminfo, imgoffsets[count], loaded.get(tminfo['abv'])) for count, ptr, tminfo in teams]
+
+
+def importReports(rom, importdir, teamcnt, romtype, progress=None):
+    # Retrieve image data from folders (or an asset pack), and overwrite the data in the (private copy of the) ROM
+    # progress is called after each team (see extractImages)
+    # Every file is read and checked first (see planImport), so a bad file is reported before anything is written
+    # If the import fails or is cancelled, every write is undone and the ROM is left untouched
+    # Returns the list of reports (see writeToRom), one for each team
+
+    reports = []
+
+    with openAssets(importdir) as assets:
+        plan = planImport(rom, assets, teamcnt, romtype)
+
+        rom.begin()
+        try:
+            for count, ptr, tminfo, offsets, teamassets in plan:
+                with stage("rom write", team=tminfo['abv']):
+                    reports.append(writeToRom(rom, ptr, tminfo, offsets, teamassets))
+                log.info("Imported %s (%d/%d)", tminfo['abv'], count + 1, teamcnt)
+                if progress is not None:
+                    progress(count + 1, teamcnt, tminfo['abv'])
+        except BaseException:
+            rom.rollback()
+            raise
+        rom.commit()
+
+    return reports
+
+
+def importImages(rom, importdir, teamcnt, romtype, progress=None):
+    # Same as importReports, returns the list of messages, one for each team
+
+    return [teamMessage(report) for report in importReports(rom, importdir, teamcnt, romtype, progress)]
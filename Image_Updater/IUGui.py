@@ -14,14 +14,14 @@ from PyQt5 import QtCore, QtGui, QtWidgets
 class Ui_imageUpdate(object):
     def setupUi(self, imageUpdate):
         imageUpdate.setObjectName("imageUpdate")
-        imageUpdate.resize(800, 300)
+        imageUpdate.resize(800, 640)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Fixed)
         sizePolicy.setHorizontalStretch(0)
         sizePolicy.setVerticalStretch(0)
         sizePolicy.setHeightForWidth(imageUpdate.sizePolicy().hasHeightForWidth())
         imageUpdate.setSizePolicy(sizePolicy)
-        imageUpdate.setMinimumSize(QtCore.QSize(800, 300))
-        imageUpdate.setMaximumSize(QtCore.QSize(800, 300))
+        imageUpdate.setMinimumSize(QtCore.QSize(800, 640))
+        imageUpdate.setMaximumSize(QtCore.QSize(800, 640))
         imageUpdate.setAutoFillBackground(False)
         self.centralwidget = QtWidgets.QWidget(imageUpdate)
         self.centralwidget.setObjectName("centralwidget")
@@ -112,6 +112,25 @@ class Ui_imageUpdate(object):
         spacerItem6 = QtWidgets.QSpacerItem(40, 20, QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Minimum)
         self.extractLayout.addItem(spacerItem6)
         self.verticalLayout_2.addLayout(self.extractLayout)
+        self.previewView = QtWidgets.QTableView(self.centralwidget)
+        self.previewView.setEditTriggers(QtWidgets.QAbstractItemView.NoEditTriggers)
+        self.previewView.setSelectionMode(QtWidgets.QAbstractItemView.NoSelection)
+        self.previewView.setVerticalScrollMode(QtWidgets.QAbstractItemView.ScrollPerPixel)
+        self.previewView.setHorizontalScrollMode(QtWidgets.QAbstractItemView.ScrollPerPixel)
+        self.previewView.setShowGrid(False)
+        self.previewView.setObjectName("previewView")
+        self.verticalLayout_2.addWidget(self.previewView)
+        self.progressLayout = QtWidgets.QHBoxLayout()
+        self.progressLayout.setObjectName("progressLayout")
+        self.progressBar = QtWidgets.QProgressBar(self.centralwidget)
+        self.progressBar.setProperty("value", 0)
+        self.progressBar.setObjectName("progressBar")
+        self.progressLayout.addWidget(self.progressBar)
+        self.cancelBtn = QtWidgets.QPushButton(self.centralwidget)
+        self.cancelBtn.setEnabled(False)
+        self.cancelBtn.setObjectName("cancelBtn")
+        self.progressLayout.addWidget(self.cancelBtn)
+        self.verticalLayout_2.addLayout(self.progressLayout)
         imageUpdate.setCentralWidget(self.centralwidget)
         self.menubar = QtWidgets.QMenuBar(imageUpdate)
         self.menubar.setGeometry(QtCore.QRect(0, 0, 800, 24))
@@ -163,6 +182,7 @@ class Ui_imageUpdate(object):
         self.numTeamLabel.setText(_translate("imageUpdate", "Number of Active Teams"))
         self.extractBtn.setText(_translate("imageUpdate", "Extract Images..."))
         self.importBtn.setText(_translate("imageUpdate", "Import Images..."))
+        self.cancelBtn.setText(_translate("imageUpdate", "Cancel"))
         self.menuFile.setTitle(_translate("imageUpdate", "File"))
         self.menuHelp.setTitle(_translate("imageUpdate", "Help"))
         self.actionLoad_ROM.setText(_translate("imageUpdate", "Load ROM..."))
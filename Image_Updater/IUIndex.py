@@ -0,0 +1,115 @@
+# """ Index of the teams of a ROM: team pointers, player/name offsets and team names """
+# Built in one pass (the pointer table is read with a single unpack), and cached by ROM content hash,
+# so repeated extracts/imports of the same ROM do not parse the team data again
+
+from array import array
+from collections import OrderedDict
+import re
+import struct
+import threading
+
+from IUTrace import stage
+
+# Team Offset Start Position:
+# GENS - 782 (030E)
+PTRSTART = 782
+
+# Number of indexes kept in the cache
+CACHESIZE = 16
+
+# Remove unwanted characters (due to a bad job of ROM editing)
+NAMECHARS = re.compile('[^A-Za-z ]')
+ABVCHARS = re.compile('[^A-Za-z]')
+
+# Team data: player data offset (2 bytes), 2 bytes, team name data offset (2 bytes)
+TEAMHEADER = struct.Struct('>HHH')
+
+cache = OrderedDict()
+# The cache is used by the GUI thread and the worker thread (see IUWorker)
+cachelock = threading.Lock()
+
+
+def readName(rom, offset):
+    # Read a length-prefixed ASCII string (length includes the 2 length bytes), bytes that are not text are dropped
+    # Returns the string and the offset of the next field
+    tml = rom.word(offset)
+    name = str(rom.read(offset + 2, tml - 2), "utf-8", "ignore")
+    return name, offset + tml
+
+
+def readPtrs(rom, numteams):
+    # Retrieve Team Offset Pointers (4 bytes each) with one read of the pointer table
+    return struct.unpack('>' + str(numteams) + 'I', rom.read(PTRSTART, 4 * numteams))
+
+
+def parseTeam(rom, ptr):
+    # Parse the team data at ptr: player data offset, team name data offset, city, abv and nickname
+
+    # Team Name Data starts at the end of Player Data (offset given in bytes 5 and 6 in Team Data)
+    # AA AA TEAM CITY BB BB TEAM ABV CC CC TEAM NICKNAME DD DD TEAM ARENA
+    # AA/BB/CC/DD - Length of the name (including these 2 bytes), all name data is in ASCII format.
+    ploff, unused, tmpos = TEAMHEADER.unpack(rom.read(ptr, TEAMHEADER.size))
+
+    dataoff = ptr + tmpos
+    tmcity, dataoff = readName(rom, dataoff)
+    tmabv, dataoff = readName(rom, dataoff)
+    tmnm, dataoff = readName(rom, dataoff)
+
+    return ploff, tmpos, NAMECHARS.sub('', tmcity), ABVCHARS.sub('', tmabv), NAMECHARS.sub('', tmnm)
+
+
+class RomIndex(object):
+    def __init__(self, rom, teamcnt):
+        self.teamcnt = teamcnt
+        with stage("pointer table"):
+            self.ptrs = array('I', readPtrs(rom, teamcnt))
+        self.ploff = array('H')
+        self.tmpos = array('H')
+        self.city = []
+        self.abv = []
+        self.name = []
+
+        for count, ptr in enumerate(self.ptrs):
+            with stage("team header", position=count):
+                ploff, tmpos, city, abv, name = parseTeam(rom, ptr)
+            self.ploff.append(ploff)
+            self.tmpos.append(tmpos)
+            self.city.append(city)
+            self.abv.append(abv)
+            self.name.append(name)
+
+    def __len__(self):
+        return self.teamcnt
+
+    def teamInfo(self, rom, count):
+        # Team info dictionary of the team at position count (palettes are views of rom)
+
+        # Home Logo and Jersey Palette - 12 bytes from start (Dec)
+        # Away Logo and Jersey Palette - 44 bytes from start (Dec)
+        # Player Data Size = Team Data Offset - Player Data Offset - 2 (last 2 bytes of Player Data - not used)
+        ptr = self.ptrs[count]
+        return dict(city=self.city[count], abv=self.abv[count], name=self.name[count],
+                    ploff=str(self.ploff[count]), plsize=str(self.tmpos[count] - self.ploff[count] - 2),
+                    hmpal=rom.read(ptr + 12, 32), awpal=rom.read(ptr + 44, 32))
+
+    def teams(self, rom):
+        # (position, team pointer, team info) for every team
+        for count, ptr in enumerate(self.ptrs):
+            yield count, ptr, self.teamInfo(rom, count)
+
+
+def romIndex(rom, teamcnt):
+    # Cached RomIndex of rom, keyed by ROM content hash and number of teams
+
+    key = (rom.hash(), teamcnt)
+    with cachelock:
+        if key in cache:
+            cache.move_to_end(key)
+            return cache[key]
+
+    index = RomIndex(rom, teamcnt)
+    with cachelock:
+        cache[key] = index
+        if len(cache) > CACHESIZE:
+            cache.popitem(last=False)
+    return index
@@ -0,0 +1,124 @@
+# """ Binary asset pack: all image assets of a ROM in a single file """
+# Replaces the folder of hex .txt files per team (the folders still work for import)
+#
+# Layout (big-endian):
+#   Header - 'IUPK', version (2 bytes), ROM type 30/32 (2 bytes), number of entries (4 bytes)
+#   Index  - one 24 byte entry per asset: team abv (8 bytes, NUL padded), asset kind (1 byte), 3 bytes unused,
+#            payload offset from start of file (4 bytes), payload length (4 bytes), CRC32 of payload (4 bytes)
+#   Payloads - raw asset bytes
+#
+# Asset kind is the position of the asset in IUEngine.ASSETS (0 = Rink_Logo_Jer_Palette_H ... 6 = Home_Visitor_Palette)
+#
+# A pack can be gzip compressed (<name>.iupk.gz), it is then written and read through gzip
+
+import mmap
+import struct
+import zlib
+
+from IURom import mapFile, openOutput, openSource
+
+MAGIC = b'IUPK'
+VERSION = 1
+HEADER = struct.Struct('>4sHHI')
+ENTRY = struct.Struct('>8sBxxxIII')
+# Bytes for the team abv in an index entry
+ABVSIZE = 8
+PACKEXT = '.iupk'
+
+
+def writePack(filename, entries, romtype=0):
+    # Write an asset pack (atomically, compressed for a .gz name). entries is a list of (team abv, asset kind,
+    # payload bytes), romtype is 30 or 32 (0 - not known)
+    # Raises ValueError (before anything is written) for a romtype that is not a layout, or an abv that does not
+    # fit its 8 bytes
+
+    # Imported here, IUEngine imports this module
+    import IUEngine
+    if romtype != 0 and romtype not in IUEngine.LAYOUTS:
+        raise ValueError("Unknown ROM type: " + str(romtype) + " (must be 30 or 32)")
+    entries = [(abv.encode("ascii"), kind, data) for abv, kind, data in entries]
+    for abv, kind, data in entries:
+        if len(abv) > ABVSIZE:
+            raise ValueError("Team abbreviation " + abv.decode("ascii") + " is longer than " + str(ABVSIZE)
+                             + " characters, it does not fit in an asset pack.")
+    offset = HEADER.size + ENTRY.size * len(entries)
+
+    with openOutput(filename) as f:
+        f.write(HEADER.pack(MAGIC, VERSION, romtype, len(entries)))
+        for abv, kind, data in entries:
+            f.write(ENTRY.pack(abv, kind, offset, len(data), zlib.crc32(data)))
+            offset += len(data)
+        for abv, kind, data in entries:
+            f.write(data)
+
+
+def isPack(filename):
+    # Check the magic number of a file (of a compressed pack, the magic number of its contents)
+    try:
+        with openSource(filename) as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except (EnvironmentError, ValueError, EOFError):
+        return False
+
+
+class AssetPack(object):
+    def __init__(self, filename):
+        # Map the pack and read its index, payloads are served straight from the mapped file (or from memory
+        # for a compressed pack)
+        self.filename = str(filename)
+        try:
+            self.map = mapFile(self.filename, mmap.ACCESS_READ)
+        except ValueError:
+            raise ValueError(self.filename + " is not an asset pack.")
+        self.view = memoryview(self.map)
+
+        if len(self.map) < HEADER.size:
+            raise ValueError(self.filename + " is not an asset pack.")
+        magic, version, self.romtype, count = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(self.filename + " is not an asset pack.")
+        if version != VERSION:
+            raise ValueError(self.filename + ": unsupported asset pack version " + str(version) + ".")
+        if HEADER.size + ENTRY.size * count > len(self.map):
+            raise ValueError(self.filename + ": asset pack index is truncated.")
+
+        # index - team abv -> {asset kind: (offset, length, crc)}, order - team abvs in ROM order
+        self.index = {}
+        self.order = []
+        for abv, kind, offset, length, crc in ENTRY.iter_unpack(
+                self.view[HEADER.size:HEADER.size + ENTRY.size * count]):
+            if offset + length > len(self.map):
+                raise ValueError(self.filename + ": asset pack payload is truncated.")
+            abv = abv.rstrip(b'\0').decode("ascii")
+            if abv not in self.index:
+                self.index[abv] = {}
+                self.order.append(abv)
+            self.index[abv][kind] = (offset, length, crc)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def teams(self):
+        return list(self.order)
+
+    def get(self, abv, kind):
+        # Zero-copy view of an asset payload (checked against its CRC), or None if the pack does not have it
+        entry = self.index.get(abv, {}).get(kind)
+        if entry is None:
+            return None
+        offset, length, crc = entry
+        data = self.view[offset:offset + length]
+        if zlib.crc32(data) != crc:
+            raise ValueError(self.filename + ": checksum error in asset " + str(kind) + " of " + abv + ".")
+        return data
+
+    def close(self):
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # A caller still holds a payload view, the map is released with it
+            pass
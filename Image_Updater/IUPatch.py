@@ -0,0 +1,294 @@
+# """ IPS / BPS patches: save only the bytes an import changed, and apply a patch to many ROMs at once """
+# IPS: "PATCH", records (3 byte offset, 2 byte size, data - or size 0, 2 byte count, 1 byte value), "EOF"
+#   Offsets are limited to 16 MB and IPS has no checksum, so the SHA-256 of the base ROM is saved next to
+#   the patch, as <patch>.sha256 (sha256sum format), and checked before the patch is applied.
+# BPS: "BPS1", source size, target size, metadata, then actions (source read, target read, source copy,
+#   target copy) as variable-length numbers; CRC32 of the source, target and patch at the end.
+
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import hashlib
+from pathlib import Path
+import os
+import struct
+import zlib
+
+from IURom import CHUNK, checkOutputs, writeFile, fileHash, openSource, readSource
+
+PATCHTYPES = ('.ips', '.bps')
+
+# Largest IPS offset and record size
+IPSEND = 0x1000000
+IPSRECORD = 0xFFFF
+# A record at this offset would read as the "EOF" marker
+IPSEOF = 0x454F46
+
+# BPS actions
+SOURCEREAD, TARGETREAD, SOURCECOPY, TARGETCOPY = range(4)
+
+
+def isPatch(filename):
+    return Path(filename).suffix.lower() in PATCHTYPES
+
+
+def hashFile(patchfile):
+    # Name of the file holding the base ROM hash of an IPS patch
+    return Path(str(patchfile) + ".sha256")
+
+
+def makeIps(rom):
+    # IPS patch of the modified ranges of rom (see RomFile.patches)
+
+    out = bytearray(b'PATCH')
+    for start, end in rom.spans:
+        if end > IPSEND:
+            raise ValueError("Offset " + hex(start) + " is beyond the 16 MB limit of IPS, use a BPS patch.")
+        pos = start
+        while pos < end:
+            if pos == IPSEOF:
+                # Start one byte earlier (rewriting the byte before, unchanged)
+                pos -= 1
+            size = min(end - pos, IPSRECORD)
+            out += struct.pack('>I', pos)[1:] + struct.pack('>H', size) + rom.view[pos:pos + size]
+            pos += size
+    out += b'EOF'
+
+    return bytes(out)
+
+
+def encodeNumber(number):
+    # BPS variable-length number
+    out = bytearray()
+    while True:
+        x = number & 0x7F
+        number >>= 7
+        if number == 0:
+            out.append(0x80 | x)
+            return bytes(out)
+        out.append(x)
+        number -= 1
+
+
+def decodeNumber(data, pos):
+    # Returns the BPS number at pos and the position after it
+    number = 0
+    shift = 1
+    while True:
+        if pos >= len(data):
+            raise ValueError("The BPS patch is truncated.")
+        x = data[pos]
+        pos += 1
+        number += (x & 0x7F) * shift
+        if x & 0x80:
+            return number, pos
+        shift <<= 7
+        number += shift
+
+
+def fileCrc(filename):
+    # Size and CRC32 of a file (of the decompressed ROM of an archive, see openSource)
+    size = crc = 0
+    with openSource(filename) as f:
+        for block in iter(lambda: f.read(CHUNK), b''):
+            size += len(block)
+            crc = zlib.crc32(block, crc)
+    return size, crc
+
+
+def makeBps(rom):
+    # BPS patch of the modified ranges of rom, against the ROM file it was loaded from
+
+    sourcesize, sourcecrc = fileCrc(rom.filename)
+    out = bytearray(b'BPS1')
+    out += encodeNumber(sourcesize) + encodeNumber(rom.size) + encodeNumber(0)
+
+    pos = 0
+    for start, end in rom.spans:
+        if start > pos:
+            out += encodeNumber(((start - pos - 1) << 2) | SOURCEREAD)
+        out += encodeNumber(((end - start - 1) << 2) | TARGETREAD) + rom.view[start:end]
+        pos = end
+    if rom.size > pos:
+        out += encodeNumber(((rom.size - pos - 1) << 2) | SOURCEREAD)
+
+    out += struct.pack('<II', sourcecrc, zlib.crc32(rom.view))
+    out += struct.pack('<I', zlib.crc32(out))
+
+    return bytes(out)
+
+
+def writePatch(rom, patchfile):
+    # Save the changes made to rom as an IPS or BPS patch (chosen by the file extension)
+    # Returns the size of the patch in bytes
+
+    suffix = Path(patchfile).suffix.lower()
+    if suffix == '.ips':
+        data = makeIps(rom)
+        writeFile(hashFile(patchfile), (fileHash(rom.filename) + "  " + Path(rom.filename).name + "\n").encode())
+    elif suffix == '.bps':
+        data = makeBps(rom)
+    else:
+        raise ValueError(str(patchfile) + " is not a patch file name (must end with .ips or .bps).")
+
+    writeFile(patchfile, data)
+    return len(data)
+
+
+def applyIps(patch, source):
+    # Target ROM bytes of an IPS patch applied to source
+
+    if patch[:5] != b'PATCH':
+        raise ValueError("Not an IPS patch.")
+
+    target = bytearray(source)
+    pos = 5
+    while True:
+        if pos + 3 > len(patch):
+            raise ValueError("The IPS patch is truncated.")
+        if patch[pos:pos + 3] == b'EOF':
+            pos += 3
+            break
+        offset = int.from_bytes(patch[pos:pos + 3], 'big')
+        size = int.from_bytes(patch[pos + 3:pos + 5], 'big')
+        pos += 5
+        if size:
+            data = patch[pos:pos + size]
+            pos += size
+        else:
+            count = int.from_bytes(patch[pos:pos + 2], 'big')
+            data = patch[pos + 2:pos + 3] * count
+            pos += 3
+        if offset + len(data) > len(target):
+            target.extend(bytes(offset + len(data) - len(target)))
+        target[offset:offset + len(data)] = data
+
+    # Truncation extension: 3 byte size after "EOF"
+    if len(patch) >= pos + 3:
+        del target[int.from_bytes(patch[pos:pos + 3], 'big'):]
+
+    return bytes(target)
+
+
+def applyBps(patch, source):
+    # Target ROM bytes of a BPS patch applied to source (checking the source, target and patch CRC32)
+
+    if patch[:4] != b'BPS1' or len(patch) < 16:
+        raise ValueError("Not a BPS patch.")
+    sourcecrc, targetcrc, patchcrc = struct.unpack('<III', patch[-12:])
+    if zlib.crc32(patch[:-4]) != patchcrc:
+        raise ValueError("The BPS patch is corrupted (CRC32 mismatch).")
+
+    sourcesize, pos = decodeNumber(patch, 4)
+    targetsize, pos = decodeNumber(patch, pos)
+    metasize, pos = decodeNumber(patch, pos)
+    pos += metasize
+    if len(source) != sourcesize or zlib.crc32(source) != sourcecrc:
+        raise ValueError("The ROM is not the base ROM of the patch (size or CRC32 mismatch).")
+
+    target = bytearray(targetsize)
+    out = 0
+    sourcerel = 0
+    targetrel = 0
+    end = len(patch) - 12
+    while pos < end:
+        number, pos = decodeNumber(patch, pos)
+        action, length = number & 3, (number >> 2) + 1
+        if out + length > targetsize:
+            raise ValueError("The BPS patch writes past the end of the ROM.")
+        if action == SOURCEREAD:
+            target[out:out + length] = source[out:out + length]
+        elif action == TARGETREAD:
+            target[out:out + length] = patch[pos:pos + length]
+            pos += length
+        else:
+            number, pos = decodeNumber(patch, pos)
+            delta = -(number >> 1) if number & 1 else number >> 1
+            if action == SOURCECOPY:
+                sourcerel += delta
+                target[out:out + length] = source[sourcerel:sourcerel + length]
+                sourcerel += length
+            else:
+                # Target copy can overlap the bytes being written, so it goes byte by byte
+                targetrel += delta
+                for i in range(length):
+                    target[out + i] = target[targetrel + i]
+                targetrel += length
+        out += length
+
+    if zlib.crc32(target) != targetcrc:
+        raise ValueError("The patched ROM does not match the patch (CRC32 mismatch).")
+
+    return bytes(target)
+
+
+def applyPatch(patchfile, source):
+    # Apply an IPS or BPS patch file to the source ROM bytes, returns the patched bytes
+    # The base ROM is checked first (the saved SHA-256 for IPS, the CRC32 in the patch for BPS)
+
+    patch = Path(patchfile).read_bytes()
+    if Path(patchfile).suffix.lower() == '.bps':
+        return applyBps(patch, source)
+
+    if hashFile(patchfile).exists():
+        base = hashFile(patchfile).read_text().split()[0]
+        if hashlib.sha256(source).hexdigest() != base:
+            raise ValueError("The ROM is not the base ROM of the patch (SHA-256 mismatch).")
+    return applyIps(patch, source)
+
+
+def applyRom(patchfile, romfile, outdir):
+    # Worker: apply the patch to one ROM, saved as outdir/<rom name> (compressed again if the ROM was)
+    # Returns a result dictionary (rom, out, error)
+
+    result = dict(rom=romfile, out=None, error=None)
+    try:
+        target = applyPatch(patchfile, readSource(romfile))
+        out = Path(outdir) / Path(romfile).name
+        out.parent.mkdir(parents=True, exist_ok=True)
+        writeFile(out, target)
+        result['out'] = str(out)
+    except (EnvironmentError, ValueError) as e:
+        result['error'] = str(e)
+
+    return result
+
+
+def applyBatch(patchfile, roms, outdir, workers=None, callback=None):
+    # Apply the patch to every ROM in roms using a process pool (sized to the number of cores by default)
+    # callback(result) is called as each ROM finishes; returns the results in the order of roms
+    # Raises ValueError (before anything is written) if two ROMs have the same name
+
+    if not roms:
+        return []
+    checkOutputs(roms, lambda rom: Path(outdir) / Path(rom).name)
+
+    workers = workers or os.cpu_count() or 1
+    workers = min(workers, len(roms))
+    results = {}
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        jobs = {pool.submit(applyRom, patchfile, rom, outdir): rom for rom in roms}
+        for job in as_completed(jobs):
+            try:
+                result = job.result()
+            except Exception as e:
+                # Worker process died, keep going with the others
+                result = dict(rom=jobs[job], out=None, error=str(e))
+            results[jobs[job]] = result
+            if callback is not None:
+                callback(result)
+
+    return [results[rom] for rom in roms]
+
+
+def summary(results):
+    # Text summary of a bulk patch run
+    lines = []
+    for result in results:
+        name = Path(result['rom']).name
+        if result['error']:
+            lines.append(name + ": FAILED - " + result['error'])
+        else:
+            lines.append(name + ": patched to " + result['out'])
+    ok = sum(1 for result in results if not result['error'])
+    lines.append(str(ok) + " of " + str(len(results)) + " ROMs patched.")
+    return "\n".join(lines)
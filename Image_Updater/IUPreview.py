@@ -0,0 +1,187 @@
+# """ Preview of the image assets of the loaded ROM: a grid with one row per team """
+# The asset bytes of the teams are copied out of the ROM when it is loaded (a few KB per team), but nothing is
+# decoded then: the view only asks the model for the cells that are scrolled into view, and each thumbnail is
+# decoded the first time it is painted. Thumbnails are kept in a LRU cache (bounded in bytes) keyed by the
+# SHA-1 of the data they are decoded from, so loading another ROM or changing the number of teams only
+# decodes the images that were not shown before.
+# Decoding needs NumPy (see IUTiles), without it the grid only lists the teams.
+
+from collections import OrderedDict
+import hashlib
+import importlib.util
+from pathlib import Path
+
+from PyQt5.QtCore import Qt, QAbstractTableModel, QSize
+from PyQt5.QtGui import QImage
+from PyQt5.QtWidgets import QHeaderView
+
+import IUEngine
+
+# Bytes of decoded thumbnails kept in the cache
+CACHESIZE = 16 << 20
+
+# Images are shown twice their size, palettes as 8x8 swatches (16 colours per row)
+SCALE = 2
+SWATCH = 8
+
+# Columns: (title, image asset, palette assets)
+# An image column has 1 palette, the palette column shows each palette on a row (2 rows for Home/Visitor)
+COLUMNS = [
+    ("Team Logo", "Team_Logo", ["Team_Logo_Palette"]),
+    ("Rink Logo", "Rink_Logo", ["Rink_Logo_Jer_Palette_H"]),
+    ("Banner", "Banner", ["Home_Visitor_Palette"]),
+    ("Palettes", None, ["Rink_Logo_Jer_Palette_H", "Jer_Palette_A", "Team_Logo_Palette", "Home_Visitor_Palette"]),
+]
+
+# Room around each thumbnail
+MARGIN = 6
+
+
+def columnSize(column):
+    # Size of the thumbnails of a column
+    title, image, palettes = COLUMNS[column]
+    if image is None:
+        sizes = dict((Path(file).stem, size) for file, loc, size in IUEngine.ASSETS)
+        return QSize(16 * SWATCH, sum(sizes[palette] // 32 for palette in palettes) * SWATCH)
+    import IUTiles
+    for name, palname, cols, tiles in IUTiles.IMAGES:
+        if name == image:
+            return QSize(cols * 8 * SCALE, -(-tiles // cols) * 8 * SCALE)
+
+
+def toImage(rgba, scale=1):
+    # RGBA array (height, width, 4) -> QImage (a copy, the array can be freed)
+    height, width = rgba.shape[:2]
+    image = QImage(rgba.tobytes(), width, height, width * 4, QImage.Format_RGBA8888)
+    if scale == 1:
+        return image.copy()
+    return image.scaled(width * scale, height * scale)
+
+
+def decode(column, data):
+    # Decode the thumbnail of a column from its asset data (image first, then the palettes)
+    import IUTiles
+
+    title, image, palettes = COLUMNS[column]
+    if image is None:
+        # Every palette is 16 colours, swatches are opaque (colour 0 included)
+        blocks = [block[i:i + 32] for block in data for i in range(0, len(block), 32)]
+        rgba = IUTiles.decodePalettes(blocks)
+        rgba[..., 3] = 255
+        return toImage(rgba.repeat(SWATCH, axis=0).repeat(SWATCH, axis=1))
+
+    for name, palname, cols, tiles in IUTiles.IMAGES:
+        if name == image:
+            indexes = IUTiles.decodeTiles([data[0]], cols, tiles)
+            rgba = IUTiles.renderImages(indexes, IUTiles.decodePalettes([data[1]]))[0]
+            return toImage(rgba, SCALE)
+
+
+class ImageCache(object):
+    # Least recently used QImages, at most limit bytes in total
+    def __init__(self, limit=CACHESIZE):
+        self.limit = limit
+        self.size = 0
+        self.images = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.images)
+
+    def get(self, key):
+        image = self.images.get(key)
+        if image is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.images.move_to_end(key)
+        return image
+
+    def put(self, key, image):
+        if key in self.images:
+            self.size -= self.images.pop(key).sizeInBytes()
+        self.images[key] = image
+        self.size += image.sizeInBytes()
+        while self.size > self.limit and len(self.images) > 1:
+            key, old = self.images.popitem(last=False)
+            self.size -= old.sizeInBytes()
+
+    def clear(self):
+        self.images.clear()
+        self.size = 0
+
+
+class PreviewModel(QAbstractTableModel):
+    def __init__(self, parent=None, cache=None):
+        super(PreviewModel, self).__init__(parent)
+        self.cache = cache if cache is not None else ImageCache()
+        # [(abv, [(cache key, asset data) for each column])]
+        self.teams = []
+        self.decoding = importlib.util.find_spec('numpy') is not None
+
+    def setRom(self, rom, teamcnt, romtype):
+        # Show the teams of a ROM (None to clear the grid)
+        # The asset data is copied, so the ROM can be closed while the grid is shown
+        teams = []
+        if rom is not None:
+            kinds = dict((Path(file).stem, kind) for kind, (file, loc, size) in enumerate(IUEngine.ASSETS))
+            imgoffsets = IUEngine.getImgOffsets(romtype, teamcnt)
+            for count, ptr, tminfo in IUEngine.romIndex(rom, teamcnt).teams(rom):
+                assets = IUEngine.readAssets(rom, ptr, tminfo, imgoffsets[count])
+                cells = []
+                for column, (title, image, palettes) in enumerate(COLUMNS):
+                    data = [bytes(assets[kinds[name]][1]) for name in ([image] if image else []) + palettes]
+                    digest = hashlib.sha1(b''.join(data))
+                    cells.append(((column, digest.digest()), data))
+                teams.append((tminfo['abv'], cells))
+
+        self.beginResetModel()
+        self.teams = teams
+        self.endResetModel()
+
+    def rowCount(self, parent=None):
+        return len(self.teams)
+
+    def columnCount(self, parent=None):
+        return len(COLUMNS)
+
+    def thumbnail(self, row, column):
+        # Decoded thumbnail of a cell, from the cache if it was decoded before
+        key, data = self.teams[row][1][column]
+        image = self.cache.get(key)
+        if image is None:
+            image = decode(column, data)
+            self.cache.put(key, image)
+        return image
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DecorationRole and self.decoding:
+            return self.thumbnail(index.row(), index.column())
+        if role == Qt.ToolTipRole:
+            return self.teams[index.row()][0] + " " + COLUMNS[index.column()][0]
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return COLUMNS[section][0]
+        return self.teams[section][0]
+
+
+def setupView(view, model):
+    # Fixed cell sizes (from the thumbnail sizes), so the view never has to decode a cell to lay out the grid
+    view.setModel(model)
+    header = view.horizontalHeader()
+    header.setSectionResizeMode(QHeaderView.Fixed)
+    height = 0
+    for column in range(len(COLUMNS)):
+        size = columnSize(column) if model.decoding else QSize(96, 0)
+        header.resizeSection(column, size.width() + MARGIN)
+        height = max(height, size.height())
+    rows = view.verticalHeader()
+    rows.setSectionResizeMode(QHeaderView.Fixed)
+    rows.setDefaultSectionSize(height + MARGIN)
@@ -0,0 +1,393 @@
+# """ Memory-mapped access to a Genesis ROM file """
+# The ROM is mapped copy-on-write (private copy), so writes never reach the original file: only the pages
+# that are written to get a private copy, the rest is read straight from the file.
+# The modified byte ranges are kept (sorted, merged), so the edits can be listed without comparing ROMs.
+# Nothing is copied until save() is called, which writes the ROM once, atomically.
+# A ROM inside a .zip or .gz archive is decompressed into memory instead (ROMs are only a few MB), and a file
+# saved under a .zip or .gz name is compressed as it is written.
+
+from array import array
+import bisect
+from contextlib import contextmanager
+import gzip
+import hashlib
+import mmap
+import os
+from pathlib import Path
+import struct
+import sys
+import zipfile
+import zlib
+
+from IUTrace import stage
+
+# Genesis header: "SEGA" at 0x100, checksum at 0x18E (16 bit sum of the words from 0x200 to the end)
+HEADER = 0x100
+CHECKSUM = 0x18E
+CHECKSTART = 0x200
+
+ROMTYPES = ('.bin', '.smc')
+ARCHIVES = ('.gz', '.zip')
+
+# Bytes compressed at a time when writing an archive
+CHUNK = 1 << 20
+
+# A mapped file can not be replaced on Windows: saving over the mapped ROM closes the map first (see RomFile.save)
+REMAP = os.name == 'nt'
+
+
+def syncFolder(folder):
+    # Make a rename in folder durable (not possible on Windows, where it is not needed)
+    if not hasattr(os, 'O_DIRECTORY'):
+        return
+    fd = os.open(folder, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def wordSum(data):
+    # Sum of the big-endian 16 bit words of data (an odd last byte is ignored), without a Python loop:
+    # with NumPy if it is installed, else with array
+    words = len(data) // 2
+    try:
+        import numpy
+    except ImportError:
+        values = array('H')
+        values.frombytes(data[:2 * words])
+        if sys.byteorder == 'little':
+            values.byteswap()
+        return sum(values)
+    return int(numpy.frombuffer(data, '>u2', words).sum(dtype=numpy.uint64))
+
+
+def isArchive(filename):
+    return Path(filename).suffix.lower() in ARCHIVES
+
+
+def archiveMember(filename):
+    # Name of the file inside an archive written by openOutput: the archive name without .gz / .zip
+    # (.bin is added to a bare name, x.zip holds x.bin)
+    name = Path(filename).stem
+    return name if Path(name).suffix else name + ".bin"
+
+
+def romMember(archive):
+    # Name of the ROM inside an open zip archive: the first .bin / .smc file, or its only file (None if none)
+    names = [info.filename for info in archive.infolist() if not info.is_dir()]
+    for name in names:
+        if Path(name).suffix.lower() in ROMTYPES:
+            return name
+    return names[0] if len(names) == 1 else None
+
+
+def isRomName(filename):
+    # True for a ROM file name, a compressed ROM (x.bin.gz) or a zip archive holding a ROM
+    suffix = Path(filename).suffix.lower()
+    if suffix == '.zip':
+        try:
+            with zipfile.ZipFile(filename) as archive:
+                return romMember(archive) is not None
+        except (EnvironmentError, zipfile.BadZipFile):
+            return False
+    if suffix == '.gz':
+        suffix = Path(Path(filename).stem).suffix.lower()
+    return suffix in ROMTYPES
+
+
+def romStem(filename):
+    # ROM file name without its extensions (x.bin, x.bin.gz and x.zip -> x)
+    name = Path(filename).name
+    if isArchive(name):
+        name = Path(name).stem
+    return Path(name).stem if Path(name).suffix.lower() in ROMTYPES else name
+
+
+def checkOutputs(roms, output):
+    # Raise ValueError if two of roms would be written to the same output (output(rom) -> its file or folder)
+    # Names are compared ignoring case (as on Windows and macOS)
+    seen = {}
+    clashes = []
+    for rom in roms:
+        out = str(output(rom))
+        if out.lower() in seen:
+            clashes.append(seen[out.lower()] + " and " + rom + " would both be written to " + out + ".")
+        else:
+            seen[out.lower()] = rom
+    if clashes:
+        raise ValueError("Nothing was done, rename the ROMs or run them separately:\n" + "\n".join(clashes))
+
+
+def openSource(filename):
+    # Binary file to read: a plain file, the decompressed contents of a .gz file, or the ROM inside a .zip
+    suffix = Path(filename).suffix.lower()
+    if suffix == '.gz':
+        return gzip.open(filename, 'rb')
+    if suffix == '.zip':
+        try:
+            with zipfile.ZipFile(filename) as archive:
+                member = romMember(archive)
+                if member is None:
+                    raise ValueError(str(filename) + " does not hold a ROM (.bin or .smc file).")
+                # The member stays readable after the archive object is closed
+                return archive.open(member)
+        except zipfile.BadZipFile:
+            raise ValueError(str(filename) + " is not a valid zip archive.")
+    return open(filename, 'rb')
+
+
+def readSource(filename):
+    # Contents of a file (decompressed, see openSource)
+    with openSource(filename) as f:
+        return f.read()
+
+
+def mapFile(filename, access=mmap.ACCESS_READ):
+    # Memory map of a file; the contents of an archive are decompressed into an anonymous map instead, which
+    # works the same (raises ValueError if the file is empty or the archive is damaged)
+    if not isArchive(filename):
+        with open(filename, 'rb') as f:
+            try:
+                return mmap.mmap(f.fileno(), 0, access=access)
+            except ValueError:
+                raise ValueError(str(filename) + " is empty.")
+
+    try:
+        data = readSource(filename)
+    except (EOFError, zlib.error) as e:
+        raise ValueError(str(filename) + " is damaged: " + str(e))
+    if not data:
+        raise ValueError(str(filename) + " is empty.")
+    anonymous = mmap.mmap(-1, len(data))
+    anonymous.write(data)
+    return anonymous
+
+
+@contextmanager
+def atomicFile(filename):
+    # Binary file to write filename atomically: it is written to a file next to filename, synced to disk, then
+    # renamed over filename, so an interrupted write never leaves a partial file
+    # On POSIX, replacing a mapped ROM is safe (the map keeps the old file); Windows refuses to replace a file
+    # that is mapped, see RomFile.save
+    filename = os.path.abspath(str(filename))
+    temp = filename + ".tmp" + str(os.getpid())
+    try:
+        with open(temp, 'wb') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp, filename)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    syncFolder(os.path.dirname(filename))
+
+
+@contextmanager
+def openOutput(filename, member=None):
+    # Binary file to write filename atomically (see atomicFile), compressed as it is written if filename ends
+    # with .gz or .zip (member - name of the file inside, default: see archiveMember)
+    suffix = Path(filename).suffix.lower()
+    member = member or archiveMember(filename)
+    with atomicFile(filename) as f:
+        if suffix == '.gz':
+            with gzip.GzipFile(member, 'wb', fileobj=f, mtime=0) as out:
+                yield out
+        elif suffix == '.zip':
+            with zipfile.ZipFile(f, 'w', zipfile.ZIP_DEFLATED) as archive, archive.open(member, 'w') as out:
+                yield out
+        else:
+            yield f
+
+
+def writeFile(filename, data):
+    # Write data to filename atomically (compressed for a .gz / .zip name, see openOutput)
+    data = memoryview(data)
+    with openOutput(filename) as f:
+        for pos in range(0, max(len(data), 1), CHUNK):
+            f.write(data[pos:pos + CHUNK])
+
+
+def fileHash(filename):
+    # SHA-256 of a file on disk (of the decompressed contents of an archive, see openSource)
+    digest = hashlib.sha256()
+    with openSource(filename) as f:
+        for block in iter(lambda: f.read(CHUNK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class RomFile(object):
+    def __init__(self, filename):
+        # Map the whole ROM file (private copy), or load it from a .zip / .gz archive
+        self.filename = str(filename)
+        self.map = mapFile(self.filename, mmap.ACCESS_COPY)
+        self.view = memoryview(self.map)
+        self.size = len(self.map)
+        self.digest = None
+        self.journal = None
+        # Modified byte ranges [(start, end)], sorted and not overlapping
+        self.spans = []
+        # Sum of the words from CHECKSTART on (None until checksum() is called, then kept up to date)
+        self.wordsum = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.size
+
+    def checkRange(self, offset, size):
+        # Make sure a field lies inside the ROM
+        if offset < 0 or size < 0 or offset + size > self.size:
+            raise ValueError("Offset " + hex(offset) + " (+" + hex(size) + ") is outside of the ROM (size "
+                             + hex(self.size) + ").")
+
+    def read(self, offset, size):
+        # Zero-copy view of size bytes at offset
+        self.checkRange(offset, size)
+        return self.view[offset:offset + size]
+
+    def byte(self, offset):
+        self.checkRange(offset, 1)
+        return self.map[offset]
+
+    def word(self, offset):
+        # Big-endian 16 bit value
+        self.checkRange(offset, 2)
+        return struct.unpack_from('>H', self.map, offset)[0]
+
+    def long(self, offset):
+        # Big-endian 32 bit value
+        self.checkRange(offset, 4)
+        return struct.unpack_from('>I', self.map, offset)[0]
+
+    def write(self, offset, data):
+        # Write data into the private copy of the ROM
+        self.checkRange(offset, len(data))
+        if self.journal is not None:
+            self.journal.append((offset, bytes(self.map[offset:offset + len(data)])))
+        # Only the words under the write are summed again for the checksum
+        start, end = max(offset & ~1, CHECKSTART), min((offset + len(data) + 1) & ~1, self.size & ~1)
+        summed = self.wordsum is not None and start < end
+        if summed:
+            self.wordsum -= wordSum(self.view[start:end])
+        self.map[offset:offset + len(data)] = data
+        if summed:
+            self.wordsum += wordSum(self.view[start:end])
+        self.digest = None
+        if data:
+            self.mark(offset, offset + len(data))
+
+    def mark(self, start, end):
+        # Add [start, end) to the modified ranges, merging it with the ranges it touches
+        spans = self.spans
+        i = bisect.bisect_left(spans, (start, start))
+        if i > 0 and spans[i - 1][1] >= start:
+            i -= 1
+        j = i
+        while j < len(spans) and spans[j][0] <= end:
+            start, end = min(start, spans[j][0]), max(end, spans[j][1])
+            j += 1
+        spans[i:j] = [(start, end)]
+
+    def modified(self):
+        # True if the ROM has been written to
+        return bool(self.spans)
+
+    def patches(self):
+        # The modified ranges with their current bytes: [(offset, data)]
+        return [(start, bytes(self.view[start:end])) for start, end in self.spans]
+
+    def begin(self):
+        # Start keeping the old bytes of every write, so the writes can be undone with rollback()
+        self.journal = []
+        self.savedspans = list(self.spans)
+        self.savedsum = self.wordsum
+
+    def commit(self):
+        # Keep the writes made since begin()
+        self.journal = None
+
+    def rollback(self):
+        # Undo the writes made since begin()
+        journal, self.journal = self.journal or [], None
+        for offset, data in reversed(journal):
+            self.map[offset:offset + len(data)] = data
+        self.spans = self.savedspans
+        self.wordsum = self.savedsum
+        self.digest = None
+
+    def isGenesis(self):
+        # True if the ROM has a Genesis header
+        return self.size > CHECKSTART and self.map[HEADER:HEADER + 4] == b'SEGA'
+
+    def checksum(self):
+        # Genesis checksum of the current contents (the sum is computed once, then updated by write())
+        if self.wordsum is None:
+            with stage("checksum"):
+                self.wordsum = wordSum(self.view[CHECKSTART:]) if self.size > CHECKSTART else 0
+        return self.wordsum & 0xFFFF
+
+    def headerChecksum(self):
+        # Checksum stored in the Genesis header
+        return self.word(CHECKSUM)
+
+    def fixChecksum(self):
+        # Write the checksum of the current contents into the header (if it differs), returns (old, new)
+        old, new = self.headerChecksum(), self.checksum()
+        if old != new:
+            self.write(CHECKSUM, struct.pack('>H', new))
+        return old, new
+
+    def hash(self):
+        # SHA-256 of the current ROM contents (kept until the next write)
+        if self.digest is None:
+            with stage("rom hash"):
+                self.digest = hashlib.sha256(self.view).hexdigest()
+        return self.digest
+
+    def save(self, filename):
+        # Write the (modified) ROM to filename, atomically and compressed for a .gz / .zip name (see writeFile)
+        with stage("rom save"):
+            if REMAP and self.isMapped(filename):
+                self.saveOver()
+            else:
+                writeFile(filename, self.view)
+
+    def isMapped(self, filename):
+        # True if filename is the file the ROM is mapped from (an archived ROM is in memory, it is not mapped)
+        return (not isArchive(self.filename) and os.path.exists(str(filename))
+                and os.path.samefile(str(filename), self.filename))
+
+    def saveOver(self):
+        # Save the ROM over the file it is mapped from, where a mapped file can not be replaced: the map is
+        # closed for the save, then the saved file (or the old one, if the save failed) is mapped again, with the
+        # contents of the ROM put back into its private copy
+        data = bytes(self.view)
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            self.view = memoryview(self.map)
+            raise ValueError("Parts of " + self.filename + " are still in use, it can not be saved over. Save it "
+                             "to another file.")
+        try:
+            writeFile(self.filename, data)
+        finally:
+            self.map = mapFile(self.filename, mmap.ACCESS_COPY)
+            self.view = memoryview(self.map)
+            self.view[:] = data
+
+    def close(self):
+        self.view.release()
+        try:
+            self.map.close()
+        except BufferError:
+            # A caller still holds a view of the ROM, the map is released with it
+            pass
@@ -0,0 +1,69 @@
+# """ Roster export: every player of every team of a ROM, as CSV or JSON Lines """
+# Players are streamed one at a time (see IUEngine.players) straight from the mapped ROM and written as they
+# are read, so memory stays bounded however many ROMs are exported: one pass per ROM, one ROM open at a time.
+
+import csv
+import json
+from pathlib import Path
+
+import IUDetect
+import IUEngine
+from IURom import RomFile, romStem
+
+FORMATS = {'csv': '.csv', 'jsonl': '.jsonl'}
+
+FIELDS = ["rom", "team", "abv", "number", "name", "jno", "pos"] + IUEngine.ATTRIBUTES
+
+
+def rosterRows(rom, teamcnt, romname=None):
+    # Generator of the players of every team (dictionaries with the FIELDS keys)
+
+    index = IUEngine.romIndex(rom, teamcnt)
+    for count, ptr, tminfo in index.teams(rom):
+        team = tminfo['city'] + " " + tminfo['name']
+        for number, player in enumerate(IUEngine.players(rom, ptr, tminfo['ploff'], tminfo['plsize'])):
+            row = dict(rom=romname, team=team, abv=tminfo['abv'], number=number + 1)
+            row.update(player)
+            yield row
+
+
+def writeRows(rows, f, fmt):
+    # Write rows to the open text file f as CSV or JSON Lines, returns the number of rows
+
+    count = 0
+    if fmt == 'csv':
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            count += 1
+    else:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+            count += 1
+
+    return count
+
+
+def exportRoster(romfile, outfile, teamcnt=None, fmt='csv'):
+    # Export the rosters of one ROM file to outfile, returns the number of players
+    # teamcnt - number of teams, detected from the ROM if None
+
+    if fmt not in FORMATS:
+        raise ValueError("Unknown roster format: " + str(fmt) + " (must be csv or jsonl)")
+
+    Path(outfile).parent.mkdir(parents=True, exist_ok=True)
+    with RomFile(romfile) as rom, open(outfile, 'w', encoding="utf-8", newline='') as f:
+        return writeRows(rosterRows(rom, IUDetect.teamCount(rom, teamcnt), Path(romfile).name), f, fmt)
+
+
+def exportRosters(roms, outdir, teamcnt=None, fmt='csv'):
+    # Export the rosters of many ROM files, one outdir/<rom stem>.csv (or .jsonl) per ROM
+    # Yields (rom, number of players, error) as each ROM is done, a failing ROM does not stop the others
+
+    for romfile in roms:
+        outfile = Path(outdir) / (romStem(romfile) + FORMATS[fmt])
+        try:
+            yield romfile, exportRoster(romfile, outfile, teamcnt, fmt), None
+        except (EnvironmentError, ValueError) as e:
+            yield romfile, 0, str(e)
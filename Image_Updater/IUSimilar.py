@@ -0,0 +1,295 @@
+# """ Perceptual hash index of team images: find the same logo (or a retouched one) across many ROMs """
+# Every Team Logo, Rink Logo and Banner is decoded (see IUTiles) and reduced to a 64 bit difference hash
+# (dHash): the image is turned grey, shrunk to 9x8 blocks, and each bit tells whether a block is brighter
+# than the block to its right. A one-pixel fix, or a recoloured palette that keeps the light and dark parts,
+# changes only a few bits, so similar images are the ones within a small Hamming distance.
+#
+# The hashes are kept in a SQLite database. Each hash is also stored as 4 indexed 16 bit bands (multi-index
+# hashing): a hash within distance d of the query has at least one band within d // 4 of the same band of the
+# query, so a query only reads the rows having one of those (few) band values, and computes the exact
+# distance of those alone, instead of comparing every image.
+# Needs NumPy.
+
+from glob import glob
+import hashlib
+from itertools import combinations
+import os
+from pathlib import Path
+import sqlite3
+
+import numpy as np
+
+import IUBatch
+import IUDetect
+import IUEngine
+import IUPack
+import IUTiles
+from IURom import RomFile, fileHash, isRomName
+
+# Hash of HASHSIZE rows of HASHSIZE bits, split in BANDS bands of BANDBITS bits
+HASHSIZE = 8
+BANDS = 4
+BANDBITS = 16
+
+# Default largest distance of a match, and number of matches listed
+DISTANCE = 10
+LIMIT = 20
+
+# Most values in one IN (...) list (older SQLite versions allow 999 parameters)
+MAXVALUES = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    source TEXT PRIMARY KEY,
+    digest TEXT
+);
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL,
+    team TEXT NOT NULL,
+    image TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    hash INTEGER NOT NULL,
+    b0 INTEGER NOT NULL,
+    b1 INTEGER NOT NULL,
+    b2 INTEGER NOT NULL,
+    b3 INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS images_source ON images (source);
+CREATE INDEX IF NOT EXISTS images_b0 ON images (image, b0);
+CREATE INDEX IF NOT EXISTS images_b1 ON images (image, b1);
+CREATE INDEX IF NOT EXISTS images_b2 ON images (image, b2);
+CREATE INDEX IF NOT EXISTS images_b3 ON images (image, b3);
+"""
+
+
+def shrink(grey, rows, cols):
+    # Average of a grey image over a grid of rows x cols blocks
+    height, width = grey.shape
+    ys = np.arange(rows) * height // rows
+    xs = np.arange(cols) * width // cols
+    sums = np.add.reduceat(np.add.reduceat(grey, ys, axis=0), xs, axis=1)
+    return sums / np.outer(np.diff(np.append(ys, height)), np.diff(np.append(xs, width)))
+
+
+def imageHash(rgba):
+    # 64 bit difference hash of an RGBA image (height, width, 4), transparent pixels count as black
+    grey = rgba[..., :3].astype(np.float32) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+    grey *= rgba[..., 3] / np.float32(255)
+    small = shrink(grey, HASHSIZE, HASHSIZE + 1)
+    return int.from_bytes(np.packbits(small[:, 1:] > small[:, :-1]).tobytes(), 'big')
+
+
+def imageDigest(rgba):
+    # Identity of the decoded pixels (same digest - same image, whatever bytes it was stored as)
+    return hashlib.sha1(np.ascontiguousarray(rgba).tobytes()).hexdigest()
+
+
+def bands(value):
+    return [(value >> (BANDBITS * i)) & ((1 << BANDBITS) - 1) for i in range(BANDS)]
+
+
+def nearBands(band, radius):
+    # Every band value within radius bits of band
+    values = []
+    for bits in range(radius + 1):
+        for flips in combinations(range(BANDBITS), bits):
+            value = band
+            for bit in flips:
+                value ^= 1 << bit
+            values.append(value)
+    return values
+
+
+def distance(a, b):
+    return bin(a ^ b).count("1")
+
+
+def signed(value):
+    # SQLite integers are signed 64 bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+class HashIndex(object):
+    def __init__(self, filename):
+        self.filename = str(filename)
+        self.db = sqlite3.connect(self.filename)
+        self.db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM images").fetchone()[0]
+
+    def isCurrent(self, source, digest):
+        # True if source was indexed with the same contents (digest) already
+        row = self.db.execute("SELECT digest FROM sources WHERE source = ?", (source,)).fetchone()
+        return digest is not None and row is not None and row[0] == digest
+
+    def add(self, source, images, digest=None):
+        # Replace the images of a source: images - list of (team abv, image name, RGBA image)
+        rows = []
+        for abv, image, rgba in images:
+            value = imageHash(rgba)
+            rows.append((source, abv, image, imageDigest(rgba), signed(value)) + tuple(bands(value)))
+        with self.db:
+            self.db.execute("DELETE FROM images WHERE source = ?", (source,))
+            self.db.executemany("INSERT INTO images (source, team, image, digest, hash, b0, b1, b2, b3) "
+                                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self.db.execute("INSERT OR REPLACE INTO sources (source, digest) VALUES (?, ?)", (source, digest))
+        return len(rows)
+
+    def similar(self, value, image, maxdistance=DISTANCE, limit=LIMIT):
+        # Indexed images of kind image within maxdistance of the hash value, nearest first:
+        # list of (distance, source, team, image, digest)
+        radius = maxdistance // BANDS
+        found = {}
+        for i, band in enumerate(bands(value)):
+            values = nearBands(band, radius)
+            for start in range(0, len(values), MAXVALUES):
+                chunk = values[start:start + MAXVALUES]
+                query = ("SELECT id, source, team, image, digest, hash FROM images WHERE image = ? AND b" + str(i)
+                         + " IN (" + ",".join("?" * len(chunk)) + ")")
+                for row in self.db.execute(query, [image] + chunk):
+                    found[row[0]] = row[1:]
+
+        matches = []
+        for source, team, name, digest, stored in found.values():
+            d = distance(value, stored & ((1 << 64) - 1))
+            if d <= maxdistance:
+                matches.append((d, source, team, name, digest))
+        matches.sort()
+        return matches[:limit]
+
+    def close(self):
+        self.db.close()
+
+
+def isAssetFolder(folder):
+    # True if a folder holds <ABV>/ team folders with image assets (as written by extract)
+    names = [image + ".txt" for image, palette, cols, tiles in IUTiles.IMAGES]
+    return any(p.is_dir() and any((p / name).exists() for name in names) for p in Path(folder).iterdir())
+
+
+def findSources(source):
+    # What to index for a command line argument: [('rom', file) or ('assets', path)]
+    # source - a ROM, extracted assets (import folder, zip, asset pack or store manifest), or a directory or
+    # glob pattern of those (such as the output of batch)
+    if IUBatch.isRom(source):
+        return [('rom', source)]
+    if Path(source).is_file():
+        return [('assets', source)]
+    if Path(source).is_dir():
+        if isAssetFolder(source):
+            return [('assets', source)]
+        found = []
+        for p in sorted(Path(source).iterdir()):
+            if p.is_file() and isRomName(p):
+                found.append(('rom', str(p)))
+            elif p.is_dir() and isAssetFolder(p):
+                found.append(('assets', str(p)))
+            elif p.is_file() and (IUEngine.isZip(p) or IUPack.isPack(p)):
+                found.append(('assets', str(p)))
+        return found
+    return [found for match in sorted(glob(source)) for found in findSources(match)]
+
+
+def indexSource(index, kind, path, teamcnt, romtype):
+    # Index the images of a ROM or of extracted assets, returns the number of images (None if the ROM was
+    # indexed already, unchanged)
+    # (teamcnt / romtype None: detected from the ROM)
+    source = os.path.abspath(path)
+    if kind == 'rom':
+        digest = fileHash(path) + ":" + str(teamcnt) + ":" + str(romtype)
+        if index.isCurrent(source, digest):
+            return None
+        with RomFile(path) as rom:
+            teams = IUTiles.romTeams(rom, *IUDetect.romSettings(rom, teamcnt, romtype))
+    else:
+        digest = None
+        with IUEngine.openAssets(path) as assets:
+            teams = IUTiles.sourceTeams(assets)
+    return index.add(source, IUTiles.renderTeams(teams), digest)
+
+
+def indexSources(dbfile, sources, teamcnt, romtype, callback=None):
+    # Index every source of sources (see findSources) into the database dbfile
+    # callback(path, number of images or None if unchanged, error) is called after each source
+    # Returns the number of images in the index
+    with HashIndex(dbfile) as index:
+        for kind, path in sources:
+            try:
+                count, error = indexSource(index, kind, path, teamcnt, romtype), None
+            except (EnvironmentError, ValueError) as e:
+                count, error = 0, str(e)
+            if callback is not None:
+                callback(path, count, error)
+        return len(index)
+
+
+def imageOf(teams, abv, image):
+    for name, kind, rgba in IUTiles.renderTeams(teams):
+        if name == abv and kind == image:
+            return rgba
+    raise ValueError("Team " + abv + " has no " + image + ".")
+
+
+def queryImage(asset, team=None, image=None, teamcnt=None, romtype=None):
+    # Image to look for: (image name, RGBA image)
+    # asset - a PNG file, an image asset file of a team folder (<folder>/<ABV>/Team_Logo.txt), or a ROM (with
+    # the team abv); image is the image name, found from the PNG size or file name if not given
+    path = Path(asset)
+    if path.suffix.lower() == ".png":
+        rgba = IUTiles.readPng(path.read_bytes())
+        if image is None:
+            for name, palette, cols, tiles in IUTiles.IMAGES:
+                if rgba.shape[:2] == (-(-tiles // cols) * 8, cols * 8):
+                    image = name
+                    break
+            else:
+                raise ValueError(asset + " is " + str(rgba.shape[1]) + "x" + str(rgba.shape[0])
+                                 + ", the size of no team image (give --image).")
+        return image, rgba
+
+    if path.suffix.lower() == ".txt":
+        image = image or path.stem
+        with IUEngine.AssetFolder(path.parent.parent) as assets:
+            return image, imageOf([(path.parent.name, assets.team(path.parent.name))], path.parent.name, image)
+
+    if IUBatch.isRom(asset):
+        if team is None:
+            raise ValueError("Give the team (--team ABV) to look for in " + asset + ".")
+        image = image or "Team_Logo"
+        with RomFile(asset) as rom:
+            teams = [t for t in IUTiles.romTeams(rom, *IUDetect.romSettings(rom, teamcnt, romtype)) if t[0] == team]
+        if not teams:
+            raise ValueError(asset + " has no team " + team + ".")
+        return image, imageOf(teams, team, image)
+
+    raise ValueError(asset + " is not a PNG, an image asset file or a ROM.")
+
+
+def findSimilar(dbfile, asset, team=None, image=None, maxdistance=DISTANCE, limit=LIMIT, teamcnt=None,
+                romtype=None):
+    # Indexed images like asset (see queryImage), nearest first:
+    # list of (distance, source, team, image, identical - True if the pixels are the same)
+    if not Path(dbfile).is_file():
+        raise ValueError(str(dbfile) + " is not an image index (create it with the index command).")
+    image, rgba = queryImage(asset, team, image, teamcnt, romtype)
+    digest = imageDigest(rgba)
+    with HashIndex(dbfile) as index:
+        matches = index.similar(imageHash(rgba), image, maxdistance, limit)
+    return [(d, source, abv, name, stored == digest) for d, source, abv, name, stored in matches]
+
+
+def table(matches):
+    # Text table of the matches
+    lines = ["{:>4}  {:<5} {:<10} {}".format("Dist", "Team", "Image", "Source")]
+    for d, source, abv, image, identical in matches:
+        lines.append("{:>4}  {:<5} {:<10} {}{}".format(d, abv, image, source, " (identical)" if identical else ""))
+    lines.append(str(len(matches)) + " matches.")
+    return "\n".join(lines)
@@ -0,0 +1,220 @@
+# """ Free space of a ROM, and relocation of team data into it """
+# Free space is padding: runs of at least MINRUN bytes, outside of the areas the engine knows are in use (Genesis
+# header and vectors, every slot of the team pointer table of the layout, the data of every team a slot points
+# to, active or not, and the image asset slots of every team position of the layout, with the 0xA byte header
+# in front of each rink and team logo).
+# Only padding that is unlikely to be read by the game counts: runs of 0xFF (the fill of an erased chip, and of
+# moved team data), and the run of 0x00 or 0xFF at the end of the ROM (the space an expanded ROM was padded
+# with). Other runs of 0x00 are not free: blank tiles and zeroed tables of the game look the same. They only
+# count inside regions the user gives (known to be unused, e.g. from a disassembly).
+# The whole ROM is scanned in one pass: with NumPy, the positions where the byte value changes are found in
+# one vectorized comparison; without it, a regular expression does the same single pass.
+#
+# FreeList hands out that space (first fit, word aligned for the 68000) and merges released space back.
+# The game reaches the team data (team header, jersey palettes, players, names) only through the team
+# pointer table, so a team can be moved into free space, with room to grow, by rewriting its pointer.
+# The old copy is then filled with padding (FILL), so it is free space for the next move and the next scan.
+# The room after a moved team is left as padding: it is free space too, not reserved for that team.
+#
+# Image assets are not moved. The game finds the images of a team position at fixed offsets (LAYOUTS and
+# STRIDES of IUEngine), through code and tables this tool does not map; the 0xA byte header in front of a
+# rink or team logo is read by that code, its format is not known here. An image moved elsewhere would not be
+# found, so the image slots (headers included) are only ever counted as used.
+
+import bisect
+import re
+import struct
+
+import IUDetect
+import IUEngine
+from IUIndex import PTRSTART, readName, readPtrs, romIndex
+from IURom import CHECKSTART
+
+# Shortest run of padding bytes counted as free space
+MINRUN = 256
+
+# Padding values
+PADDING = (0x00, 0xFF)
+
+# Header in front of each rink and team logo (see STRIDES)
+IMGHEADER = 0xA
+
+# Word alignment of allocations
+ALIGN = 2
+
+# Padding written over the old copy of a moved team
+FILL = 0xFF
+
+
+def paddingRuns(data, minrun=MINRUN):
+    # Runs of a padding byte value in data: [(start, end, value)], in one pass
+    try:
+        import numpy
+    except ImportError:
+        pattern = re.compile(b'|'.join(re.escape(bytes([value])) + b'{' + str(minrun).encode() + b',}'
+                                       for value in PADDING))
+        return [(m.start(), m.end(), data[m.start()]) for m in pattern.finditer(data)]
+
+    a = numpy.frombuffer(data, numpy.uint8)
+    if not a.size:
+        return []
+    change = numpy.flatnonzero(a[1:] != a[:-1]) + 1
+    starts = numpy.concatenate(([0], change))
+    ends = numpy.concatenate((change, [a.size]))
+    values = a[starts]
+    keep = numpy.isin(values, PADDING) & (ends - starts >= minrun)
+    return [(int(s), int(e), int(v)) for s, e, v in zip(starts[keep], ends[keep], values[keep])]
+
+
+def teamSize(rom, ptr):
+    # Size of the team data at ptr: team header, players, then the city, abv, nickname and arena names
+    tmpos = rom.word(ptr + 4)
+    end = ptr + tmpos
+    for name in range(4):
+        text, end = readName(rom, end)
+    return end - ptr
+
+
+def mergeSpans(spans):
+    # Sorted, merged [(start, end)]
+    merged = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def paddingSpans(rom, minrun=MINRUN, regions=()):
+    # Padding runs of rom that can be free space (see above): [(start, end, value)]
+    # Runs of 0x00 before the end of the ROM are cut down to the regions [(start, end)]
+    regions = mergeSpans(regions)
+    spans = []
+    for start, end, value in paddingRuns(rom.view, minrun):
+        if value == FILL or end == rom.size:
+            spans.append((start, end, value))
+            continue
+        for rstart, rend in regions:
+            rstart, rend = max(start, rstart), min(end, rend)
+            if rend - rstart >= minrun:
+                spans.append((rstart, rend, value))
+    return spans
+
+
+def usedSpans(rom, teamcnt, romtype):
+    # Areas of the ROM in use: sorted, merged [(start, end)]
+    # Every slot of the pointer table of the layout is kept, and the data of the inactive slots that point to a team
+    spans = [(0, CHECKSTART), (PTRSTART, PTRSTART + 4 * romtype)]
+
+    index = romIndex(rom, teamcnt)
+    inactive = readPtrs(rom, romtype)[teamcnt:]
+    for ptr in list(index.ptrs) + [ptr for ptr in inactive if IUDetect.isTeam(rom, ptr)]:
+        spans.append((ptr, ptr + teamSize(rom, ptr)))
+
+    sizes = {loc: size for file, loc, size in IUEngine.ASSETS}
+    for offsets in IUEngine.getImgOffsets(romtype, romtype):
+        for loc, offset in offsets.items():
+            header = IMGHEADER if loc in ('rloffset', 'tloffset') else 0
+            spans.append((offset - header, offset + sizes[loc]))
+    return mergeSpans(spans)
+
+
+def freeSpans(rom, teamcnt, romtype, minrun=MINRUN, regions=()):
+    # Free space of a ROM: padding runs (see paddingSpans) minus the used areas, [(start, end, value)]
+    # Runs cut down below minrun by a used area are dropped
+    used = usedSpans(rom, teamcnt, romtype)
+    free = []
+    for start, end, value in paddingSpans(rom, minrun, regions):
+        # Cut out the used areas overlapping the run (the one before it may reach into it)
+        i = max(bisect.bisect_left(used, (start, start)) - 1, 0)
+        while i < len(used) and used[i][0] < end:
+            ustart, uend = used[i]
+            if ustart - start >= minrun:
+                free.append((start, ustart, value))
+            start = max(start, uend)
+            i += 1
+        if end - start >= minrun:
+            free.append((start, end, value))
+    return free
+
+
+class FreeList(object):
+    # Free space of a ROM: sorted, non-overlapping [(start, end)]
+    def __init__(self, spans=()):
+        self.spans = []
+        for span in spans:
+            self.release(span[0], span[1])
+
+    def total(self):
+        return sum(end - start for start, end in self.spans)
+
+    def largest(self):
+        return max([end - start for start, end in self.spans] or [0])
+
+    def allocate(self, size, align=ALIGN):
+        # Take size bytes (starting at a multiple of align) from the first run they fit in, returns the offset
+        for i, (start, end) in enumerate(self.spans):
+            offset = -(-start // align) * align
+            if offset + size <= end:
+                self.spans[i:i + 1] = [span for span in ((start, offset), (offset + size, end)) if span[0] < span[1]]
+                return offset
+        raise ValueError("No free space for " + str(size) + " bytes (the largest free run is " + str(self.largest())
+                         + " bytes).")
+
+    def release(self, start, end):
+        # Give [start, end) back, merged with the runs it touches
+        spans = self.spans
+        i = bisect.bisect_left(spans, (start, start))
+        if i > 0 and spans[i - 1][1] >= start:
+            i -= 1
+        j = i
+        while j < len(spans) and spans[j][0] <= end:
+            start, end = min(start, spans[j][0]), max(end, spans[j][1])
+            j += 1
+        spans[i:j] = [(start, end)]
+
+
+def relocateTeam(rom, count, ptr, freelist, room=0, shared=False):
+    # Move the team data at ptr (team position count) into free space, with room free bytes after it, and
+    # point the team pointer table at the copy. Returns (new offset, size of the team data)
+    # The old copy is filled with padding and given to freelist, unless shared (another pointer uses it)
+    size = teamSize(rom, ptr)
+    new = freelist.allocate(size + room)
+    rom.write(new, bytes(rom.read(ptr, size)))
+    rom.write(PTRSTART + 4 * count, struct.pack('>I', new))
+    if not shared:
+        rom.write(ptr, bytes([FILL]) * size)
+        freelist.release(ptr, ptr + size)
+    return new, size
+
+
+def relocateTeams(rom, abvs, teamcnt, romtype, room=0, minrun=MINRUN, regions=()):
+    # Move the team data of the teams abvs into the free space of rom (see relocateTeam)
+    # Returns messages, one for each team; raises ValueError (nothing is moved) if one does not fit
+    index = romIndex(rom, teamcnt)
+    positions = []
+    for abv in abvs:
+        if abv not in index.abv:
+            raise ValueError("There is no team " + abv + " in the ROM.")
+        if index.abv.index(abv) not in positions:
+            positions.append(index.abv.index(abv))
+
+    freelist = FreeList((start, end) for start, end, value in freeSpans(rom, teamcnt, romtype, minrun, regions))
+    ptrs = list(readPtrs(rom, romtype))
+    messages = []
+    rom.begin()
+    try:
+        for count in positions:
+            ptr = index.ptrs[count]
+            shared = ptrs.count(ptr) > 1
+            new, size = relocateTeam(rom, count, ptr, freelist, room, shared)
+            ptrs[count] = new
+            messages.append(index.abv[count] + ": " + str(size) + " bytes of team data moved from " + hex(ptr)
+                            + " to " + hex(new) + (" (" + str(room) + " bytes of room after it)" if room else "")
+                            + ".")
+    except ValueError:
+        rom.rollback()
+        raise
+    rom.commit()
+    return messages
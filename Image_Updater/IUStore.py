@@ -0,0 +1,171 @@
+# """ Content-addressed asset store shared by many ROM extractions """
+# Every asset block is saved once, under the SHA-256 of its bytes:
+#   <store>/blobs/<first 2 hex digits>/<sha256>
+# Each ROM extraction is a small manifest mapping team and asset file to a hash:
+#   <store>/manifests/<rom stem>.json
+#   {"rom": <rom stem>, "romhash": <sha256 of ROM>, "romtype": 30, "teamcnt": 30,
+#    "teams": [{"abv": "BOS", "assets": {"Rink_Logo.txt": <sha256>, ...}}, ...]}
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+import IUEngine
+
+
+def hashData(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+class AssetStore(object):
+    def __init__(self, root):
+        self.root = Path(root)
+        self.blobs = self.root / "blobs"
+        self.manifests = self.root / "manifests"
+
+    def blobPath(self, digest):
+        return self.blobs / digest[:2] / digest
+
+    def manifestPath(self, name):
+        return self.manifests / (name + ".json")
+
+    def put(self, data):
+        # Save a block (if it is not already stored), returns its hash
+        digest = hashData(data)
+        path = self.blobPath(digest)
+        if not path.exists():
+            path.parent.mkdir(parents=True, exist_ok=True)
+            temp = path.with_name(digest + ".tmp" + str(os.getpid()))
+            with temp.open("wb") as f:
+                f.write(data)
+            os.replace(temp, path)
+        return digest
+
+    def get(self, digest):
+        # Read a block, checking it against its hash
+        try:
+            data = self.blobPath(digest).read_bytes()
+        except FileNotFoundError:
+            raise ValueError("Asset " + digest + " is missing from the store " + str(self.root) + ".")
+        if hashData(data) != digest:
+            raise ValueError("Asset " + digest + " in the store " + str(self.root) + " is corrupted.")
+        return data
+
+    def readManifest(self, name):
+        with self.manifestPath(name).open("r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def writeManifest(self, name, manifest):
+        self.manifests.mkdir(parents=True, exist_ok=True)
+        path = self.manifestPath(name)
+        temp = path.with_name(path.name + ".tmp" + str(os.getpid()))
+        with temp.open("w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=1)
+        os.replace(temp, path)
+
+    def manifestNames(self):
+        if not self.manifests.exists():
+            return []
+        return sorted(p.stem for p in self.manifests.glob("*.json"))
+
+    def referenced(self):
+        # Set of hashes used by any manifest
+        used = set()
+        for name in self.manifestNames():
+            for team in self.readManifest(name)['teams']:
+                used.update(team['assets'].values())
+        return used
+
+    def stored(self):
+        # Set of hashes present in the store
+        if not self.blobs.exists():
+            return set()
+        return set(p.name for p in self.blobs.glob("??/*") if ".tmp" not in p.name)
+
+    def verify(self):
+        # Integrity check, returns a list of problems (empty if the store is fine)
+        problems = []
+        for digest in sorted(self.stored()):
+            if hashData(self.blobPath(digest).read_bytes()) != digest:
+                problems.append("corrupted blob " + digest)
+        stored = self.stored()
+        for name in self.manifestNames():
+            for team in self.readManifest(name)['teams']:
+                for file, digest in team['assets'].items():
+                    if digest not in stored:
+                        problems.append(name + ": " + team['abv'] + "/" + file + " is missing (" + digest + ")")
+        return problems
+
+    def gc(self):
+        # Remove blobs (and leftover temp files) that no manifest refers to, returns the number removed
+        used = self.referenced()
+        removed = 0
+        if not self.blobs.exists():
+            return removed
+        for path in self.blobs.glob("??/*"):
+            if path.name not in used:
+                path.unlink()
+                removed += 1
+        for folder in self.blobs.iterdir():
+            if folder.is_dir() and not any(folder.iterdir()):
+                folder.rmdir()
+        return removed
+
+
+class StoreAssets(object):
+    # Import source: a manifest of the asset store
+    def __init__(self, manifestfile):
+        manifestfile = Path(manifestfile)
+        self.manifestfile = manifestfile
+        self.store = AssetStore(manifestfile.parent.parent)
+        self.manifest = self.store.readManifest(manifestfile.stem)
+        self.assets = {team['abv']: team['assets'] for team in self.manifest['teams']}
+        self.kinds = {file: kind for kind, (file, loc, size) in enumerate(IUEngine.ASSETS)}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def teams(self):
+        return [team['abv'] for team in self.manifest['teams']]
+
+    def team(self, abv):
+        if abv not in self.assets:
+            return None
+        for file in self.assets[abv]:
+            if file not in self.kinds:
+                raise ValueError("Unknown asset " + abv + "/" + file + " in manifest " + str(self.manifestfile) + ".")
+        return {self.kinds[file]: self.store.get(digest) for file, digest in self.assets[abv].items()}
+
+    def close(self):
+        pass
+
+
+def extractStore(rom, store, name, teamcnt, romtype):
+    # Save the assets of every team in the store, and write the manifest <name>.json
+    # If the manifest already describes this exact ROM and settings, nothing is done
+    # Returns the list of team abbreviations in the manifest
+
+    store = AssetStore(store)
+    romhash = rom.hash()
+
+    if store.manifestPath(name).exists():
+        manifest = store.readManifest(name)
+        if (manifest.get('romhash') == romhash and manifest.get('romtype') == romtype
+                and manifest.get('teamcnt') == teamcnt):
+            return [team['abv'] for team in manifest['teams']]
+
+    imgoffsets = IUEngine.getImgOffsets(romtype, teamcnt)
+    index = IUEngine.romIndex(rom, teamcnt)
+    teams = []
+
+    for count, ptr, tminfo in index.teams(rom):
+        assets = {file: store.put(data) for file, data in IUEngine.readAssets(rom, ptr, tminfo, imgoffsets[count])}
+        teams.append(dict(abv=tminfo['abv'], assets=assets))
+
+    store.writeManifest(name, dict(rom=name, romhash=romhash, romtype=romtype, teamcnt=teamcnt, teams=teams))
+
+    return [team['abv'] for team in teams]
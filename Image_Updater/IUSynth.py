@@ -0,0 +1,149 @@
+# """ Synthetic NHL '94 ROM generator, for testing and benchmarking without a real ROM """
+# Builds a ROM that matches the layouts the engine expects (30 or 32 team ROM):
+# - Genesis header at 0x100 (with a valid checksum at 0x18E)
+# - team pointer table at 782, one 4 byte pointer per team
+# - team data: player/name offsets, home/away palettes (ptr + 12 / ptr + 44), F/D and G counts (ptr + 79 / 80),
+#   player records and the length-prefixed city, abv, nickname and arena strings
+# - image assets at the offsets of getImgOffsets, with the 0xA byte headers in front of rink and team logos
+#
+# Usage: python IUSynth.py OUT.bin [--teams N] [--layout 30|32] [--seed N]
+
+import argparse
+import random
+import struct
+import sys
+
+import IUEngine
+from IUIndex import PTRSTART
+import IURom
+
+ROMSIZE = 0x200000
+
+# Team data is placed from here on (well below the image assets of both layouts)
+TEAMDATA = 0x100000
+
+# Header in front of each rink/team logo image: palette offset (4 bytes), tile layout offset (4 bytes),
+# number of tiles (2 bytes)
+IMGHEADER = struct.Struct('>IIH')
+
+TEAMS = [
+    ("Anaheim", "ANH", "Mighty Ducks", "Arrowhead Pond"), ("Boston", "BOS", "Bruins", "Boston Garden"),
+    ("Buffalo", "BUF", "Sabres", "Memorial Auditorium"), ("Calgary", "CGY", "Flames", "Olympic Saddledome"),
+    ("Chicago", "CHI", "Blackhawks", "Chicago Stadium"), ("Dallas", "DAL", "Stars", "Reunion Arena"),
+    ("Detroit", "DET", "Red Wings", "Joe Louis Arena"), ("Edmonton", "EDM", "Oilers", "Northlands Coliseum"),
+    ("Florida", "FLA", "Panthers", "Miami Arena"), ("Hartford", "HFD", "Whalers", "Hartford Civic Center"),
+    ("Los Angeles", "LA", "Kings", "Great Western Forum"), ("Montreal", "MTL", "Canadiens", "Montreal Forum"),
+    ("New Jersey", "NJ", "Devils", "Meadowlands Arena"), ("New York", "NYI", "Islanders", "Nassau Coliseum"),
+    ("New York", "NYR", "Rangers", "Madison Square Garden"), ("Ottawa", "OTT", "Senators", "Civic Centre"),
+    ("Philadelphia", "PHI", "Flyers", "The Spectrum"), ("Pittsburgh", "PIT", "Penguins", "Civic Arena"),
+    ("Quebec", "QUE", "Nordiques", "Le Colisee"), ("San Jose", "SJ", "Sharks", "San Jose Arena"),
+    ("St Louis", "STL", "Blues", "St Louis Arena"), ("Tampa Bay", "TB", "Lightning", "Expo Hall"),
+    ("Toronto", "TOR", "Maple Leafs", "Maple Leaf Gardens"), ("Vancouver", "VAN", "Canucks", "Pacific Coliseum"),
+    ("Washington", "WSH", "Capitals", "Capital Centre"), ("Winnipeg", "WPG", "Jets", "Winnipeg Arena"),
+    ("Colorado", "COL", "Avalanche", "McNichols Arena"), ("Phoenix", "PHX", "Coyotes", "America West Arena"),
+    ("Nashville", "NSH", "Predators", "Nashville Arena"), ("Atlanta", "ATL", "Thrashers", "Philips Arena"),
+    ("Columbus", "CBJ", "Blue Jackets", "Nationwide Arena"), ("Minnesota", "MIN", "Wild", "Xcel Energy Center"),
+]
+
+# Roster of each team: goalies, forwards, defensemen
+ROSTER = (2, 12, 7)
+
+
+def palette(rng, colours):
+    # Random Genesis palette (16 bit words 0000 BBB0 GGG0 RRR0)
+    return b''.join(struct.pack('>H', rng.randrange(0x1000) & 0x0EEE) for i in range(colours))
+
+
+def name(text):
+    # Length-prefixed string (length includes the 2 length bytes)
+    data = text.encode("ascii")
+    return struct.pack('>H', len(data) + 2) + data
+
+
+def teamData(rng, count):
+    # Team data block of team number count
+    city, abv, nick, arena = TEAMS[count % len(TEAMS)]
+    numg, numf, numd = ROSTER
+
+    players = b''
+    for i in range(numg + numf + numd):
+        jersey = (i % 9 + 1) * 10 + i // 9
+        players += name("Player " + abv + " " + chr(65 + i)) + bytes([int(str(jersey), 16)])
+        players += bytes(rng.randrange(256) for j in range(7))
+
+    header = bytearray(82)
+    ploff = len(header)
+    tmpos = ploff + len(players) + 2
+    struct.pack_into('>HHH', header, 0, ploff, 0, tmpos)
+    header[12:44] = palette(rng, 16)
+    header[44:76] = palette(rng, 16)
+    header[79] = (numf << 4) | numd
+    # Goalies: one nibble per goalie, ended by a 0 nibble
+    header[80:82] = bytes.fromhex(("12345678"[:numg] + "0000")[:4])
+
+    return bytes(header) + players + b'\0\0' + name(city) + name(abv) + name(nick) + name(arena)
+
+
+def genesisHeader(rom):
+    # Minimal Genesis header, with the checksum of the ROM from 0x200 on
+    rom[0x100:0x110] = b'SEGA MEGA DRIVE '
+    rom[0x120:0x150] = b'NHL HOCKEY SYNTHETIC'.ljust(0x30)
+    rom[0x150:0x180] = b'NHL HOCKEY SYNTHETIC'.ljust(0x30)
+    struct.pack_into('>II', rom, 0x1A0, 0, len(rom) - 1)
+    struct.pack_into('>H', rom, IURom.CHECKSUM, IURom.wordSum(rom[IURom.CHECKSTART:]) & 0xFFFF)
+
+
+def makeRom(teamcnt=30, romtype=30, seed=0, size=ROMSIZE):
+    # Build a synthetic ROM, returns its bytes
+    if teamcnt > romtype:
+        raise ValueError("A " + str(romtype) + " team ROM can not have " + str(teamcnt) + " teams.")
+
+    rng = random.Random(seed)
+    rom = bytearray(size)
+
+    # Team pointer table and team data
+    ptrs = []
+    pos = TEAMDATA
+    for count in range(teamcnt):
+        data = teamData(rng, count)
+        ptrs.append(pos)
+        rom[pos:pos + len(data)] = data
+        pos += len(data) + (len(data) & 1)
+    struct.pack_into('>' + str(teamcnt) + 'I', rom, PTRSTART, *ptrs)
+
+    # Image assets (for every team slot of the layout)
+    sizes = {loc: size for file, loc, size in IUEngine.ASSETS}
+    for offsets in IUEngine.getImgOffsets(romtype, romtype):
+        for loc, offset in offsets.items():
+            if loc in ('lpoffset', 'hvpaloffset'):
+                data = palette(rng, sizes[loc] // 2)
+            else:
+                data = bytes(rng.randrange(256) for i in range(sizes[loc]))
+            rom[offset:offset + len(data)] = data
+            if loc in ('rloffset', 'tloffset'):
+                rom[offset - IMGHEADER.size:offset] = IMGHEADER.pack(0, 0, sizes[loc] // 32)
+
+    genesisHeader(rom)
+    return bytes(rom)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="IUSynth", description="Build a synthetic NHL '94 ROM.")
+    parser.add_argument("out")
+    parser.add_argument("--teams", type=int, default=30)
+    parser.add_argument("--layout", type=int, choices=sorted(IUEngine.LAYOUTS), default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    try:
+        data = makeRom(args.teams, args.layout, args.seed)
+    except ValueError as e:
+        print("Error: " + str(e), file=sys.stderr)
+        return 1
+    with open(args.out, 'wb') as f:
+        f.write(data)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,416 @@
+# """ Genesis 4bpp tile and 9-bit palette decoding, PNG export of team image assets """
+# Needs NumPy. Whole asset blocks (all teams at once) are unpacked into colour index arrays
+# and mapped through the palettes, there are no per-pixel Python loops.
+#
+# Tiles are 8x8 pixels, 4 bits per pixel (32 bytes per tile, 4 bytes per row, high nibble is the left pixel).
+# Palette colours are 16 bit words: 0000 BBB0 GGG0 RRR0. Colour 0 is transparent.
+
+from pathlib import Path
+import struct
+import zlib
+
+import numpy as np
+
+import IUEngine
+
+TILESIZE = 32
+
+# Tile arrangement of each image: (image asset, palette asset, tiles per row, number of tiles)
+# Tiles are laid out left to right, top to bottom.
+# Team Logo - 0x4CC bytes, the first 36 tiles (0x480 bytes) are the 48x48 logo
+# Rink Logo - 0x300 bytes, 24 tiles, 48x32
+# Banner - 0x2C0 bytes, 22 tiles, 88x16 (uses the first 16 colours of the Home/Visitor Palette)
+IMAGES = [
+    ("Team_Logo", "Team_Logo_Palette", 6, 36),
+    ("Rink_Logo", "Rink_Logo_Jer_Palette_H", 6, 24),
+    ("Banner", "Home_Visitor_Palette", 11, 22),
+]
+
+# 3 bit Genesis colour level -> 8 bit
+LEVELS = (np.arange(8, dtype=np.uint16) * 255 // 7).astype(np.uint8)
+
+
+def assetKinds():
+    # Asset name (file name without .txt) -> asset kind
+    return {Path(file).stem: kind for kind, (file, loc, size) in enumerate(IUEngine.ASSETS)}
+
+
+def decodePalettes(blocks, colours=16):
+    # Palettes (list of bytes, one per image) -> RGBA array (number of palettes, colours, 4)
+    words = np.frombuffer(b''.join(bytes(b[:colours * 2]) for b in blocks), dtype='>u2')
+    words = words.reshape(len(blocks), colours)
+
+    rgba = np.empty(words.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = LEVELS[(words >> 1) & 7]
+    rgba[..., 1] = LEVELS[(words >> 5) & 7]
+    rgba[..., 2] = LEVELS[(words >> 9) & 7]
+    rgba[..., 3] = 255
+    rgba[:, 0, 3] = 0
+    return rgba
+
+
+def decodeTiles(blocks, cols, tiles):
+    # Tile data (list of bytes, one per image) -> colour index array (number of images, height, width)
+    rows = -(-tiles // cols)
+    data = np.zeros((len(blocks), rows * cols * TILESIZE), dtype=np.uint8)
+    for i, block in enumerate(blocks):
+        block = np.frombuffer(block, dtype=np.uint8, count=min(len(block), tiles * TILESIZE))
+        data[i, :block.size] = block
+
+    pixels = np.empty((len(blocks), data.shape[1] * 2), dtype=np.uint8)
+    pixels[:, 0::2] = data >> 4
+    pixels[:, 1::2] = data & 0xF
+
+    # (image, tile row, tile column, y, x) -> (image, tile row, y, tile column, x)
+    pixels = pixels.reshape(len(blocks), rows, cols, 8, 8).transpose(0, 1, 3, 2, 4)
+    return pixels.reshape(len(blocks), rows * 8, cols * 8)
+
+
+def renderImages(indexes, palettes):
+    # Colour indexes (n, height, width) and palettes (n, colours, 4) -> RGBA images (n, height, width, 4)
+    return palettes[np.arange(len(indexes))[:, None, None], indexes]
+
+
+def pngBytes(rgba):
+    # Encode an RGBA image (height, width, 4) as PNG
+    height, width = rgba.shape[:2]
+    raw = np.zeros((height, width * 4 + 1), dtype=np.uint8)
+    raw[:, 1:] = rgba.reshape(height, width * 4)
+
+    def chunk(kind, data):
+        return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 6, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(raw.tobytes(), 6))
+            + chunk(b'IEND', b''))
+
+
+def renderTeams(teams):
+    # teams - list of (abv, {asset kind: data}) -> list of (abv, image name, RGBA image)
+    # Every image kind is decoded for all teams at once
+    kinds = assetKinds()
+    images = []
+
+    for image, palette, cols, tiles in IMAGES:
+        have = [(abv, assets) for abv, assets in teams if kinds[image] in assets and kinds[palette] in assets]
+        if not have:
+            continue
+        indexes = decodeTiles([assets[kinds[image]] for abv, assets in have], cols, tiles)
+        palettes = decodePalettes([assets[kinds[palette]] for abv, assets in have])
+        for (abv, assets), rgba in zip(have, renderImages(indexes, palettes)):
+            images.append((abv, image, rgba))
+
+    return images
+
+
+def writePngs(teams, outdir):
+    # Render the images of every team into outdir/<ABV>/<image>.png, returns the number of files written
+    images = renderTeams(teams)
+    for abv, image, rgba in images:
+        folder = Path(outdir) / abv
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / (image + ".png")).write_bytes(pngBytes(rgba))
+    return len(images)
+
+
+def writeComparison(teamsa, teamsb, outdir, wanted=None, gap=4):
+    # Render the images of the same teams from two sources side by side (A on the left, B on the right)
+    # into outdir/<ABV>_<image>.png, returns the number of files written
+    # wanted - set of (abv, image name) to write (default: all of them)
+    imagesb = {(abv, image): rgba for abv, image, rgba in renderTeams(teamsb)}
+    Path(outdir).mkdir(parents=True, exist_ok=True)
+    count = 0
+    for abv, image, rgba in renderTeams(teamsa):
+        if (abv, image) not in imagesb or (wanted is not None and (abv, image) not in wanted):
+            continue
+        space = np.zeros((rgba.shape[0], gap, 4), dtype=rgba.dtype)
+        both = np.concatenate([rgba, space, imagesb[(abv, image)]], axis=1)
+        (Path(outdir) / (abv + "_" + image + ".png")).write_bytes(pngBytes(both))
+        count += 1
+    return count
+
+
+def romTeams(rom, teamcnt, romtype):
+    # (abv, {asset kind: data}) for every team of a ROM
+    imgoffsets = IUEngine.getImgOffsets(romtype, teamcnt)
+    teams = []
+    for count, ptr, tminfo in IUEngine.romIndex(rom, teamcnt).teams(rom):
+        assets = IUEngine.readAssets(rom, ptr, tminfo, imgoffsets[count])
+        teams.append((tminfo['abv'], {kind: data for kind, (file, data) in enumerate(assets)}))
+    return teams
+
+
+def sourceTeams(assets):
+    # (abv, {asset kind: data}) for every team of an import source (folder, asset pack or store manifest)
+    return [(abv, assets.team(abv)) for abv in assets.teams()]
+
+
+# PNG import (artwork -> tiles and palette)
+
+PNGSIG = b'\x89PNG\r\n\x1a\n'
+CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+
+# Error of artwork using colours its fixed palette does not have
+MISSING = "colours of the image are not in the palette it must use"
+
+
+def unfilter(raw, height, stride, bpp):
+    # Undo the PNG row filters, returns the raw scanlines (height, stride)
+    if len(raw) < height * (stride + 1):
+        raise ValueError("PNG image data is truncated")
+    rows = np.zeros((height, stride), dtype=np.uint8)
+    prev = np.zeros(stride, dtype=np.uint8)
+    pos = 0
+
+    for y in range(height):
+        ftype = raw[pos]
+        line = np.frombuffer(raw, dtype=np.uint8, count=stride, offset=pos + 1).copy()
+        pos += stride + 1
+
+        if ftype == 1:
+            # Sub - running sum of each channel along the row
+            line = (line.reshape(-1, bpp).astype(np.uint32).cumsum(axis=0) & 0xFF).astype(np.uint8).reshape(-1)
+        elif ftype == 2:
+            # Up
+            line += prev
+        elif ftype in (3, 4):
+            # Average / Paeth depend on the byte just decoded, so they have to go byte by byte
+            out = line.tolist()
+            up = prev.tolist()
+            for i in range(stride):
+                left = out[i - bpp] if i >= bpp else 0
+                if ftype == 3:
+                    out[i] = (out[i] + ((left + up[i]) >> 1)) & 0xFF
+                else:
+                    upleft = up[i - bpp] if i >= bpp else 0
+                    p = left + up[i] - upleft
+                    pa, pb, pc = abs(p - left), abs(p - up[i]), abs(p - upleft)
+                    pred = left if pa <= pb and pa <= pc else (up[i] if pb <= pc else upleft)
+                    out[i] = (out[i] + pred) & 0xFF
+            line = np.array(out, dtype=np.uint8)
+        elif ftype != 0:
+            raise ValueError("bad PNG filter type " + str(ftype))
+
+        rows[y] = line
+        prev = line
+
+    return rows
+
+
+def readPng(data):
+    # Decode a (non-interlaced) PNG into an RGBA array (height, width, 4)
+    # Raises ValueError for a file that is not a PNG, or is cut short (such as a file still being saved)
+    if data[:8] != PNGSIG:
+        raise ValueError("not a PNG file")
+
+    pos = 8
+    idat = []
+    header = plte = trns = None
+    while pos < len(data):
+        # Chunk: length (4 bytes), type (4 bytes), data, CRC (4 bytes)
+        if pos + 12 > len(data):
+            raise ValueError("not a valid PNG (truncated)")
+        length, kind = struct.unpack_from('>I4s', data, pos)
+        if pos + 12 + length > len(data):
+            raise ValueError("not a valid PNG (truncated)")
+        body = data[pos + 8:pos + 8 + length]
+        pos += 12 + length
+        if kind == b'IHDR':
+            if length != 13:
+                raise ValueError("not a valid PNG (bad header)")
+            header = struct.unpack('>IIBBBBB', body)
+        elif kind == b'PLTE':
+            if length % 3:
+                raise ValueError("not a valid PNG (bad palette)")
+            plte = np.frombuffer(body, dtype=np.uint8).reshape(-1, 3)
+        elif kind == b'tRNS':
+            trns = body
+        elif kind == b'IDAT':
+            idat.append(body)
+        elif kind == b'IEND':
+            break
+
+    if header is None:
+        raise ValueError("PNG has no header")
+    width, height, depth, ctype, comp, filt, interlace = header
+    if ctype not in CHANNELS or interlace:
+        raise ValueError("unsupported PNG format (colour type " + str(ctype) + ", interlace " + str(interlace) + ")")
+    if depth not in (1, 2, 4, 8, 16) or (ctype not in (0, 3) and depth < 8):
+        raise ValueError("unsupported PNG format (bit depth " + str(depth) + ")")
+
+    channels = CHANNELS[ctype]
+    bits = depth * channels
+    stride = (width * bits + 7) // 8
+    try:
+        raw = zlib.decompress(b''.join(idat))
+    except zlib.error as e:
+        raise ValueError("not a valid PNG (" + str(e) + ")")
+    rows = unfilter(raw, height, stride, max(1, bits // 8))
+
+    if depth < 8:
+        samples = np.unpackbits(rows, axis=1).reshape(height, -1, depth)
+        samples = (samples * (1 << np.arange(depth - 1, -1, -1, dtype=np.uint8))).sum(axis=2, dtype=np.uint8)
+        samples = samples[:, :width, None]
+    else:
+        samples = rows.reshape(height, width, channels, depth // 8)[..., 0]
+
+    rgba = np.full((height, width, 4), 255, dtype=np.uint8)
+    if ctype == 3:
+        if plte is None:
+            raise ValueError("PNG has no palette")
+        lut = np.full((256, 4), 255, dtype=np.uint8)
+        lut[:len(plte), :3] = plte
+        if trns is not None:
+            lut[:len(trns), 3] = np.frombuffer(trns, dtype=np.uint8)
+        rgba = lut[samples[..., 0]]
+    elif ctype in (0, 4):
+        grey = samples[..., 0] if depth >= 8 else samples[..., 0] * (255 // ((1 << depth) - 1))
+        rgba[..., 0] = rgba[..., 1] = rgba[..., 2] = grey
+        if ctype == 4:
+            rgba[..., 3] = samples[..., 1]
+    else:
+        rgba[..., :channels] = samples
+
+    return rgba
+
+
+def rgbLevels(rgba):
+    # RGB -> nearest 3 bit Genesis level of each channel (height, width, 3)
+    return ((rgba[..., :3].astype(np.uint16) * 7 + 127) // 255).astype(np.uint8)
+
+
+def encodePalette(levels):
+    # Colour levels (colours, 3) -> palette bytes (16 bit words 0000 BBB0 GGG0 RRR0)
+    levels = levels.astype('>u2')
+    return ((levels[:, 0] << 1) | (levels[:, 1] << 5) | (levels[:, 2] << 9)).astype('>u2').tobytes()
+
+
+def medianCut(colours, counts, boxes):
+    # Weighted median cut of unique colours (n, 3) -> palette levels (at most boxes, 3)
+    groups = [np.arange(len(colours))]
+    while len(groups) < boxes:
+        # Split the group with the widest channel range
+        spans = [np.ptp(colours[g], axis=0).max() if len(g) > 1 else -1 for g in groups]
+        widest = int(np.argmax(spans))
+        if spans[widest] <= 0:
+            break
+        group = groups.pop(widest)
+        channel = int(np.argmax(np.ptp(colours[group], axis=0)))
+        group = group[np.argsort(colours[group, channel], kind='stable')]
+        weight = np.cumsum(counts[group])
+        cut = int(np.searchsorted(weight, weight[-1] / 2.0))
+        cut = min(max(cut, 1), len(group) - 1)
+        groups += [group[:cut], group[cut:]]
+
+    palette = [np.rint((colours[g] * counts[g, None]).sum(axis=0) / counts[g].sum()) for g in groups]
+    return np.array(palette, dtype=np.uint8)
+
+
+def nearest(levels, palette):
+    # Index of the nearest palette colour (palette index 1 and up) for each colour (n, 3)
+    diff = levels[:, None, :].astype(np.int16) - palette[None, :, :].astype(np.int16)
+    return (diff * diff).sum(axis=2).argmin(axis=1) + 1
+
+
+def quantize(rgba, palette=None, exact=False):
+    # RGBA image -> colour indexes (height, width) and palette levels (16, 3)
+    # Transparent pixels (alpha < 128) get colour 0. The opaque colours are reduced to 15 Genesis colours,
+    # or mapped to the nearest colours of palette (levels of colours 1-15) when one is given.
+    # With exact, every opaque colour must be one of the palette (ValueError if not).
+    levels = rgbLevels(rgba)
+    opaque = rgba[..., 3] >= 128
+    codes = levels[..., 0].astype(np.uint16) | (levels[..., 1].astype(np.uint16) << 3) | \
+        (levels[..., 2].astype(np.uint16) << 6)
+
+    used, inverse, counts = np.unique(codes[opaque], return_inverse=True, return_counts=True)
+    usedlevels = np.stack([used & 7, (used >> 3) & 7, (used >> 6) & 7], axis=1).astype(np.uint8)
+
+    if palette is None:
+        if len(used) <= 15:
+            palette = usedlevels
+        else:
+            palette = medianCut(usedlevels, counts, 15)
+        palette = np.vstack([np.zeros((1, 3), dtype=np.uint8), palette,
+                             np.zeros((15 - len(palette), 3), dtype=np.uint8)])
+    elif exact and len(used):
+        missing = ~(usedlevels[:, None, :] == palette[None, 1:16, :]).all(axis=2).any(axis=1)
+        if missing.any():
+            raise ValueError(str(int(missing.sum())) + " " + MISSING)
+
+    indexes = np.zeros(codes.shape, dtype=np.uint8)
+    if len(used):
+        indexes[opaque] = nearest(usedlevels, palette[1:16])[inverse.reshape(-1)]
+    return indexes, palette
+
+
+def paletteLevels(data):
+    # Palette bytes -> colour levels (16, 3)
+    words = np.frombuffer(bytes(data[:32]), dtype='>u2')
+    return np.stack([(words >> 1) & 7, (words >> 5) & 7, (words >> 9) & 7], axis=1).astype(np.uint8)
+
+
+def encodeTiles(indexes, cols, tiles):
+    # Colour indexes (height, width) -> 4bpp tile data
+    rows = -(-tiles // cols)
+    tiled = indexes.reshape(rows, 8, cols, 8).transpose(0, 2, 1, 3).reshape(-1, 64)[:tiles]
+    return ((tiled[:, 0::2] << 4) | tiled[:, 1::2]).astype(np.uint8).tobytes()
+
+
+def encodeImage(rgba, image, palette=None, exact=False):
+    # Encode an RGBA image for the image asset image (e.g. 'Team_Logo')
+    # Returns tile data and palette bytes (palette is the fixed palette bytes to map to, if given)
+    # Raises ValueError if the size is wrong (or, with exact, if a colour is not in palette)
+    for name, palname, cols, tiles in IMAGES:
+        if name == image:
+            break
+    else:
+        raise ValueError("unknown image " + image)
+
+    width, height = cols * 8, -(-tiles // cols) * 8
+    if rgba.shape[:2] != (height, width):
+        raise ValueError("image is " + str(rgba.shape[1]) + "x" + str(rgba.shape[0]) + ", must be "
+                         + str(width) + "x" + str(height))
+
+    fixed = None if palette is None else paletteLevels(palette)
+    indexes, levels = quantize(rgba, fixed, exact)
+    return encodeTiles(indexes, cols, tiles), encodePalette(levels)
+
+
+def encodeFolder(folder, assets, rompalettes=None):
+    # Replace the image assets of a team folder with its PNG artwork (<image>.png), if any
+    # assets - asset kind -> data read from the hex files of the folder; updated in place
+    # A palette hex file in the folder is kept, and the PNG must only use its colours (a colour it lacks is an
+    # error, the artwork is not snapped to the nearest ones); without it, the PNG's palette is used.
+    # A shared palette (IUEngine.SHAREDPALETTES) is never made from the PNG: without its hex file, the PNG is
+    # mapped to the palette of the ROM (rompalettes - asset kind -> data), and must only use its colours too
+    kinds = assetKinds()
+    folder = Path(folder)
+
+    for image, palette, cols, tiles in IMAGES:
+        filename = folder / (image + ".png")
+        if not filename.exists():
+            continue
+        shared = palette in IUEngine.SHAREDPALETTES
+        fixed = assets.get(kinds[palette])
+        hint = " " + palette + ".txt"
+        if fixed is None and shared:
+            fixed = (rompalettes or {}).get(kinds[palette])
+            if fixed is None:
+                raise ValueError(str(filename) + ": " + palette + ".txt is missing (the palette is shared, it is not "
+                                 "made from the PNG).")
+            hint = " of the ROM (" + palette + ", shared with other graphics)"
+        elif not shared:
+            hint += " (delete it to make the palette from the PNG)"
+        try:
+            rgba = readPng(filename.read_bytes())
+            tiledata, paldata = encodeImage(rgba, image, fixed, exact=fixed is not None)
+        except ValueError as e:
+            raise ValueError(str(filename) + ": " + str(e) + (hint if MISSING in str(e) else ""))
+        # The team logo only fills the start of its slot (see IUEngine.PartialAsset)
+        slot = IUEngine.ASSETS[kinds[image]][2]
+        assets[kinds[image]] = tiledata if len(tiledata) == slot else IUEngine.PartialAsset(tiledata)
+        if kinds[palette] not in assets and not shared:
+            assets[kinds[palette]] = paldata
+
+    return assets
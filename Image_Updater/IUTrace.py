@@ -0,0 +1,113 @@
+# """ Stage timing for extract/import: where does the time go, per ROM and per team """
+# Timing is off by default: stage() then returns a shared do-nothing context, so instrumented code pays
+# one function call per stage. Once enabled, every stage is recorded with the ROM and team it belongs to,
+# and can be exported as a Chrome trace (chrome://tracing or ui.perfetto.dev) or printed as a summary table.
+#
+#   IUTrace.enable(rom="NHL94.bin")
+#   with IUTrace.stage("asset read", team="BOS"):
+#       ...
+#   print(IUTrace.tracer.summary())
+#   IUTrace.tracer.writeTrace("trace.json")
+
+import json
+import os
+import threading
+import time
+
+
+class NullStage(object):
+    # Stage used when timing is off
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULLSTAGE = NullStage()
+
+
+class Stage(object):
+    def __init__(self, tracer, name, args):
+        self.tracer = tracer
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.tracer.record(self.name, self.start, time.perf_counter_ns(), self.args)
+        return False
+
+
+class Tracer(object):
+    def __init__(self, rom=None):
+        # rom - name of the ROM being worked on, added to every event (can be changed between ROMs)
+        self.rom = rom
+        self.origin = time.perf_counter_ns()
+        self.events = []
+        self.lock = threading.Lock()
+
+    def stage(self, name, **args):
+        if self.rom is not None:
+            args.setdefault('rom', self.rom)
+        return Stage(self, name, args)
+
+    def record(self, name, start, end, args):
+        with self.lock:
+            self.events.append((name, start, end, threading.get_ident(), args))
+
+    def chromeTrace(self):
+        # Chrome trace format: one complete ('X') event per stage, times in microseconds
+        pid = os.getpid()
+        events = [dict(name=name, ph='X', ts=(start - self.origin) / 1000, dur=(end - start) / 1000,
+                       pid=pid, tid=tid, args=args) for name, start, end, tid, args in self.events]
+        return dict(traceEvents=events, displayTimeUnit='ms')
+
+    def writeTrace(self, filename):
+        with open(filename, 'w', encoding="utf-8") as f:
+            json.dump(self.chromeTrace(), f)
+
+    def totals(self, key=None):
+        # {stage name: [count, total ns, max ns]}, or {(stage name, args[key]): ...} to split by ROM or team
+        totals = {}
+        for name, start, end, tid, args in self.events:
+            group = name if key is None else (name, args.get(key))
+            total = totals.setdefault(group, [0, 0, 0])
+            total[0] += 1
+            total[1] += end - start
+            total[2] = max(total[2], end - start)
+        return totals
+
+    def summary(self):
+        # Table of the stages, slowest first
+        lines = ["{:<16} {:>7} {:>11} {:>10} {:>10}".format("stage", "count", "total ms", "mean ms", "max ms")]
+        for name, (count, total, longest) in sorted(self.totals().items(), key=lambda item: -item[1][1]):
+            lines.append("{:<16} {:>7} {:>11.3f} {:>10.4f} {:>10.4f}".format(
+                name, count, total / 1e6, total / count / 1e6, longest / 1e6))
+        return "\n".join(lines)
+
+
+# The active tracer (None when timing is off)
+tracer = None
+
+
+def enable(rom=None):
+    # Start timing, returns the new tracer
+    global tracer
+    tracer = Tracer(rom)
+    return tracer
+
+
+def disable():
+    global tracer
+    tracer = None
+
+
+def stage(name, **args):
+    # Context manager timing a stage (args such as team= are kept with the event)
+    if tracer is None:
+        return NULLSTAGE
+    return tracer.stage(name, **args)
@@ -0,0 +1,156 @@
+# """ Watch mode: re-import the assets of the import folder into an output ROM as soon as they change """
+# The ROM is opened and indexed once. The team folders are polled (modification time and size of each file,
+# then the SHA-256 of the files that look changed, so touching a file without changing it does nothing).
+# A burst of saves is waited out (the folder must stay unchanged for a moment), then only the teams whose
+# files changed are written, and only the changed bytes (and the header checksum) are written to the
+# output ROM, which stays open - an emulator can reload it right away.
+# Deleting an asset file does not restore the ROM data it replaced.
+
+import hashlib
+import os
+from pathlib import Path
+import time
+
+import IUEngine
+from IUIndex import RomIndex
+from IURom import isArchive
+
+# Seconds between two polls of the import folder
+INTERVAL = 0.1
+
+# Seconds the import folder must stay unchanged before the changes are applied
+SETTLE = 0.25
+
+
+class Watcher(object):
+    def __init__(self, rom, importdir, outfile, teamcnt, romtype):
+        # rom - RomFile of the base ROM (written to, in its private copy)
+        if isArchive(outfile):
+            raise ValueError("The output ROM of watch mode is updated in place, it can not be compressed.")
+        self.rom = rom
+        self.importdir = Path(importdir)
+        self.outfile = str(outfile)
+        self.source = IUEngine.AssetFolder(importdir)
+
+        # One index of the teams for the whole session (the ROM hash changes with every write)
+        index = RomIndex(rom, teamcnt)
+        imgoffsets = IUEngine.getImgOffsets(romtype, teamcnt)
+        self.teams = {tminfo['abv']: (ptr, tminfo, imgoffsets[count]) for count, ptr, tminfo in index.teams(rom)}
+        self.source.useRom(rom, {abv: (ptr, offsets) for abv, (ptr, tminfo, offsets) in self.teams.items()})
+
+        # File path -> (modification time, size), and file path -> SHA-256
+        self.stats = {}
+        self.hashes = {}
+
+        # Start from the current contents of the import folder (messages of this first import are kept)
+        self.messages = self.apply(self.changedTeams(self.scan()))
+        IUEngine.updateChecksum(self.rom)
+        self.rom.save(self.outfile)
+        self.out = open(self.outfile, 'r+b')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def scan(self):
+        # (modification time, size) of every file of the team folders of the ROM's teams
+        stats = {}
+        for abv in self.teams:
+            folder = self.importdir / abv
+            try:
+                entries = list(os.scandir(folder))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    stats[entry.path] = (stat.st_mtime_ns, stat.st_size)
+        return stats
+
+    def changedTeams(self, stats):
+        # Teams whose files have new contents (or were added / removed) since the last call
+        changed = set()
+        for path in set(self.stats) | set(stats):
+            if self.stats.get(path) == stats.get(path):
+                continue
+            digest = None
+            if path in stats:
+                try:
+                    digest = hashlib.sha256(Path(path).read_bytes()).hexdigest()
+                except FileNotFoundError:
+                    pass
+            if digest != self.hashes.get(path):
+                changed.add(Path(path).parent.name)
+            if digest is None:
+                self.hashes.pop(path, None)
+            else:
+                self.hashes[path] = digest
+        self.stats = stats
+        return changed
+
+    def apply(self, abvs):
+        # Write the assets of the teams abvs to the ROM, returns the messages (one for each team)
+        # A team with bad files is reported and left as it is
+        messages = []
+        for abv in sorted(abvs):
+            ptr, tminfo, offsets = self.teams[abv]
+            try:
+                teamassets = self.source.team(abv)
+                problems = IUEngine.checkAssets(abv, teamassets or {})
+            except (EnvironmentError, ValueError) as e:
+                problems = [str(e)]
+            if problems:
+                messages.extend(problems)
+                continue
+            report = IUEngine.writeToRom(self.rom, ptr, tminfo, offsets, teamassets)
+            messages.append(IUEngine.teamMessage(report))
+        return messages
+
+    def poll(self):
+        # Apply the changes of the import folder (once it has settled) to the output ROM
+        # Returns the messages, or None if nothing changed
+        stats = self.scan()
+        if stats == self.stats:
+            return None
+
+        # Wait for a burst of saves to finish
+        while True:
+            time.sleep(SETTLE)
+            settled = self.scan()
+            if settled == stats:
+                break
+            stats = settled
+
+        start = time.perf_counter()
+        abvs = self.changedTeams(stats)
+        if not abvs:
+            return None
+
+        self.rom.begin()
+        messages = self.apply(abvs)
+        messages.append(IUEngine.updateChecksum(self.rom))
+        written = self.rom.journal
+        self.rom.commit()
+
+        # Only the written ranges go to the output ROM
+        if written:
+            for offset, old in written:
+                self.out.seek(offset)
+                self.out.write(self.rom.read(offset, len(old)))
+            self.out.flush()
+            messages.append("Updated " + self.outfile + " in " + str(int((time.perf_counter() - start) * 1000))
+                            + " ms.")
+        return messages
+
+    def run(self, callback=print):
+        # Poll until interrupted (Ctrl+C), callback(message) for each message
+        while True:
+            messages = self.poll()
+            for message in messages or []:
+                callback(message)
+            time.sleep(INTERVAL)
+
+    def close(self):
+        self.out.close()
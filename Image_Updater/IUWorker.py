@@ -0,0 +1,51 @@
+# """ Worker thread running an extract/import job, so the window stays responsive """
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import IUDetect
+import IUEngine
+
+
+class EngineWorker(QThread):
+    # progress(team number, number of teams, team abv)
+    progress = pyqtSignal(int, int, str)
+
+    def __init__(self, job, parent=None):
+        # job - dictionary: kind ('extract' or 'import'), rom (RomFile), romFile, outdir / importdir, teamcnt, romtype,
+        # force (import with settings that do not match the ROM, optional)
+        super(EngineWorker, self).__init__(parent)
+        self.job = job
+        self.result = None
+        self.error = None
+        self.cancelled = False
+        # Messages of the settings that do not match the ROM, when an import was refused for them
+        self.mismatches = []
+
+    def cancel(self):
+        self.cancelled = True
+
+    def step(self, count, total, abv):
+        # Progress callback of the engine
+        if self.cancelled:
+            raise IUEngine.Cancelled()
+        self.progress.emit(count, total, abv)
+
+    def run(self):
+        job = self.job
+        try:
+            # An import with settings that contradict the ROM is not started, the window asks the user first
+            # (checked here, the ROM is only read on this thread while a job runs)
+            if job['kind'] == 'import' and not job.get('force'):
+                self.mismatches = IUDetect.mismatches(job['rom'], job['teamcnt'], job['romtype'])
+                if self.mismatches:
+                    return
+            # Settings that can not be used (more teams than the layout has) are an error, nothing is written
+            teamcnt, romtype = IUDetect.romSettings(job['rom'], job['teamcnt'], job['romtype'])
+            if job['kind'] == 'extract':
+                self.result = IUEngine.extractImages(job['rom'], job['outdir'], teamcnt, romtype, self.step)
+            else:
+                self.result = IUEngine.importImages(job['rom'], job['importdir'], teamcnt, romtype, self.step)
+        except IUEngine.Cancelled:
+            self.cancelled = True
+        except (EnvironmentError, ValueError) as e:
+            self.error = str(e)
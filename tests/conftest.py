@@ -0,0 +1,39 @@
+# """ Shared fixtures: synthetic ROMs from IUSynth, written to a temporary folder """
+# The modules import each other by name (as when run from Image_Updater), so that folder goes on the path
+
+from pathlib import Path
+import struct
+import sys
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "Image_Updater"))
+
+import IUSynth  # noqa: E402
+from IUIndex import PTRSTART  # noqa: E402
+
+
+def writeRom(folder, name, data):
+    # Save ROM bytes as folder/name, returns the file name
+    filename = Path(folder) / name
+    filename.write_bytes(data)
+    return str(filename)
+
+
+def setPtr(data, count, ptr):
+    # ROM bytes with team pointer count set to ptr
+    data = bytearray(data)
+    struct.pack_into('>I', data, PTRSTART + 4 * count, ptr)
+    return bytes(data)
+
+
+@pytest.fixture
+def rom30(tmp_path):
+    # 30 team ROM, 30 active teams
+    return writeRom(tmp_path, "nhl30.bin", IUSynth.makeRom(30, 30, seed=1))
+
+
+@pytest.fixture
+def rom32(tmp_path):
+    # 32 team ROM, 32 active teams
+    return writeRom(tmp_path, "nhl32.bin", IUSynth.makeRom(32, 32, seed=2))
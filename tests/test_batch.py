@@ -0,0 +1,112 @@
+# """ Batch work on many ROMs: extraction, and fan-out import of one asset set """
+# Every ROM is done on its own: a failing ROM (or team) is reported, the others are still done
+
+from pathlib import Path
+
+import pytest
+
+from conftest import setPtr, writeRom
+import IUBatch
+import IUEngine
+from IURom import RomFile
+import IUSynth
+
+
+def testExtractBatch(rom30, rom32, tmp_path):
+    # Every ROM gets its own folder and detected settings; a file that is not a ROM fails on its own
+    bad = writeRom(tmp_path, "bad.bin", bytes(0x1000))
+    outdir = tmp_path / "out"
+    seen = []
+    results = IUBatch.extractBatch([rom30, bad, rom32], outdir, None, None, workers=2, callback=seen.append)
+
+    assert [Path(result['rom']).name for result in results] == ["nhl30.bin", "bad.bin", "nhl32.bin"]
+    assert sorted(result['rom'] for result in seen) == sorted([rom30, bad, rom32])
+    assert [len(result['teams']) for result in results] == [30, 0, 32]
+    assert results[1]['error'] and not results[0]['error'] and not results[2]['error']
+    assert (outdir / "nhl30" / "ANH" / "Team_Logo.txt").is_file()
+    assert (outdir / "nhl32" / "MIN" / "Banner.txt").is_file()
+
+    text = IUBatch.summary(results)
+    assert "bad.bin: FAILED - " in text
+    assert "nhl32.bin: 32 teams extracted (ANH BOS" in text
+    assert text.endswith("2 of 3 ROMs extracted without errors.")
+
+
+def testFailedTeam(tmp_path):
+    # A team that can not be read is reported, the other teams of the ROM are still extracted
+    romfile = writeRom(tmp_path, "broken.bin", setPtr(IUSynth.makeRom(30, 30, seed=1), 20, 0x101))
+    results = IUBatch.extractBatch([romfile], tmp_path / "out", 30, 30)
+
+    assert results[0]['error'] is None
+    assert len(results[0]['teams']) == 29
+    assert results[0]['failed'][0].startswith("team 21: ")
+    text = IUBatch.summary(results)
+    assert "    FAILED team 21: " in text
+    assert text.endswith("0 of 1 ROMs extracted without errors.")
+
+
+def testSameStem(rom30, tmp_path):
+    # Two ROMs that would be extracted to the same folder are refused before anything is written
+    (tmp_path / "b").mkdir()
+    other = writeRom(tmp_path / "b", "nhl30.smc", Path(rom30).read_bytes())
+    with pytest.raises(ValueError):
+        IUBatch.extractBatch([rom30, other], tmp_path / "out", None, None)
+    assert not (tmp_path / "out").exists()
+
+
+@pytest.fixture
+def importdir(tmp_path):
+    # Import folder with the assets of teams ANH and BOS of another ROM, and the assets of BOS
+    other = writeRom(tmp_path, "other.bin", IUSynth.makeRom(30, 30, seed=5))
+    with RomFile(other) as rom:
+        IUEngine.extractImages(rom, tmp_path / "import", 2, 30)
+        return tmp_path / "import", [bytes(data) for file, data in teamAssets(rom, 1, 30)]
+
+
+def teamAssets(rom, count, romtype):
+    # Assets of team position count
+    ptr = IUEngine.romIndex(rom, romtype).ptrs[count]
+    offsets = IUEngine.getImgOffsets(romtype, romtype)[count]
+    return IUEngine.readAssets(rom, ptr, IUEngine.getTeamInfo(rom, ptr), offsets)
+
+
+def testFanout(rom30, rom32, importdir, tmp_path):
+    # The assets go to the team positions and image offsets of each ROM's own layout
+    folder, bos = importdir
+    results = IUBatch.importBatch(folder, [(rom30, None, None), (rom32, None, None)], tmp_path / "out", workers=2)
+
+    assert [result['error'] for result in results] == [None, None]
+    assert [Path(result['out']).name for result in results] == ["nhl30.bin", "nhl32.bin"]
+    for result, romtype in zip(results, (30, 32)):
+        with RomFile(result['out']) as rom:
+            assert [bytes(data) for file, data in teamAssets(rom, 1, romtype)] == bos
+        assert result['messages'][1].startswith("BOS was updated: ")
+    assert IUBatch.importSummary(results).endswith("2 of 2 ROMs imported.")
+
+
+def testFanoutMismatch(rom30, rom32, importdir, tmp_path):
+    # Given settings that contradict a ROM fail that ROM, unless forced
+    folder, bos = importdir
+    targets = [(rom30, 30, 30), (rom32, 30, 30)]
+    results = IUBatch.importBatch(folder, targets, tmp_path / "out")
+    assert results[0]['error'] is None
+    assert "Nothing was written" in results[1]['error']
+    assert not (tmp_path / "out" / "nhl32.bin").exists()
+    assert "nhl32.bin: FAILED - " in IUBatch.importSummary(results)
+
+    results = IUBatch.importBatch(folder, targets, tmp_path / "forced", force=True)
+    assert [result['error'] for result in results] == [None, None]
+
+
+def testFanoutSameName(rom30, importdir, tmp_path):
+    # Two ROMs that would be saved to the same file, or a bad asset, are refused before anything is written
+    folder, bos = importdir
+    (tmp_path / "b").mkdir()
+    other = writeRom(tmp_path / "b", "nhl30.bin", Path(rom30).read_bytes())
+    with pytest.raises(ValueError, match="would both be written"):
+        IUBatch.importBatch(folder, [(rom30, None, None), (other, None, None)], tmp_path / "out")
+
+    (folder / "BOS" / "Banner.txt").write_text("00")
+    with pytest.raises(ValueError, match="BOS/Banner.txt"):
+        IUBatch.importBatch(folder, [(rom30, None, None)], tmp_path / "out")
+    assert not (tmp_path / "out").exists()
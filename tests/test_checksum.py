@@ -0,0 +1,54 @@
+# """ Genesis checksum: kept up to date by RomFile.write, fixed after an import """
+
+import IUEngine
+from IURom import CHECKSTART, RomFile, wordSum
+
+
+def fullSum(rom):
+    # Checksum of the current contents, summed from scratch
+    return wordSum(bytes(rom.view[CHECKSTART:])) & 0xFFFF
+
+
+def testSynthetic(rom30):
+    # IUSynth writes a valid checksum
+    with RomFile(rom30) as rom:
+        assert rom.checksum() == rom.headerChecksum() == fullSum(rom)
+
+
+def testWrites(rom30):
+    # The sum is updated by every write, also odd-sized writes at odd offsets and writes below CHECKSTART
+    with RomFile(rom30) as rom:
+        rom.checksum()
+        for offset, data in [(0x201, b'\xFF'), (0x1FF, b'\x10\x20\x30'), (0x1001, b'\x01\x02\x03\x04\x05'),
+                             (0x120, b'HEADER'), (rom.size - 1, b'\x7F'), (0x3000, b'')]:
+            rom.write(offset, data)
+            assert rom.checksum() == fullSum(rom)
+
+
+def testRollback(rom30):
+    # Undone writes restore the sum
+    with RomFile(rom30) as rom:
+        before = rom.checksum()
+        rom.begin()
+        rom.write(0x2000, b'\x55' * 100)
+        assert rom.checksum() != before
+        rom.rollback()
+        assert rom.checksum() == before == fullSum(rom)
+
+
+def testFix(rom30, tmp_path):
+    # updateChecksum only reports with fix=False, then writes the new checksum; it is correct once the ROM is
+    # saved and loaded again
+    with RomFile(rom30) as rom:
+        old = rom.headerChecksum()
+        rom.write(0x2000, b'\x55' * 100)
+        new = fullSum(rom)
+        assert "out of date" in IUEngine.updateChecksum(rom, fix=False)
+        assert rom.headerChecksum() == old
+        assert "updated" in IUEngine.updateChecksum(rom)
+        assert rom.headerChecksum() == rom.checksum() == new
+        assert "correct" in IUEngine.updateChecksum(rom)
+        rom.save(tmp_path / "fixed.bin")
+
+    with RomFile(tmp_path / "fixed.bin") as rom:
+        assert rom.headerChecksum() == rom.checksum() == new
@@ -0,0 +1,92 @@
+# """ Detection of the layout and number of active teams, and given settings overriding it """
+
+import logging
+import struct
+
+import pytest
+
+from conftest import setPtr, writeRom
+import IUDetect
+from IUIndex import PTRSTART, romIndex
+from IURom import RomFile
+import IUSynth
+
+
+def junkNames(data, count):
+    # ROM bytes with NUL and 0xFF bytes in the city name of team count (same length)
+    data = bytearray(data)
+    ptr = struct.unpack_from('>I', data, PTRSTART + 4 * count)[0]
+    city = ptr + struct.unpack_from('>H', data, ptr + 4)[0]
+    data[city + 2:city + 5] = b'\0\xFF\x7F'
+    return bytes(data)
+
+
+@pytest.mark.parametrize("teamcnt, romtype", [(30, 30), (32, 32), (26, 30), (28, 32), (1, 30)])
+def testDetect(tmp_path, teamcnt, romtype):
+    romfile = writeRom(tmp_path, "rom.bin", IUSynth.makeRom(teamcnt, romtype, seed=teamcnt))
+    with RomFile(romfile) as rom:
+        assert IUDetect.detectRom(rom) == (teamcnt, romtype)
+        assert IUDetect.romSettings(rom) == (teamcnt, romtype)
+
+
+def testJunkName(tmp_path):
+    # Junk bytes in a name do not end the active teams, they are dropped from the name
+    romfile = writeRom(tmp_path, "junk.bin", junkNames(IUSynth.makeRom(26, 30, seed=3), 4))
+    with RomFile(romfile) as rom:
+        assert IUDetect.detectRom(rom) == (26, 30)
+        index = romIndex(rom, 26)
+        assert index.abv[4] == IUSynth.TEAMS[4][1]
+        assert index.city[4] == IUSynth.TEAMS[4][0][3:]
+
+
+def testBrokenPointer(rom30, tmp_path):
+    # The active teams end at the first pointer that does not lead to team data
+    data = open(rom30, 'rb').read()
+    for ptr in (0, 0x101, len(data) - 4, PTRSTART):
+        romfile = writeRom(tmp_path, "broken.bin", setPtr(data, 20, ptr))
+        with RomFile(romfile) as rom:
+            assert IUDetect.detectRom(rom) == (20, 30)
+
+
+def testOverride(tmp_path, caplog):
+    # Given settings are used as they are, with a warning when they do not match
+    romfile = writeRom(tmp_path, "rom.bin", IUSynth.makeRom(26, 30, seed=4))
+    with RomFile(romfile) as rom, caplog.at_level(logging.WARNING, logger="IUDetect"):
+        assert IUDetect.romSettings(rom, 24) == (24, 30)
+        assert not caplog.records
+
+        assert IUDetect.romSettings(rom, 28, 32) == (28, 32)
+        assert len(caplog.records) == 2
+
+        with pytest.raises(ValueError):
+            IUDetect.romSettings(rom, 31, 30)
+        with pytest.raises(ValueError):
+            IUDetect.romSettings(rom, 26, 31)
+
+
+def testStrict(tmp_path):
+    # Settings used to write are refused when they contradict the ROM, unless they only use fewer teams
+    romfile = writeRom(tmp_path, "rom.bin", IUSynth.makeRom(26, 30, seed=4))
+    with RomFile(romfile) as rom:
+        assert IUDetect.romSettings(rom, 20, 30, strict=True) == (20, 30)
+        assert IUDetect.romSettings(rom, strict=True) == (26, 30)
+        assert IUDetect.mismatches(rom, 26, 30) == []
+        assert len(IUDetect.mismatches(rom, 28, 32)) == 2
+        with pytest.raises(ValueError, match="32 team layout was given"):
+            IUDetect.romSettings(rom, romtype=32, strict=True)
+        with pytest.raises(ValueError, match="27 were given"):
+            IUDetect.romSettings(rom, 27, strict=True)
+
+
+def testNotGenesis(tmp_path):
+    # Without a SEGA header nothing is detected, but given settings still work
+    data = bytearray(IUSynth.makeRom(30, 30, seed=1))
+    data[0x100:0x110] = bytes(16)
+    romfile = writeRom(tmp_path, "plain.bin", bytes(data))
+    with RomFile(romfile) as rom:
+        with pytest.raises(ValueError, match="SEGA"):
+            IUDetect.detectRom(rom)
+        with pytest.raises(ValueError):
+            IUDetect.romSettings(rom)
+        assert IUDetect.romSettings(rom, 30, 30) == (30, 30)
+        assert IUDetect.romSettings(rom, 30, 30, strict=True) == (30, 30)
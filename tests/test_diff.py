@@ -0,0 +1,70 @@
+# """ ROM comparison: teams matched by abbreviation, changed bytes counted for each asset """
+
+import sys
+
+import pytest
+
+from conftest import writeRom
+import IUDiff
+import IUEngine
+from IUIndex import PTRSTART
+from IURom import RomFile
+
+
+def bannerRom(romfile, folder):
+    # Copy of the ROM with 3 bytes of the BOS banner changed
+    with RomFile(romfile) as rom:
+        offset = IUEngine.getImgOffsets(30, 30)[1]['banoffset']
+        rom.write(offset + 0x20, bytes(255 - b for b in rom.read(offset + 0x20, 3)))
+        return writeRom(folder, "banner.bin", bytes(rom.view))
+
+
+def swappedRom(romfile, folder):
+    # Copy of the ROM with ANH and BOS swapped in the team pointer table
+    with RomFile(romfile) as rom:
+        rom.write(PTRSTART, bytes(rom.read(PTRSTART + 4, 4)) + bytes(rom.read(PTRSTART, 4)))
+        return writeRom(folder, "swapped.bin", bytes(rom.view))
+
+
+def testSame(rom30):
+    with RomFile(rom30) as a, RomFile(rom30) as b:
+        rows = IUDiff.compareRoms(a, 30, 30, b, 30, 30)
+    assert [row['abv'] for row in rows][:2] == ["ANH", "BOS"] and len(rows) == 30
+    assert not any(IUDiff.isChanged(row) for row in rows)
+    assert IUDiff.table(rows).endswith("0 of 30 teams differ.")
+
+
+@pytest.mark.parametrize("numpy", [True, False])
+def testChanged(rom30, tmp_path, monkeypatch, numpy):
+    # The same count of changed bytes with NumPy and without it
+    if not numpy:
+        monkeypatch.setitem(sys.modules, "numpy", None)
+    with RomFile(rom30) as a, RomFile(bannerRom(rom30, tmp_path)) as b:
+        rows = IUDiff.compareRoms(a, 30, 30, b, 30, 30)
+    assert [row for row in rows if IUDiff.isChanged(row)] == [dict(abv="BOS", slota=1, slotb=1,
+                                                                   assets=[("Banner", 3)])]
+    assert "BOS        2      2  Banner (3 bytes)" in IUDiff.table(rows)
+    assert "ANH        1      1  identical" in IUDiff.table(rows, everything=True)
+
+
+def testSwapped(rom30, tmp_path):
+    # Teams are matched by abbreviation: the swapped teams keep their team data (the jersey palettes), and get
+    # the images of their new position
+    with RomFile(rom30) as a, RomFile(swappedRom(rom30, tmp_path)) as b:
+        rows = {row['abv']: row for row in IUDiff.compareRoms(a, 30, 30, b, 30, 30)}
+
+    assert (rows["ANH"]['slota'], rows["ANH"]['slotb']) == (0, 1)
+    assert (rows["BOS"]['slota'], rows["BOS"]['slotb']) == (1, 0)
+    names = [name for name, count in rows["ANH"]['assets']]
+    assert names == ["Rink_Logo", "Team_Logo", "Team_Logo_Palette", "Banner", "Home_Visitor_Palette"]
+    assert [abv for abv, row in rows.items() if IUDiff.isChanged(row)] == ["ANH", "BOS"]
+
+
+def testOtherLayout(rom30, rom32):
+    # Teams that are only in one of the ROMs are listed after the others
+    with RomFile(rom30) as a, RomFile(rom32) as b:
+        rows = IUDiff.compareRoms(a, 30, 30, b, 32, 32)
+    assert [(row['abv'], row['slota'], row['slotb']) for row in rows[-2:]] == [("CBJ", None, 30), ("MIN", None, 31)]
+    text = IUDiff.table(rows)
+    assert "CBJ        -     31  only in ROM B" in text
+    assert text.endswith("32 of 32 teams differ.")
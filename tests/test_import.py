@@ -0,0 +1,87 @@
+# """ Import: every file is checked before anything is written """
+
+import pickle
+
+import numpy as np
+import pytest
+
+import IUEngine
+from IURom import RomFile
+import IUTiles
+
+KINDS = IUTiles.assetKinds()
+
+
+@pytest.fixture
+def extracted(rom30, tmp_path):
+    # Import folder extracted from the ROM (teams ANH and BOS only)
+    outdir = tmp_path / "extracted"
+    with RomFile(rom30) as rom:
+        IUEngine.extractImages(rom, outdir, 2, 30)
+    return outdir
+
+
+def setHex(folder, file, data):
+    (folder / file).write_text(data.hex())
+
+
+def assertRefused(romfile, importdir, match):
+    # The import fails with a message matching match, and the ROM is not written to
+    with RomFile(romfile) as rom:
+        with pytest.raises(ValueError, match=match):
+            IUEngine.importImages(rom, str(importdir), 30, 30)
+        assert not rom.modified()
+
+
+@pytest.mark.parametrize("file, size", [("Rink_Logo.txt", 0x2E0), ("Banner.txt", 0x40),
+                                        ("Home_Visitor_Palette.txt", 0x20), ("Team_Logo.txt", 0x480),
+                                        ("Jer_Palette_A.txt", 0x40), ("Team_Logo_Palette.txt", 0)])
+def testWrongSize(rom30, extracted, file, size):
+    # Hex data must fill its slot exactly, shorter or longer
+    setHex(extracted / "BOS", file, bytes(range(256)) * (size // 256) + bytes(size % 256))
+    assertRefused(rom30, extracted, "BOS/" + file + " is " + hex(size) + " bytes, its slot in the ROM is")
+
+
+def testEveryProblem(rom30, extracted):
+    # All problems are listed, from every team, and nothing is written
+    setHex(extracted / "ANH", "Banner.txt", bytes(0x20))
+    (extracted / "BOS" / "Rink_Logo.txt").write_text("not hex")
+    with RomFile(rom30) as rom:
+        with pytest.raises(ValueError) as error:
+            IUEngine.importImages(rom, str(extracted), 30, 30)
+        assert not rom.modified()
+    assert "2 problems found" in str(error.value)
+    assert "ANH/Banner.txt" in str(error.value)
+    assert "Rink_Logo.txt: not valid hex data" in str(error.value)
+
+
+def testPngTeamLogo(rom30, extracted):
+    # PNG artwork only draws the 48x48 logo, the start of the team logo slot; the rest of the slot is kept
+    folder = extracted / "BOS"
+    tiles = bytes.fromhex((folder / "Team_Logo.txt").read_text())
+    (folder / "Team_Logo.txt").unlink()
+    (folder / "Team_Logo_Palette.txt").unlink()
+    rgba = np.zeros((48, 48, 4), dtype=np.uint8)
+    rgba[8:40, 8:40] = (255, 0, 0, 255)
+    (folder / "Team_Logo.png").write_bytes(IUTiles.pngBytes(rgba))
+
+    assets = IUEngine.AssetFolder(extracted).team("BOS")
+    assert isinstance(assets[KINDS["Team_Logo"]], IUEngine.PartialAsset)
+    assert IUEngine.checkAssets("BOS", assets) == []
+    # Kept when the decoded assets are handed to worker processes (fanout)
+    assert isinstance(pickle.loads(pickle.dumps(assets))[KINDS["Team_Logo"]], IUEngine.PartialAsset)
+
+    with RomFile(rom30) as rom:
+        IUEngine.importImages(rom, str(extracted), 30, 30)
+        after = IUTiles.romTeams(rom, 2, 30)[1][1][KINDS["Team_Logo"]]
+        assert bytes(after[0x480:]) == tiles[0x480:]
+        assert bytes(after[:0x480]) != tiles[:0x480]
+
+
+def testShortPartial():
+    # Only a PartialAsset may be shorter than its slot, and only by whole tiles
+    logo = KINDS["Team_Logo"]
+    assert IUEngine.checkAssets("BOS", {logo: IUEngine.PartialAsset(bytes(0x480))}) == []
+    assert IUEngine.checkAssets("BOS", {logo: IUEngine.PartialAsset(bytes(0x47F))})
+    assert IUEngine.checkAssets("BOS", {logo: IUEngine.PartialAsset(b'')})
+    assert IUEngine.checkAssets("BOS", {logo: bytes(0x480)})
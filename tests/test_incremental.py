@@ -0,0 +1,60 @@
+# """ Incremental import: only the bytes that differ are written, each asset is changed, unchanged or skipped """
+
+import pytest
+
+import IUEngine
+from IURom import RomFile
+
+
+@pytest.fixture
+def extracted(rom30, tmp_path):
+    # Import folder extracted from the ROM (teams ANH and BOS only)
+    outdir = tmp_path / "extracted"
+    with RomFile(rom30) as rom:
+        IUEngine.extractImages(rom, outdir, 2, 30)
+    return outdir
+
+
+def statuses(report):
+    return {name: (status, count) for name, status, count in report['assets']}
+
+
+@pytest.mark.parametrize("changes, spans", [([3], [(0, 16)]), ([3, 20], [(0, 32)]), ([3, 40], [(0, 16), (32, 48)]),
+                                            ([47], [(32, 48)]), ([], [])])
+def testDiffSpans(changes, spans):
+    # Changed 16 byte blocks, adjacent ones merged
+    old = bytes(48)
+    new = bytes(1 if i in changes else 0 for i in range(48))
+    assert IUEngine.diffSpans(old, new) == spans
+
+
+def testUnchanged(rom30, extracted):
+    # Importing what was extracted writes nothing
+    with RomFile(rom30) as rom:
+        reports = IUEngine.importReports(rom, str(extracted), 30, 30)
+        assert not rom.modified()
+    assert [report['found'] for report in reports[:3]] == [True, True, False]
+    assert set(statuses(reports[0]).values()) == {('unchanged', 0)}
+    message = IUEngine.teamMessage(reports[0])
+    assert message.startswith("ANH was already up to date; unchanged: Rink_Logo_Jer_Palette_H, Jer_Palette_A")
+    assert IUEngine.teamMessage(reports[2]) == "BUF data was not changed."
+
+
+def testChanged(rom30, extracted):
+    # One changed byte is written as one 16 byte block; a missing file is skipped
+    banner = bytearray.fromhex((extracted / "BOS" / "Banner.txt").read_text())
+    banner[0x105] ^= 0xFF
+    (extracted / "BOS" / "Banner.txt").write_text(banner.hex())
+    (extracted / "ANH" / "Rink_Logo.txt").unlink()
+
+    with RomFile(rom30) as rom:
+        reports = IUEngine.importReports(rom, str(extracted), 30, 30)
+        offset = IUEngine.getImgOffsets(30, 30)[1]['banoffset']
+        assert rom.spans == [(offset + 0x100, offset + 0x110)]
+        assert bytes(rom.read(offset, len(banner))) == banner
+
+    assert statuses(reports[1])["Banner"] == ('changed', 1)
+    assert statuses(reports[1])["Rink_Logo"] == ('unchanged', 0)
+    assert statuses(reports[0])["Rink_Logo"] == ('skipped', 0)
+    assert IUEngine.teamMessage(reports[1]).startswith("BOS was updated: Banner (1 bytes) changed; unchanged: ")
+    assert IUEngine.teamMessage(reports[0]).endswith("; skipped: Rink_Logo.")
@@ -0,0 +1,64 @@
+# """ Asset pack: extract to a pack, import it into another ROM, and the checks of the pack writer """
+
+import pytest
+
+from conftest import writeRom
+import IUEngine
+import IUPack
+from IURom import RomFile
+import IUSynth
+import IUTiles
+
+
+def testPackRoundTrip(rom30, tmp_path):
+    # The assets of one ROM, imported from its pack into another ROM, are read back unchanged
+    packfile = tmp_path / "nhl30.iupk"
+    with RomFile(rom30) as rom:
+        abvs = IUEngine.extractPack(rom, packfile, 30, 30)
+        teams = IUTiles.romTeams(rom, 30, 30)
+    assert abvs == [abv for abv, assets in teams]
+
+    with IUPack.AssetPack(packfile) as pack:
+        assert pack.romtype == 30
+        assert pack.teams() == abvs
+
+    other = writeRom(tmp_path, "other.bin", IUSynth.makeRom(30, 30, seed=7))
+    with RomFile(other) as rom:
+        assert IUTiles.romTeams(rom, 30, 30) != teams
+        IUEngine.importImages(rom, str(packfile), 30, 30)
+        assert IUTiles.romTeams(rom, 30, 30) == teams
+
+
+def testCompressedPack(rom32, tmp_path):
+    # A .iupk.gz pack holds the same assets as a plain one
+    with RomFile(rom32) as rom:
+        IUEngine.extractPack(rom, tmp_path / "plain.iupk", 32, 32)
+        IUEngine.extractPack(rom, tmp_path / "packed.iupk.gz", 32, 32)
+
+    with IUEngine.PackAssets(tmp_path / "plain.iupk") as plain, \
+            IUEngine.PackAssets(tmp_path / "packed.iupk.gz") as packed:
+        assert packed.romtype == 32
+        for abv in plain.teams():
+            assert {kind: bytes(data) for kind, data in packed.team(abv).items()} == \
+                {kind: bytes(data) for kind, data in plain.team(abv).items()}
+
+
+def testLongAbv(tmp_path):
+    # An abv that does not fit in 8 bytes is refused, nothing is written
+    with pytest.raises(ValueError, match="longer than 8"):
+        IUPack.writePack(tmp_path / "x.iupk", [("ABCDEFGHI", 0, b'\0' * 32)], 30)
+    assert not (tmp_path / "x.iupk").exists()
+
+    IUPack.writePack(tmp_path / "x.iupk", [("ABCDEFGH", 0, b'\0' * 32)], 30)
+    with IUPack.AssetPack(tmp_path / "x.iupk") as pack:
+        assert pack.teams() == ["ABCDEFGH"]
+
+
+def testRomType(tmp_path):
+    # Only the layouts (or 0, not known) can be written as the ROM type
+    with pytest.raises(ValueError, match="Unknown ROM type"):
+        IUPack.writePack(tmp_path / "x.iupk", [("BOS", 0, b'\0' * 32)], 31)
+    for romtype in [0] + sorted(IUEngine.LAYOUTS):
+        IUPack.writePack(tmp_path / "x.iupk", [("BOS", 0, b'\0' * 32)], romtype)
+        with IUPack.AssetPack(tmp_path / "x.iupk") as pack:
+            assert pack.romtype == romtype
@@ -0,0 +1,79 @@
+# """ IPS / BPS patches: made from the writes to a ROM, applied to the base ROM, refused on another ROM """
+
+from pathlib import Path
+
+import pytest
+
+from conftest import writeRom
+import IUPatch
+from IURom import RomFile
+import IUSynth
+
+# Writes made to the ROM: a byte, two nearby runs, a run longer than an IPS record, and the last bytes
+WRITES = [(0x200, b'\x01'), (0x1000, b'\xAA' * 20), (0x1020, b'\xBB' * 4), (0x40000, bytes(range(256)) * 300)]
+
+
+def patchedRom(romfile):
+    # RomFile of romfile with WRITES (and the last 4 bytes) changed
+    rom = RomFile(romfile)
+    for offset, data in WRITES + [(rom.size - 4, b'\x12\x34\x56\x78')]:
+        rom.write(offset, data)
+    return rom
+
+
+@pytest.mark.parametrize("kind", [".ips", ".bps"])
+def testRoundTrip(rom30, tmp_path, kind):
+    patchfile = tmp_path / ("update" + kind)
+    with patchedRom(rom30) as rom:
+        size = IUPatch.writePatch(rom, patchfile)
+        target = bytes(rom.view)
+    assert size == patchfile.stat().st_size < len(target) // 10
+
+    assert IUPatch.applyPatch(patchfile, Path(rom30).read_bytes()) == target
+
+
+@pytest.mark.parametrize("kind", [".ips", ".bps"])
+def testOtherRom(rom30, tmp_path, kind):
+    # A ROM that is not the base ROM of the patch is refused
+    patchfile = tmp_path / ("update" + kind)
+    with patchedRom(rom30) as rom:
+        IUPatch.writePatch(rom, patchfile)
+    with pytest.raises(ValueError):
+        IUPatch.applyPatch(patchfile, IUSynth.makeRom(30, 30, seed=5))
+
+
+def testIpsEof(tmp_path):
+    # A record at offset 0x454F46 would read as 'EOF', it starts one byte earlier
+    romfile = writeRom(tmp_path, "big.bin", IUSynth.makeRom(30, 30, seed=1, size=0x480000))
+    patchfile = tmp_path / "update.ips"
+    with RomFile(romfile) as rom:
+        rom.write(0x454F46, b'\x01\x02\x03')
+        IUPatch.writePatch(rom, patchfile)
+        target = bytes(rom.view)
+    assert b'EOF' not in patchfile.read_bytes()[:-3]
+    assert IUPatch.applyPatch(patchfile, Path(romfile).read_bytes()) == target
+
+
+def testApplyBatch(rom30, rom32, tmp_path):
+    # Only the base ROM is patched, the other one is reported
+    patchfile = tmp_path / "update.bps"
+    with patchedRom(rom30) as rom:
+        IUPatch.writePatch(rom, patchfile)
+        target = bytes(rom.view)
+
+    results = IUPatch.applyBatch(patchfile, [rom30, rom32], tmp_path / "out", workers=2)
+    assert [bool(result['error']) for result in results] == [False, True]
+    assert Path(results[0]['out']).read_bytes() == target
+
+
+def testApplyBatchSameName(rom30, tmp_path):
+    # Two ROMs that would be saved to the same file are refused before anything is written
+    (tmp_path / "b").mkdir()
+    other = writeRom(tmp_path / "b", Path(rom30).name, Path(rom30).read_bytes())
+    patchfile = tmp_path / "update.bps"
+    with patchedRom(rom30) as rom:
+        IUPatch.writePatch(rom, patchfile)
+
+    with pytest.raises(ValueError, match="would both be written"):
+        IUPatch.applyBatch(patchfile, [rom30, other], tmp_path / "out")
+    assert not (tmp_path / "out").exists()
@@ -0,0 +1,148 @@
+# """ PNG artwork: decode to PNG and encode back, truncated files, palette files and shared palettes """
+
+import numpy as np
+import pytest
+
+import IUEngine
+from IURom import RomFile
+import IUTiles
+
+KINDS = IUTiles.assetKinds()
+
+
+def distinctPalette(rng, colours=16):
+    # Palette bytes of distinct Genesis colours (the encoder can only give back what it can tell apart)
+    words = rng.choice(0x200, colours, replace=False)
+    words = ((words & 7) << 1) | (((words >> 3) & 7) << 5) | (((words >> 6) & 7) << 9)
+    return words.astype('>u2').tobytes()
+
+
+def render(tiles, palette, cols, count):
+    # RGBA image of tile data and palette bytes
+    return IUTiles.renderImages(IUTiles.decodeTiles([tiles], cols, count), IUTiles.decodePalettes([palette]))[0]
+
+
+def sameImage(a, b):
+    # True if two RGBA images look the same (the colour of transparent pixels does not matter)
+    return np.array_equal(a[..., 3], b[..., 3]) and np.array_equal(a[a[..., 3] > 0], b[b[..., 3] > 0])
+
+
+@pytest.mark.parametrize("image, palname, cols, count", IUTiles.IMAGES)
+def testRoundTrip(image, palname, cols, count):
+    # Tiles -> PNG -> tiles gives the same bytes with the palette given, and the same picture without it
+    rng = np.random.default_rng(count)
+    tiles = rng.integers(0, 256, count * IUTiles.TILESIZE, dtype=np.uint8).tobytes()
+    palette = distinctPalette(rng)
+    rgba = IUTiles.readPng(IUTiles.pngBytes(render(tiles, palette, cols, count)))
+
+    assert IUTiles.encodeImage(rgba, image, palette, exact=True) == (tiles, palette)
+
+    newtiles, newpalette = IUTiles.encodeImage(rgba, image)
+    assert sameImage(render(newtiles, newpalette, cols, count), rgba)
+
+
+def testWrongSize():
+    with pytest.raises(ValueError, match="must be 48x48"):
+        IUTiles.encodeImage(np.zeros((32, 48, 4), dtype=np.uint8), "Team_Logo")
+
+
+def testTruncated():
+    # A file cut anywhere is a ValueError; only a file that lacks just the IEND chunk still has the whole image
+    rng = np.random.default_rng(0)
+    rgba = rng.integers(0, 256, (48, 48, 4), dtype=np.uint8)
+    png = IUTiles.pngBytes(rgba)
+    for size in range(len(png)):
+        try:
+            decoded = IUTiles.readPng(png[:size])
+        except ValueError:
+            continue
+        assert png[size:size + 8] == b'\0\0\0\0IEND'
+        assert np.array_equal(decoded, rgba)
+
+
+def testNotPng():
+    for data in (b'', b'GIF89a', b'\x89PNG\r\n\x1a\n' + b'\0' * 4):
+        with pytest.raises(ValueError):
+            IUTiles.readPng(data)
+
+
+def writeArtwork(rom, folder):
+    # Export the images of the first team as PNG into folder/<ABV>/, returns (abv, a copy of its assets)
+    abv, assets = IUTiles.romTeams(rom, 1, 30)[0]
+    assets = {kind: bytes(data) for kind, data in assets.items()}
+    IUTiles.writePngs([(abv, assets)], folder)
+    return abv, assets
+
+
+def testSharedPalettes(rom30, tmp_path):
+    # Importing exported artwork gives back the same pictures, and never changes the shared palettes
+    with RomFile(rom30) as rom:
+        abv, before = writeArtwork(rom, tmp_path)
+        messages = IUEngine.importImages(rom, str(tmp_path), 1, 30)
+        assert "Error" not in " ".join(messages)
+        after = {kind: bytes(data) for kind, data in IUTiles.romTeams(rom, 1, 30)[0][1].items()}
+
+    # The import did write: the Team Logo palette is made from its PNG (colours in a new order)
+    assert after[KINDS["Team_Logo_Palette"]] != before[KINDS["Team_Logo_Palette"]]
+    for palette in IUEngine.SHAREDPALETTES:
+        assert after[KINDS[palette]] == before[KINDS[palette]]
+    images = {image: rgba for name, image, rgba in IUTiles.renderTeams([(abv, before)])}
+    for name, image, rgba in IUTiles.renderTeams([(abv, after)]):
+        assert sameImage(rgba, images[image])
+
+
+def testForeignColour(rom30, tmp_path):
+    # Artwork for a shared palette must only use the colours of the ROM's palette
+    with RomFile(rom30) as rom:
+        abv, assets = writeArtwork(rom, tmp_path)
+        palette = IUTiles.paletteLevels(assets[KINDS["Rink_Logo_Jer_Palette_H"]])
+        used = {tuple(colour) for colour in palette[1:]}
+        foreign = next(level for level in np.ndindex(8, 8, 8) if level not in used)
+
+        pngfile = tmp_path / abv / "Rink_Logo.png"
+        rgba = IUTiles.readPng(pngfile.read_bytes())
+        rgba[0, 0] = list(IUTiles.LEVELS[list(foreign)]) + [255]
+        pngfile.write_bytes(IUTiles.pngBytes(rgba))
+
+        with pytest.raises(ValueError, match="not in the palette"):
+            IUEngine.importImages(rom, str(tmp_path), 1, 30)
+
+
+def testSharedPaletteFile(tmp_path):
+    # Without a ROM to take it from, a shared palette must be given as its hex file
+    rgba = np.zeros((32, 48, 4), dtype=np.uint8)
+    (tmp_path / "Rink_Logo.png").write_bytes(IUTiles.pngBytes(rgba))
+    with pytest.raises(ValueError, match="Rink_Logo_Jer_Palette_H.txt is missing"):
+        IUTiles.encodeFolder(tmp_path, {})
+
+    palette = distinctPalette(np.random.default_rng(1))
+    assets = IUTiles.encodeFolder(tmp_path, {KINDS["Rink_Logo_Jer_Palette_H"]: palette})
+    assert assets[KINDS["Rink_Logo_Jer_Palette_H"]] == palette
+    assert assets[KINDS["Rink_Logo"]] == bytes(0x300)
+
+
+def testPaletteFile(rom30, tmp_path):
+    # With the palette file of an extracted folder next to it, unchanged artwork gives back the same picture,
+    # and a colour the palette lacks is reported instead of being replaced by the nearest one
+    with RomFile(rom30) as rom:
+        abv, assets = writeArtwork(rom, tmp_path)
+    palette = assets[KINDS["Team_Logo_Palette"]]
+    folder = tmp_path / abv
+    (folder / "Rink_Logo.png").unlink()
+    (folder / "Banner.png").unlink()
+    encoded = IUTiles.encodeFolder(folder, {KINDS["Team_Logo_Palette"]: palette})
+    assert encoded[KINDS["Team_Logo_Palette"]] == palette
+    assert sameImage(IUTiles.renderTeams([(abv, encoded)])[0][2], IUTiles.renderTeams([(abv, assets)])[0][2])
+
+    used = {tuple(colour) for colour in IUTiles.paletteLevels(palette)[1:]}
+    foreign = next(level for level in np.ndindex(8, 8, 8) if level not in used)
+    pngfile = folder / "Team_Logo.png"
+    rgba = IUTiles.readPng(pngfile.read_bytes())
+    rgba[0, 0] = list(IUTiles.LEVELS[list(foreign)]) + [255]
+    pngfile.write_bytes(IUTiles.pngBytes(rgba))
+    with pytest.raises(ValueError, match="1 colours .* Team_Logo_Palette.txt \\(delete it"):
+        IUTiles.encodeFolder(folder, {KINDS["Team_Logo_Palette"]: palette})
+
+    # Without the palette file, the PNG's colours are used
+    encoded = IUTiles.encodeFolder(folder, {})
+    assert sameImage(IUTiles.renderTeams([(abv, encoded)])[0][2], rgba)
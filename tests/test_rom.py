@@ -0,0 +1,58 @@
+# """ RomFile: saving over the mapped ROM file, the way it is done where a mapped file can not be replaced """
+
+from pathlib import Path
+
+import pytest
+
+import IURom
+from IURom import RomFile
+
+
+@pytest.fixture(params=[False, True], ids=["replace", "remap"])
+def remap(request, monkeypatch):
+    monkeypatch.setattr(IURom, "REMAP", request.param)
+    return request.param
+
+
+def testSaveOver(rom30, remap):
+    # The ROM is saved over its own file, and can still be changed and saved again
+    with RomFile(rom30) as rom:
+        rom.write(0x1000, b'\x01\x02')
+        rom.save(rom30)
+        assert Path(rom30).read_bytes()[0x1000:0x1002] == b'\x01\x02'
+        assert rom.modified() and bytes(rom.read(0x1000, 2)) == b'\x01\x02'
+
+        rom.write(0x2000, b'\x03')
+        rom.save(rom30)
+        assert Path(rom30).read_bytes() == bytes(rom.view)
+
+
+def testInUse(rom30, monkeypatch):
+    # A view of the ROM kept by a caller stops the map from being closed: nothing is saved, the ROM still works
+    monkeypatch.setattr(IURom, "REMAP", True)
+    before = Path(rom30).read_bytes()
+    with RomFile(rom30) as rom:
+        rom.write(0x1000, b'\x01')
+        view = rom.read(0x1000, 4)
+        with pytest.raises(ValueError, match="still in use"):
+            rom.save(rom30)
+        view.release()
+        assert bytes(rom.read(0x1000, 1)) == b'\x01'
+    assert Path(rom30).read_bytes() == before
+
+
+def testFailedSave(rom30, monkeypatch):
+    # If the save fails, the old file is mapped again with the changes still in the ROM
+    monkeypatch.setattr(IURom, "REMAP", True)
+    before = Path(rom30).read_bytes()
+
+    def fail(filename, data):
+        raise OSError("disk full")
+    with RomFile(rom30) as rom:
+        rom.write(0x1000, b'\x01')
+        monkeypatch.setattr(IURom, "writeFile", fail)
+        with pytest.raises(OSError):
+            rom.save(rom30)
+        assert bytes(rom.read(0x1000, 1)) == b'\x01'
+        assert bytes(rom.view[:0x1000]) == before[:0x1000]
+    assert Path(rom30).read_bytes() == before
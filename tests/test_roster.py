@@ -0,0 +1,72 @@
+# """ Roster export: players of every team with their positions and attribute nibbles, as CSV or JSON Lines """
+
+import csv
+import json
+
+import pytest
+
+from conftest import writeRom
+import IUEngine
+from IURom import RomFile
+import IURoster
+import IUSynth
+
+# Players of each synthetic team (goalies, forwards, defensemen)
+PLAYERS = sum(IUSynth.ROSTER)
+
+
+def setAttributes(romfile, count, player, data):
+    # Overwrite the 7 attribute bytes of a player in the ROM file
+    with RomFile(romfile) as rom:
+        ptr = IUEngine.romIndex(rom, 30).ptrs[count]
+        pos = ptr + rom.word(ptr)
+        for i in range(player):
+            pos += rom.word(pos) + 8
+        pos += rom.word(pos) + 1
+        rom.write(pos, data)
+        rom.save(romfile)
+
+
+def testRows(rom30):
+    setAttributes(rom30, 1, 3, bytes.fromhex("123456789ABCDE"))
+    with RomFile(rom30) as rom:
+        rows = list(IURoster.rosterRows(rom, 30, "nhl30.bin"))
+
+    assert len(rows) == 30 * PLAYERS
+    bos = [row for row in rows if row['abv'] == "BOS"]
+    assert [row['pos'] for row in bos] == ['G'] * 2 + ['F'] * 12 + ['D'] * 7
+    assert [row['number'] for row in bos] == list(range(1, PLAYERS + 1))
+    assert bos[0]['name'] == "Player BOS A" and bos[0]['jno'] == "10"
+    assert bos[3]['team'] == "Boston Bruins" and bos[3]['rom'] == "nhl30.bin"
+    # One nibble per attribute, high nibble first
+    assert [bos[3][field] for field in IUEngine.ATTRIBUTES] == list(range(1, 15))
+
+
+@pytest.mark.parametrize("fmt", ["csv", "jsonl"])
+def testExport(rom30, tmp_path, fmt):
+    outfile = tmp_path / ("roster." + fmt)
+    assert IURoster.exportRoster(rom30, outfile, fmt=fmt) == 30 * PLAYERS
+    with RomFile(rom30) as rom:
+        first = next(IURoster.rosterRows(rom, 30, "nhl30.bin"))
+
+    with open(outfile, encoding="utf-8", newline='') as f:
+        if fmt == "csv":
+            rows = list(csv.DictReader(f))
+            assert list(rows[0]) == IURoster.FIELDS
+            assert rows[0] == {field: str(value) for field, value in first.items()}
+        else:
+            rows = [json.loads(line) for line in f]
+            assert rows[0] == first
+    assert len(rows) == 30 * PLAYERS
+
+
+def testExportRosters(rom30, rom32, tmp_path):
+    # Every ROM is exported on its own, a failing one is reported and the others are still exported
+    bad = writeRom(tmp_path, "bad.bin", bytes(0x1000))
+    results = list(IURoster.exportRosters([rom30, bad, rom32], tmp_path / "out", fmt="jsonl"))
+
+    assert [(rom, count) for rom, count, error in results] == [(rom30, 30 * PLAYERS), (bad, 0), (rom32, 32 * PLAYERS)]
+    assert results[1][2] and not results[0][2]
+    assert (tmp_path / "out" / "nhl32.jsonl").is_file()
+    with pytest.raises(ValueError, match="Unknown roster format"):
+        IURoster.exportRoster(rom30, tmp_path / "roster.xml", fmt="xml")
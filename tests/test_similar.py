@@ -0,0 +1,63 @@
+# """ Image similarity index: the band query finds every hash within the distance, and ROM images are found """
+
+import random
+
+import numpy as np
+import pytest
+
+import IUSimilar
+from IURom import RomFile
+import IUTiles
+
+
+@pytest.fixture
+def hashes(tmp_path, monkeypatch):
+    # Index of random hashes, with near copies of a few of them at every distance up to 16 bits
+    # (the images are stand-ins holding their hash)
+    monkeypatch.setattr(IUSimilar, "imageHash", lambda rgba: int(rgba[0]))
+    rng = random.Random(7)
+    values = [rng.getrandbits(64) for i in range(400)]
+    for value in values[:20]:
+        for bits in range(1, 17):
+            for bit in rng.sample(range(64), bits):
+                value ^= 1 << bit
+            values.append(value)
+
+    index = IUSimilar.HashIndex(tmp_path / "index.db")
+    images = [("T" + str(i), "Team_Logo", np.array([value], dtype=np.uint64)) for i, value in enumerate(values)]
+    assert index.add("hashes", images) == len(values)
+    yield index, values, rng
+    index.close()
+
+
+@pytest.mark.parametrize("maxdistance", [0, 3, 4, 7, 10, 15])
+def testRecall(hashes, maxdistance):
+    # The indexed query returns exactly what comparing every hash returns
+    index, values, rng = hashes
+    for query in values[:20] + [rng.getrandbits(64) for i in range(5)]:
+        expected = sorted((IUSimilar.distance(query, value), "T" + str(i)) for i, value in enumerate(values)
+                          if IUSimilar.distance(query, value) <= maxdistance)
+        found = index.similar(query, "Team_Logo", maxdistance, limit=len(values))
+        assert [(d, team) for d, source, team, image, digest in found] == expected
+    assert index.similar(values[0], "Banner", maxdistance) == []
+
+
+def testFindRomImage(rom30, tmp_path):
+    # An image of a ROM is found in the index of the ROM, as identical; a retouched copy is found nearby
+    dbfile = tmp_path / "index.db"
+    assert IUSimilar.indexSources(dbfile, [('rom', rom30)], None, None) == 30 * 3
+    with IUSimilar.HashIndex(dbfile) as index:
+        assert IUSimilar.indexSource(index, 'rom', rom30, None, None) is None
+
+    with RomFile(rom30) as rom:
+        teams = [team for team in IUTiles.romTeams(rom, 30, 30) if team[0] == "BOS"]
+    rgba = IUSimilar.imageOf(teams, "BOS", "Team_Logo").copy()
+    (tmp_path / "bos.png").write_bytes(IUTiles.pngBytes(rgba))
+    matches = IUSimilar.findSimilar(dbfile, str(tmp_path / "bos.png"))
+    assert matches[0][0] == 0 and matches[0][2:] == ("BOS", "Team_Logo", True)
+
+    rgba[0:2, 0:2] = (255, 255, 255, 255)
+    (tmp_path / "retouched.png").write_bytes(IUTiles.pngBytes(rgba))
+    matches = IUSimilar.findSimilar(dbfile, str(tmp_path / "retouched.png"))
+    assert matches[0][2:] == ("BOS", "Team_Logo", False)
+    assert matches[0][0] <= IUSimilar.DISTANCE
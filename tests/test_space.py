@@ -0,0 +1,110 @@
+# """ Free space and relocation of team data, with inactive slots of the pointer table """
+
+import pytest
+
+from conftest import setPtr, writeRom
+import IUDetect
+from IUIndex import PTRSTART, readPtrs
+import IURoster
+from IURom import RomFile
+import IUSpace
+import IUSynth
+
+
+@pytest.fixture
+def inactive(tmp_path):
+    # 30 team ROM with 26 active teams: slot 26 is cleared, slots 27-29 still point to (inactive) team data
+    return writeRom(tmp_path, "inactive.bin", setPtr(IUSynth.makeRom(30, 30, seed=6), 26, 0))
+
+
+def overlaps(start, end, spans):
+    return any(start < spanend and spanstart < end for spanstart, spanend in spans)
+
+
+def testUsed(inactive):
+    # Every slot of the pointer table, and the data of the inactive teams, are in use
+    with RomFile(inactive) as rom:
+        assert IUDetect.detectRom(rom) == (26, 30)
+        used = IUSpace.usedSpans(rom, 26, 30)
+        free = [(start, end) for start, end, value in IUSpace.freeSpans(rom, 26, 30, 2)]
+        assert overlaps(PTRSTART + 4 * 29, PTRSTART + 4 * 30, used)
+        assert not overlaps(PTRSTART, PTRSTART + 4 * 30, free)
+        for ptr in readPtrs(rom, 30)[27:]:
+            assert overlaps(ptr, ptr + 1, used)
+            assert not overlaps(ptr, ptr + IUSpace.teamSize(rom, ptr), free)
+
+
+def testRelocate(inactive, tmp_path):
+    with RomFile(inactive) as rom:
+        old = readPtrs(rom, 30)
+        inactiveData = [bytes(rom.read(ptr, IUSpace.teamSize(rom, ptr))) for ptr in old[27:]]
+        rosters = list(IURoster.rosterRows(rom, 26))
+        size = IUSpace.teamSize(rom, old[1])
+        data = bytes(rom.read(old[1], size))
+
+        messages = IUSpace.relocateTeams(rom, ["BOS", "BOS"], 26, 30, room=64)
+        assert len(messages) == 1
+        new = readPtrs(rom, 30)
+
+        # Only the pointer of BOS changed, to a copy of its data placed after the whole table
+        assert new[:1] + new[2:] == old[:1] + old[2:]
+        assert new[1] >= PTRSTART + 4 * 30
+        assert bytes(rom.read(new[1], size)) == data
+        for ptr in old[27:]:
+            assert not overlaps(new[1], new[1] + size + 64, [(ptr, ptr + IUSpace.teamSize(rom, ptr))])
+        assert [bytes(rom.read(ptr, len(d))) for ptr, d in zip(old[27:], inactiveData)] == inactiveData
+
+        # The old copy is padding, so it is free space again
+        assert bytes(rom.read(old[1], size)) == bytes([IUSpace.FILL]) * size
+        free = [(start, end) for start, end, value in IUSpace.freeSpans(rom, 26, 30, 2)]
+        assert any(start <= old[1] and old[1] + size <= end for start, end in free)
+
+        assert list(IURoster.rosterRows(rom, 26)) == rosters
+        rom.save(tmp_path / "moved.bin")
+
+    with RomFile(tmp_path / "moved.bin") as rom:
+        assert IUDetect.detectRom(rom) == (26, 30)
+
+
+def testShared(inactive):
+    # A block two slots point to is copied, and the old copy is kept for the other slot
+    with RomFile(inactive) as rom:
+        ptrs = readPtrs(rom, 30)
+        rom.write(PTRSTART + 4 * 2, rom.read(PTRSTART + 4 * 1, 4))
+        data = bytes(rom.read(ptrs[1], IUSpace.teamSize(rom, ptrs[1])))
+
+        IUSpace.relocateTeams(rom, ["BOS"], 26, 30)
+        assert readPtrs(rom, 30)[2] == ptrs[1]
+        assert bytes(rom.read(ptrs[1], len(data))) == data
+
+
+def testNoRoom(inactive):
+    # A team that does not fit is refused, and nothing is moved
+    with RomFile(inactive) as rom:
+        before = bytes(rom.view)
+        with pytest.raises(ValueError, match="No free space"):
+            IUSpace.relocateTeams(rom, ["ANH", "BOS"], 26, 30, room=len(before))
+        assert bytes(rom.view) == before
+        assert not rom.modified()
+
+
+def testZeroRuns(inactive):
+    # Runs of 0x00 inside the ROM are only free inside given regions, the padding at the end always is
+    with RomFile(inactive) as rom:
+        free = IUSpace.freeSpans(rom, 26, 30)
+        assert all(value == IUSpace.FILL or end == rom.size for start, end, value in free)
+        assert free[-1][1] == rom.size
+        assert not overlaps(0x1000, 0x2000, [(start, end) for start, end, value in free])
+
+        free = IUSpace.freeSpans(rom, 26, 30, regions=[(0x1000, 0x2000), (0x1800, 0x3000)])
+        assert (0x1000, 0x3000, 0) in free
+
+
+def testFreeList():
+    free = IUSpace.FreeList([(10, 20), (30, 40)])
+    assert free.allocate(4) == 10
+    assert free.allocate(6, align=4) == 32
+    free.release(20, 30)
+    assert free.spans == [(14, 32), (38, 40)]
+    with pytest.raises(ValueError):
+        free.allocate(19)
@@ -0,0 +1,97 @@
+# """ Asset store: shared blobs, manifests, integrity check, garbage collection, import from a manifest """
+
+import pytest
+
+from conftest import writeRom
+import IUEngine
+from IURom import RomFile
+import IUStore
+import IUSynth
+import IUTiles
+
+
+def assetBytes(rom):
+    # Assets of every team, as bytes
+    return [(abv, {kind: bytes(data) for kind, data in assets.items()})
+            for abv, assets in IUTiles.romTeams(rom, 30, 30)]
+
+
+def extract(romfile, store, name):
+    with RomFile(romfile) as rom:
+        return IUStore.extractStore(rom, store, name, 30, 30)
+
+
+def testShared(rom30, tmp_path):
+    # The same ROM extracted twice adds a manifest, not blobs
+    store = IUStore.AssetStore(tmp_path / "store")
+    teams = extract(rom30, store.root, "a")
+    blobs = store.stored()
+    assert teams[:2] == ["ANH", "BOS"] and len(teams) == 30
+
+    extract(rom30, store.root, "b")
+    assert store.stored() == blobs == store.referenced()
+    assert store.manifestNames() == ["a", "b"]
+    assert store.verify() == []
+
+
+def testSkipUnchanged(rom30, tmp_path, monkeypatch):
+    # A manifest of the same ROM and settings is kept as it is, nothing is hashed or stored again
+    store = tmp_path / "store"
+    teams = extract(rom30, store, "a")
+
+    def put(self, data):
+        raise AssertionError("stored again")
+    monkeypatch.setattr(IUStore.AssetStore, "put", put)
+    assert extract(rom30, store, "a") == teams
+
+    # Another ROM under the same name is extracted again
+    other = writeRom(tmp_path, "other.bin", IUSynth.makeRom(30, 30, seed=5))
+    with pytest.raises(AssertionError):
+        extract(other, store, "a")
+
+
+def testVerify(rom30, tmp_path):
+    # A changed blob and a missing blob are both reported
+    store = IUStore.AssetStore(tmp_path / "store")
+    extract(rom30, store.root, "a")
+    manifest = store.readManifest("a")
+    changed = manifest['teams'][0]['assets']["Banner.txt"]
+    missing = manifest['teams'][1]['assets']["Rink_Logo.txt"]
+    store.blobPath(changed).write_bytes(b'\0' + store.blobPath(changed).read_bytes()[1:])
+    store.blobPath(missing).unlink()
+
+    problems = store.verify()
+    assert "corrupted blob " + changed in problems
+    assert "a: BOS/Rink_Logo.txt is missing (" + missing + ")" in problems
+    with pytest.raises(ValueError, match="corrupted"):
+        store.get(changed)
+
+
+def testGc(rom30, tmp_path):
+    # Only the blobs of removed manifests are deleted
+    store = IUStore.AssetStore(tmp_path / "store")
+    extract(rom30, store.root, "a")
+    kept = store.stored()
+    other = writeRom(tmp_path, "other.bin", IUSynth.makeRom(30, 30, seed=5))
+    extract(other, store.root, "b")
+    assert store.stored() > kept
+
+    unused = store.stored() - kept
+    store.manifestPath("b").unlink()
+    assert store.gc() == len(unused)
+    assert store.stored() == kept
+    assert store.verify() == []
+    assert store.gc() == 0
+
+
+def testImportManifest(rom30, tmp_path):
+    # A manifest is an import source: the assets of another ROM are written into this one
+    store = tmp_path / "store"
+    other = writeRom(tmp_path, "other.bin", IUSynth.makeRom(30, 30, seed=5))
+    extract(other, store, "other")
+
+    with RomFile(rom30) as rom:
+        IUEngine.importImages(rom, str(store / "manifests" / "other.json"), 30, 30)
+        imported = assetBytes(rom)
+    with RomFile(other) as rom:
+        assert imported == assetBytes(rom)
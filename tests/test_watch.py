@@ -0,0 +1,64 @@
+# """ Watch mode: changed files of the import folder are written to the open output ROM, nothing else is """
+
+import os
+from pathlib import Path
+
+import pytest
+
+import IUEngine
+from IURom import RomFile
+import IUWatch
+
+
+@pytest.fixture
+def watcher(rom30, tmp_path, monkeypatch):
+    # Watcher of a folder extracted from the ROM (teams ANH and BOS only), saving to out.bin
+    monkeypatch.setattr(IUWatch, "SETTLE", 0)
+    importdir = tmp_path / "import"
+    with RomFile(rom30) as rom:
+        IUEngine.extractImages(rom, importdir, 2, 30)
+        with IUWatch.Watcher(rom, importdir, tmp_path / "out.bin", 30, 30) as watcher:
+            yield watcher
+
+
+def edit(path, text):
+    # Write path, with a modification time that differs from the last one
+    stat = path.stat()
+    path.write_text(text)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+
+def testStart(rom30, watcher):
+    # The output ROM is saved at start; an unchanged folder, or a file saved with the same contents, does nothing
+    assert len(watcher.messages) == 2
+    assert Path(watcher.outfile).read_bytes() == Path(rom30).read_bytes()
+    assert watcher.poll() is None
+
+    banner = watcher.importdir / "BOS" / "Banner.txt"
+    edit(banner, banner.read_text())
+    assert watcher.poll() is None
+
+
+def testChange(rom30, watcher):
+    # Only the changed team is imported, and the output ROM (still open) gets the written bytes
+    banner = watcher.importdir / "BOS" / "Banner.txt"
+    data = bytearray.fromhex(banner.read_text())
+    data[0x10] ^= 0xFF
+    edit(banner, data.hex())
+
+    messages = watcher.poll()
+    assert messages[0] == ("BOS was updated: Banner (1 bytes) changed; unchanged: Rink_Logo_Jer_Palette_H, "
+                           "Jer_Palette_A, Rink_Logo, Team_Logo, Team_Logo_Palette, Home_Visitor_Palette.")
+    assert messages[-1].startswith("Updated " + watcher.outfile + " in ")
+    assert Path(watcher.outfile).read_bytes() == bytes(watcher.rom.view)
+    offset = IUEngine.getImgOffsets(30, 30)[1]['banoffset']
+    assert Path(watcher.outfile).read_bytes()[offset:offset + len(data)] == data
+    assert watcher.poll() is None
+
+
+def testBadFile(rom30, watcher):
+    # A team with a bad file is reported and not written
+    edit(watcher.importdir / "ANH" / "Banner.txt", "00" * 0x20)
+    messages = watcher.poll()
+    assert messages[0].startswith("ANH/Banner.txt is 0x20 bytes")
+    assert Path(watcher.outfile).read_bytes() == Path(rom30).read_bytes()